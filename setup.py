@@ -46,6 +46,45 @@ class SNCosmoTest(TestCommand):
                              coverage=self.coverage)
         sys.exit(errno)
 
+
+def openmp_flags():
+    """Return (compile_args, link_args) enabling OpenMP, or empty lists if
+    the compiler does not support it.
+
+    OpenMP is only used to split large interpolations over threads, so
+    the extension is built without it if it is not available. Set the
+    environment variable SNCOSMO_DISABLE_OPENMP to build without it.
+    """
+    if os.environ.get('SNCOSMO_DISABLE_OPENMP'):
+        return [], []
+    if sys.platform == 'win32':
+        return ['/openmp'], []
+
+    import shutil
+    import tempfile
+    from distutils.ccompiler import new_compiler
+    from distutils.errors import CompileError, LinkError
+    from distutils.sysconfig import customize_compiler
+
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(tmpdir, 'test_openmp.c')
+        with open(fname, 'w') as f:
+            f.write('#include <omp.h>\n'
+                    'int main(void) { return omp_get_max_threads() < 1; }\n')
+        objects = compiler.compile([fname], output_dir=tmpdir,
+                                   extra_postargs=['-fopenmp'])
+        compiler.link_executable(objects, os.path.join(tmpdir, 'test'),
+                                 extra_postargs=['-fopenmp'])
+    except (CompileError, LinkError):
+        return [], []
+    finally:
+        shutil.rmtree(tmpdir)
+    return ['-fopenmp'], ['-fopenmp']
+
+
 # extension module(s): only add if setup.py argument is not egg_info, because
 # we need to import numpy, and we'd rather egg_info work when dependencies
 # are not installed.
@@ -60,8 +99,11 @@ if sys.argv[1] != 'egg_info':
 
     source_files = [fname]
     include_dirs = [numpy.get_include()]
+    compile_args, link_args = openmp_flags()
     extensions = [Extension("sncosmo.salt2utils", source_files,
-                            include_dirs=include_dirs)]
+                            include_dirs=include_dirs,
+                            extra_compile_args=compile_args,
+                            extra_link_args=link_args)]
 
     if USE_CYTHON:
         from Cython.Build import cythonize
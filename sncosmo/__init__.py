@@ -117,6 +117,22 @@ class _Conf(ConfigNamespace):
         cfgtype='string(default=None)')
     remote_timeout = ConfigItem(
         10.0, "Remote timeout in seconds.")
+    zpbandflux_cache_size = ConfigItem(
+        1000,
+        "Maximum number of bandpasses for which each magnitude system keeps "
+        "the zeropoint flux in memory (least recently used are discarded).")
+    zpbandflux_cache_dir = ConfigItem(
+        None,
+        "Directory in which zeropoint fluxes of the AB and spectral "
+        "magnitude systems are stored, so that other processes can reuse "
+        "them. If None, they are only cached in memory. "
+        "Example: zpbandflux_cache_dir = /home/user/.cache/sncosmo_zp",
+        cfgtype='string(default=None)')
+    distmod_tolerance = ConfigItem(
+        1.e-4,
+        "Accuracy in magnitudes of the tabulated distance modulus used for "
+        "absolute magnitudes. If 0, the distance modulus is computed by the "
+        "cosmology for every call.")
 
 # Create an instance of the class we just defined.
 conf = _Conf()
@@ -1,6 +1,8 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 
 import copy
+import hashlib
+from collections import OrderedDict
 
 import numpy as np
 from scipy.interpolate import splrep, splev
@@ -298,6 +300,80 @@ class Bandpass(object):
         multiplied by a factor."""
         return Bandpass(factor * self.wave, self.trans, name=name)
 
+    def _content_hash(self):
+        """Hash (hex string) of the transmission, equal for bandpasses
+        with identical transmission. Computed on first use."""
+        try:
+            return self.__dict__['_hash']
+        except KeyError:
+            h = hashlib.sha1(self.__class__.__name__.encode())
+            self._update_hash(h)
+            self._hash = h.hexdigest()
+            return self._hash
+
+    def _update_hash(self, h):
+        h.update(np.ascontiguousarray(self.wave, dtype=np.float64).tobytes())
+        h.update(np.ascontiguousarray(self.trans, dtype=np.float64).tobytes())
+
+    def _shifted_view(self, factor):
+        """Like ``shifted()``, but return a (cached) `_ShiftedBandpass`
+        view sharing this bandpass's transmission.
+
+        The most recently used views are kept, so that repeated shifts by
+        the same factor (e.g., to the rest frame at a given redshift)
+        return the same object.
+        """
+        views = self.__dict__.setdefault('_shifted_views', OrderedDict())
+        try:
+            view = views.pop(factor)
+        except KeyError:
+            view = _ShiftedBandpass(self, factor)
+            if len(views) >= _MAX_SHIFTED_VIEWS:
+                views.popitem(last=False)
+        views[factor] = view
+        return view
+
+
+# maximum number of views cached by `Bandpass._shifted_view`, per bandpass
+_MAX_SHIFTED_VIEWS = 16
+
+
+class _ShiftedBandpass(Bandpass):
+    """View of a bandpass with all wavelengths multiplied by a factor.
+
+    Unlike ``Bandpass.shifted()``, no new interpolant is constructed: the
+    original bandpass is evaluated at ``wave / factor``.
+    """
+
+    def __init__(self, band, factor):
+        self._band = band
+        self._factor = factor
+        self.name = None
+
+    def minwave(self):
+        return self._factor * self._band.minwave()
+
+    def maxwave(self):
+        return self._factor * self._band.maxwave()
+
+    @lazyproperty
+    def wave(self):
+        return self._factor * self._band.wave
+
+    @property
+    def trans(self):
+        return self._band.trans
+
+    def __call__(self, wave):
+        return self._band(np.asarray(wave) / self._factor)
+
+    def shifted(self, factor, name=None):
+        return self._band.shifted(self._factor * factor, name=name)
+
+    def _update_hash(self, h):
+        h.update(self._band._content_hash().encode())
+        h.update(repr(float(self._factor)).encode())
+
 
 class _SampledFunction(object):
     """Represents a 1-d continuous function, used in AggregateBandpass."""
@@ -373,6 +449,13 @@ class AggregateBandpass(Bandpass):
         t *= self.prefactor
         return t
 
+    def _update_hash(self, h):
+        h.update(repr(float(self.prefactor)).encode())
+        for t in self.transmissions:
+            h.update(np.int64(len(t.x)).tobytes())
+            h.update(t.x.tobytes())
+            h.update(t.y.tobytes())
+
     def shifted(self, factor, name=None, family=None):
         """Return a new AggregateBandpass instance with all wavelengths
         multiplied by a factor."""
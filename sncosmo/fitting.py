@@ -4,56 +4,479 @@ from __future__ import division, print_function
 import copy
 import time
 import math
-from collections import OrderedDict
+import sys
+import multiprocessing
+import itertools
+from collections import OrderedDict, deque
 import warnings
 
 import numpy as np
+from scipy import linalg, special
 from scipy.interpolate import InterpolatedUnivariateSpline as Spline1d
 from astropy.extern import six
+from astropy.table import Table
 
 from .photdata import photometric_data, select_data
-from .utils import Result, Interp1D, ppf
+from .utils import Result, Interp1D, ppf, StructuredCovariance
 from .bandpasses import get_bandpass
+from .models import _bandflux_single, _zpnorm
 
-__all__ = ['fit_lc', 'nest_lc', 'mcmc_lc', 'flatten_result', 'chisq']
+__all__ = ['fit_lc', 'fit_lc_many', 'scan_z', 'nest_lc', 'mcmc_lc',
+           'flatten_result', 'chisq', 'LightCurveLikelihood']
 
 
 class DataQualityError(Exception):
     pass
 
 
-def generate_chisq(data, model, signature='iminuit', modelcov=False):
+class LightCurveLikelihood(object):
+    """Log-likelihood of model parameters given photometric data.
+
+    Everything that does not depend on the model parameters is prepared
+    once, when the object is created: the data are standardized and sorted
+    by time and grouped by bandpass, the factors scaling model fluxes to
+    the data zeropoints are computed, and the data covariance (if any) is
+    Cholesky factored. Evaluating the likelihood is then cheap enough to
+    be done many times, as in sampling.
+
+    The log-likelihood is ``-chisq / 2``, as in `~sncosmo.nest_lc` and
+    `~sncosmo.mcmc_lc`.
+
+    As model fluxes are proportional to the amplitude parameter of the
+    source (``model.param_names[2]``), the likelihood can instead be
+    maximized or integrated over the amplitude analytically (see
+    ``amplitude``), removing it from the varied parameters.
+
+    Parameters
+    ----------
+    data : `~astropy.table.Table` or `~numpy.ndarray` or `dict`
+        Table of photometric data. Must include certain columns.
+        See the "Photometric Data" section of the documentation for
+        required columns.
+    model : `~sncosmo.Model`
+        The model. It is not copied: its parameters are set on each
+        evaluation.
+    vparam_names : list, optional
+        Model parameters given to `loglike`, which are ordered as in the
+        model. Default is all model parameters.
+    modelcov : bool, optional
+        Include the model covariance (at the evaluated parameters) in the
+        likelihood. Default is False.
+    amplitude : {None, 'profile', 'marginalize'}, optional
+        If 'profile', the likelihood is maximized over the amplitude
+        parameter, which is set to its best value on each evaluation. If
+        'marginalize', the likelihood is integrated over the amplitude
+        (with a flat prior, normalized within ``amplitude_bounds`` if
+        given). The amplitude must then not be in ``vparam_names``, and
+        ``modelcov`` must be False. Default is None: the amplitude is an
+        ordinary parameter.
+    amplitude_bounds : tuple, optional
+        Bounds of the flat amplitude prior when ``amplitude`` is
+        'marginalize'. Default is an unbounded (improper) prior.
+
+    Notes
+    -----
+    Instances can be pickled, for example to evaluate the likelihood in
+    worker processes.
+    """
+
+    def __init__(self, data, model, vparam_names=None, modelcov=False,
+                 amplitude=None, amplitude_bounds=None):
+        data = photometric_data(data)
+        if not np.all(np.ediff1d(data.time) >= 0.0):
+            data = data[np.argsort(data.time)]
+
+        if amplitude not in (None, 'profile', 'marginalize'):
+            raise ValueError("amplitude must be None, 'profile' or "
+                             "'marginalize'")
+        if vparam_names is None:
+            vparam_names = model.param_names
+            if amplitude is not None:
+                vparam_names = [name for name in vparam_names
+                                if name != model.param_names[2]]
+        for name in vparam_names:
+            if name not in model.param_names:
+                raise ValueError("Parameter not in model: " + repr(name))
+        if amplitude is not None:
+            if model.param_names[2] in vparam_names:
+                raise ValueError("amplitude parameter {0!r} cannot be varied "
+                                 "when amplitude={1!r}"
+                                 .format(model.param_names[2], amplitude))
+            if modelcov:
+                raise ValueError("model covariance not supported with "
+                                 "amplitude={0!r}".format(amplitude))
+
+        self.data = data
+        self.model = model
+        self.modelcov = modelcov
+        self.amplitude = amplitude
+        self.amplitude_bounds = amplitude_bounds
+        self.vparam_names = [name for name in model.param_names
+                             if name in vparam_names]
+        self._idx = np.array([model.param_names.index(name)
+                              for name in self.vparam_names], dtype=int)
+
+        # Bandpasses with the indicies of their data points, and factors
+        # scaling model fluxes to the data zeropoints.
+        self._bands = []
+        self._zpnorm = np.empty(len(data))
+        for band in set(data.band):
+            idx = np.flatnonzero(data.band == band)
+            self._bands.append((band, idx))
+            self._zpnorm[idx] = _zpnorm(band, data.zp[idx], data.zpsys[idx])
+
+        # Data covariance: variances, Cholesky factor or pseudo-inverse.
+        self._var = self._cho = self._invcov = None
+        if data.fluxcov is None:
+            self._var = data.fluxerr**2
+        else:
+            try:
+                self._cho = linalg.cho_factor(data.fluxcov, lower=True)
+            except linalg.LinAlgError:
+                self._invcov = np.linalg.pinv(data.fluxcov)
+
+    def _solve(self, b):
+        """``cov^-1 b`` for the data covariance, where ``b`` has one or
+        more columns."""
+        if self._var is not None:
+            return b / (self._var if b.ndim == 1 else self._var[:, None])
+        if self._cho is not None:
+            return linalg.cho_solve(self._cho, b)
+        return np.dot(self._invcov, b)
+
+    def _model_flux(self):
+        """Model flux at the data points for the current model parameters,
+        on the data zeropoints."""
+
+        flux = np.empty(len(self.data))
+        for band, idx in self._bands:
+            flux[idx] = _bandflux_single(self.model, band,
+                                         self.data.time[idx])
+        return flux * self._zpnorm
+
+    def _solver(self, modelcov):
+        """Model flux and a function returning ``cov^-1 b`` for the
+        covariance, including the model covariance if ``modelcov`` is True,
+        at the current model parameters."""
+
+        if modelcov:
+            return _chisq_solver(self.data, self.model, True)
+        return self._model_flux(), self._solve
+
+    def _amplitude_loglike(self, amplitude, fisher, chisq):
+        """Log-likelihood given the results of `_profile_amplitude`."""
+
+        loglike = -0.5 * chisq
+        if self.amplitude == 'marginalize':
+            with np.errstate(divide='ignore'):
+                loglike = loglike + 0.5 * np.log(2. * np.pi / fisher)
+                if self.amplitude_bounds is not None:
+                    # probability mass of the Gaussian likelihood in the
+                    # amplitude within the bounds (computed in the tail
+                    # nearest to the bounds to avoid cancellation).
+                    low, high = self.amplitude_bounds
+                    sigma = 1. / np.sqrt(fisher)
+                    a = (low - amplitude) / sigma
+                    b = (high - amplitude) / sigma
+                    mass = np.where(a > 0.,
+                                    special.ndtr(-a) - special.ndtr(-b),
+                                    special.ndtr(b) - special.ndtr(a))
+                    loglike = loglike + np.log(mass / (high - low))
+        return loglike
+
+    def _unit_flux_batch(self, parameters):
+        """Model flux at the data points for unit amplitude, for each row
+        of ``parameters``."""
+
+        allparameters = np.tile(self.model.parameters, (len(parameters), 1))
+        allparameters[:, self._idx] = parameters
+        allparameters[:, 2] = 1.
+        return self._zpnorm * self.model.bandflux_batch(
+            allparameters, self.data.band, self.data.time)
+
+    def loglike(self, parameters):
+        """Log-likelihood for the given values of the varied parameters.
+
+        With ``amplitude='profile'`` or ``'marginalize'``, the model
+        amplitude is set to its best value given the other parameters.
+
+        Parameters
+        ----------
+        parameters : `~numpy.ndarray` (1-d)
+            Values of ``vparam_names``.
+
+        Returns
+        -------
+        loglike : float
+        """
+        self.model.parameters[self._idx] = parameters
+        if self.amplitude is not None:
+            self.model.parameters[2] = 1.
+            amplitude, fisher, chisq = _profile_amplitude(
+                self.data.flux, self._model_flux(), self._solve)
+            self.model.parameters[2] = amplitude
+            return float(self._amplitude_loglike(amplitude, fisher, chisq))
+
+        mflux, solve = self._solver(self.modelcov)
+        diff = self.data.flux - mflux
+        return -0.5 * np.dot(diff, solve(diff))
+
+    def loglike_batch(self, parameters):
+        """Log-likelihood for many sets of values of the varied parameters.
+
+        Without model covariance, the model is evaluated for all parameter
+        sets at once with `~sncosmo.Model.bandflux_batch`. The model
+        parameters are left unchanged.
+
+        Parameters
+        ----------
+        parameters : `~numpy.ndarray` (2-d)
+            Values of ``vparam_names``, shape ``(N, len(vparam_names))``.
+
+        Returns
+        -------
+        loglike : `~numpy.ndarray` (1-d)
+        """
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=np.float64))
+        if self.modelcov:
+            saved = self.model.parameters.copy()
+            try:
+                return np.array([self.loglike(p) for p in parameters])
+            finally:
+                self.model.parameters = saved
+
+        if self.amplitude is not None:
+            return self._amplitude_loglike(*_profile_amplitude(
+                self.data.flux, self._unit_flux_batch(parameters),
+                self._solve))
+
+        allparameters = np.tile(self.model.parameters, (len(parameters), 1))
+        allparameters[:, self._idx] = parameters
+        mflux = self._zpnorm * self.model.bandflux_batch(
+            allparameters, self.data.band, self.data.time)
+        diff = self.data.flux - mflux
+        return -0.5 * np.sum(diff * self._solve(diff.T).T, axis=1)
+
+    def sample_amplitude(self, parameters, rstate=None):
+        """Draw the amplitude from its conditional posterior given each
+        set of values of the varied parameters.
+
+        The conditional posterior is the (Gaussian) likelihood in the
+        amplitude, truncated to ``amplitude_bounds`` if given. Only
+        available with ``amplitude='profile'`` or ``'marginalize'``.
+
+        Parameters
+        ----------
+        parameters : `~numpy.ndarray` (2-d)
+            Values of ``vparam_names``, shape ``(N, len(vparam_names))``.
+        rstate : `~numpy.random.RandomState`, optional
+            RandomState instance. If not given, the global random state of
+            the ``numpy.random`` module is used.
+
+        Returns
+        -------
+        amplitude : `~numpy.ndarray` (1-d)
+        """
+        if self.amplitude is None:
+            raise ValueError("amplitude is a varied parameter")
+        if rstate is None:
+            rstate = np.random
+
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=np.float64))
+        amplitude, fisher, _ = _profile_amplitude(
+            self.data.flux, self._unit_flux_batch(parameters), self._solve)
+        sigma = 1. / np.sqrt(fisher)
+        u = rstate.rand(len(parameters))
+        if self.amplitude_bounds is None:
+            return amplitude + sigma * special.ndtri(u)
+
+        low, high = self.amplitude_bounds
+        plow = special.ndtr((low - amplitude) / sigma)
+        phigh = special.ndtr((high - amplitude) / sigma)
+        draws = amplitude + sigma * special.ndtri(plow + u * (phigh - plow))
+        return np.clip(draws, low, high)
+
+
+def _profile_amplitude(flux, unitflux, solve):
+    """Best-fit amplitude of a model with flux ``unitflux`` at unit
+    amplitude (one or more rows), given the data ``flux`` and a function
+    returning ``cov^-1 b``.
+
+    Returns the amplitude, its Fisher information (inverse variance) and
+    the chisq at the best-fit amplitude.
+    """
+    wunit = solve(unitflux.T).T
+    fisher = np.sum(unitflux * wunit, axis=-1)
+    proj = np.dot(wunit, flux)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        amplitude = np.where(fisher > 0., proj / fisher, 0.)
+    chisq = np.dot(flux, solve(flux)) - amplitude * proj
+    return amplitude, fisher, chisq
+
+
+def generate_chisq(data, model, signature='iminuit', modelcov=False,
+                   profile_amplitude=False):
     """Define and return a chisq function for use in optimization.
 
-    This function pre-computes and saves the inverse covariance matrix,
+    This function pre-computes and saves the (factored) covariance,
     making subsequent evaluations faster. The model covariance (if specified)
-    is fixed at the time the chisq function is generated."""
+    is fixed at the time the chisq function is generated.
+
+    If ``profile_amplitude`` is True, the chisq is minimized analytically
+    over the amplitude parameter (``model.param_names[2]``): the value
+    passed for it is ignored, and the model amplitude is set to its
+    best-fit value on each evaluation."""
+
+    if signature != 'iminuit':
+        raise ValueError("unknown signature: {!r}".format(signature))
+    return _iminuit_chisq(LightCurveLikelihood(data, model), modelcov,
+                          profile=profile_amplitude)
+
+
+def _iminuit_chisq(like, modelcov, profile=False):
+    """chisq function for the data and model of a `LightCurveLikelihood`,
+    with the model covariance (if ``modelcov``) fixed at the current model
+    parameters. If ``profile``, the amplitude is set to its best-fit value.
+
+    iminuit expects each parameter to be a separate argument (including
+    fixed parameters).
+    """
+
+    _, solve = like._solver(modelcov)
+    model = like.model
+    flux = like.data.flux
+
+    def chisq(*parameters):
+        model.parameters = parameters
+        if profile:
+            model.parameters[2] = 1.
+            amplitude, _, value = _profile_amplitude(
+                flux, like._model_flux(), solve)
+            model.parameters[2] = amplitude
+            return float(value)
+        diff = flux - like._model_flux()
+        return np.dot(diff, solve(diff))
+
+    return chisq
+
+
+def _chisq_solver(data, model, modelcov):
+    """Model flux and a function returning ``cov^-1 b`` for the chisq
+    covariance, including the model covariance at the current parameters
+    if ``modelcov`` is True.
+
+    If the data covariance is diagonal and the model covariance is
+    structured (or not included), the covariance is never formed: systems
+    are solved in O(n) with `StructuredCovariance`. Otherwise, the
+    pseudo-inverse of the dense covariance is used.
+    """
 
-    # precompute inverse covariance matrix
-    cov = np.diag(data.fluxerr**2) if data.fluxcov is None else data.fluxcov
     if modelcov:
-        _, mcov = model.bandfluxcov(data.band, data.time,
-                                    zp=data.zp, zpsys=data.zpsys)
-        cov = cov + mcov
+        mflux, cov = model._bandfluxcov_structured(data.band, data.time,
+                                                   zp=data.zp,
+                                                   zpsys=data.zpsys)
+    else:
+        mflux = model.bandflux(data.band, data.time,
+                               zp=data.zp, zpsys=data.zpsys)
+        cov = StructuredCovariance(np.zeros(len(data)))
+
+    if data.fluxcov is None and isinstance(cov, StructuredCovariance):
+        cov = cov.add_diagonal(data.fluxerr**2)
+        if np.all(cov.diagonal > 0.):
+            return mflux, cov.solve
+
+    if isinstance(cov, StructuredCovariance):
+        cov = cov.toarray()
+    cov = cov + (np.diag(data.fluxerr**2) if data.fluxcov is None
+                 else data.fluxcov)
     invcov = np.linalg.pinv(cov)
+    return mflux, lambda b: np.dot(invcov, b)
 
-    # iminuit expects each parameter to be a separate argument (including fixed
-    # parameters)
-    if signature == 'iminuit':
-        def chisq(*parameters):
-            model.parameters = parameters
-            model_flux = model.bandflux(data.band, data.time,
-                                        zp=data.zp, zpsys=data.zpsys)
-            diff = data.flux - model_flux
-            return np.dot(np.dot(diff, invcov), diff)
 
-    else:
-        raise ValueError("unknown signature: {!r}".format(signature))
+def _generate_chisq_grad(like, vparam_names, modelcov=False, profile=False):
+    """Define and return the gradient of the function returned by
+    ``_iminuit_chisq(like, modelcov, profile)``.
 
-    return chisq
+    Only derivatives with respect to ``vparam_names`` are guaranteed to
+    be computed; the others may be zero. With ``profile``, the gradient
+    of the profiled chisq is that of the chisq at the best-fit amplitude,
+    and the derivative with respect to the amplitude is meaningless.
+    """
+
+    _, solve = like._solver(modelcov)
+    data = like.data
+    model = like.model
+    indicies = [model.param_names.index(name) for name in vparam_names]
+
+    def grad(*parameters):
+        model.parameters = parameters
+        if profile:
+            # model flux and its derivatives are proportional to amplitude
+            model.parameters[2] = 1.
+        model_flux, jac = model._bandflux_jacobian(
+            data.band, data.time, data.zp, data.zpsys, indicies)
+        if profile:
+            amplitude = _profile_amplitude(data.flux, model_flux, solve)[0]
+            model.parameters[2] = amplitude
+            model_flux = amplitude * model_flux
+            jac = amplitude * jac
+        diff = data.flux - model_flux
+        return -2. * np.dot(solve(diff), jac)
+
+    return grad
 
 
-def chisq(data, model, modelcov=False):
+def _fisher_errors(like, vparam_names):
+    """Parameter uncertainties from the diagonal of the Fisher matrix at
+    the current model parameters (without model covariance)."""
+
+    data = like.data
+    model = like.model
+    indicies = [model.param_names.index(name) for name in vparam_names]
+    _, jac = model._bandflux_jacobian(data.band, data.time, data.zp,
+                                      data.zpsys, indicies)
+    jac = jac[:, indicies]
+    fisher = np.sum(jac * like._solve(jac), axis=0)
+    with np.errstate(divide='ignore'):
+        return 1. / np.sqrt(fisher)
+
+
+def _profile_amplitude_covariance(like, modelcov, vparam_names, cov):
+    """Covariance of ``vparam_names``, including the amplitude profiled in
+    a fit, at the current (best-fit) model parameters.
+
+    ``cov`` is the covariance of the other varied parameters (for example,
+    from the minimizer). The best-fit amplitude is a function of them:
+    its variance is its conditional variance plus that propagated from
+    ``cov``.
+    """
+
+    data = like.data
+    model = like.model
+    _, solve = like._solver(modelcov)
+    amplitude = model.parameters[2]
+    k = vparam_names.index(model.param_names[2])
+    others = [i for i in range(len(vparam_names)) if i != k]
+    indicies = [model.param_names.index(vparam_names[i]) for i in others]
+
+    model.parameters[2] = 1.
+    unitflux, jac = model._bandflux_jacobian(data.band, data.time, data.zp,
+                                             data.zpsys, indicies)
+    model.parameters[2] = amplitude
+    _, fisher, _ = _profile_amplitude(data.flux, unitflux, solve)
+
+    # derivatives of the best-fit amplitude with respect to the others
+    grad = (np.dot(solve(data.flux - 2. * amplitude * unitflux),
+                   jac[:, indicies]) / fisher)
+
+    full = np.empty((len(vparam_names), len(vparam_names)))
+    full[np.ix_(others, others)] = cov
+    full[k, others] = full[others, k] = np.dot(cov, grad)
+    full[k, k] = 1. / fisher + np.dot(grad, np.dot(cov, grad))
+    return full
+
+
+def chisq(data, model, modelcov=False, profile_amplitude=False):
     """Calculate chisq statistic for the model, given the data.
 
     Parameters
@@ -67,6 +490,11 @@ def chisq(data, model, modelcov=False):
         Include model covariance? Calls ``model.bandfluxcov`` method
         instead of ``model.bandflux``. The source in the model must therefore
         implement covariance.
+    profile_amplitude : bool, optional
+        If True, return the minimum chisq over the amplitude parameter
+        (``model.param_names[2]``), found analytically, with the model
+        covariance (if included) evaluated at the current parameters. The
+        model is not modified. Default is False.
 
     Returns
     -------
@@ -75,25 +503,23 @@ def chisq(data, model, modelcov=False):
     data = photometric_data(data)
     data.sort_by_time()
 
+    if profile_amplitude:
+        _, solve = _chisq_solver(data, model, modelcov)
+        model = copy.copy(model)
+        model.parameters[2] = 1.
+        unitflux = model.bandflux(data.band, data.time,
+                                  zp=data.zp, zpsys=data.zpsys)
+        return float(_profile_amplitude(data.flux, unitflux, solve)[2])
+
     if data.fluxcov is None and not modelcov:
         mflux = model.bandflux(data.band, data.time,
                                zp=data.zp, zpsys=data.zpsys)
         return np.sum(((data.flux - mflux) / data.fluxerr)**2)
 
     else:
-        # need to invert a covariance matrix
-        cov = (np.diag(data.fluxerr**2) if data.fluxcov is None
-               else data.fluxcov)
-        if modelcov:
-            mflux, mcov = model.bandfluxcov(data.band, data.time,
-                                            zp=data.zp, zpsys=data.zpsys)
-            cov = cov + mcov
-        else:
-            mflux = model.bandflux(data.band, data.time,
-                                   zp=data.zp, zpsys=data.zpsys)
-        invcov = np.linalg.pinv(cov)
+        mflux, solve = _chisq_solver(data, model, modelcov)
         diff = data.flux - mflux
-        return np.dot(np.dot(diff, invcov), diff)
+        return np.dot(diff, solve(diff))
 
 
 def flatten_result(res):
@@ -188,6 +614,42 @@ def t0_bounds(data, model):
             model.get('t0') + np.max(data.time) - model.mintime())
 
 
+# Peaks of the template light curves used in guess_t0_and_amplitude:
+# {key: (peak flux, time of peak - t0)}, least recently used first.
+_TEMPLATE_PEAKS = OrderedDict()
+_MAX_TEMPLATE_PEAKS = 10000
+
+
+def _template_peak(model, band):
+    """Peak of the model light curve in a bandpass, sampled daily.
+
+    Returns the peak flux (for zp=25 in the AB system) divided by the
+    amplitude and the time of the peak relative to t0. These only depend
+    on the source, effects, bandpass and the parameters other than t0
+    and amplitude, so results are cached by these.
+    """
+    band = get_bandpass(band)
+    parameters = model.parameters
+    key = (model.source._cache_token,
+           tuple(effect._cache_token for effect in model.effects),
+           tuple(model._effect_frames),
+           tuple(np.delete(parameters, [1, 2])),
+           band._content_hash())
+    try:
+        peak = _TEMPLATE_PEAKS.pop(key)
+    except KeyError:
+        timegrid = np.linspace(model.mintime(), model.maxtime(),
+                               int(model.maxtime() - model.mintime() + 1))
+        lc = (model.bandflux(band, timegrid, zp=25., zpsys='ab') /
+              parameters[2])
+        i = np.argmax(lc)
+        peak = (lc[i], timegrid[i] - parameters[1])
+        if len(_TEMPLATE_PEAKS) >= _MAX_TEMPLATE_PEAKS:
+            _TEMPLATE_PEAKS.popitem(last=False)
+    _TEMPLATE_PEAKS[key] = peak
+    return peak
+
+
 def guess_t0_and_amplitude(data, model, minsnr):
     """Guess t0 and amplitude of the model based on the data."""
 
@@ -197,34 +659,28 @@ def guess_t0_and_amplitude(data, model, minsnr):
         raise DataQualityError('No data points with S/N > {0}. Initial '
                                'guessing failed.'.format(minsnr))
 
-    # grid on which to evaluate model light curve
-    timegrid = np.linspace(model.mintime(), model.maxtime(),
-                           int(model.maxtime() - model.mintime() + 1))
-
     # get data flux on a consistent scale in order to compare to model
     # flux light curve.
     norm_flux = significant_data.normalized_flux(zp=25., zpsys='ab')
 
-    model_lc = {}
+    model_peak = {}
     data_flux = {}
     data_time = {}
     for band in set(significant_data.band):
-        model_lc[band] = (
-            model.bandflux(band, timegrid, zp=25., zpsys='ab') /
-            model.parameters[2])
+        model_peak[band] = _template_peak(model, band)
         mask = significant_data.band == band
         data_flux[band] = norm_flux[mask]
         data_time[band] = significant_data.time[mask]
 
-    if len(model_lc) == 0:
+    if len(model_peak) == 0:
         raise DataQualityError('No data points with S/N > {0}. Initial '
                                'guessing failed.'.format(minsnr))
 
     # find band with biggest ratio of maximum data flux to maximum model flux
     maxratio = float("-inf")
     maxband = None
-    for band in model_lc:
-        ratio = np.max(data_flux[band]) / np.max(model_lc[band])
+    for band in model_peak:
+        ratio = np.max(data_flux[band]) / model_peak[band][0]
         if ratio > maxratio:
             maxratio = ratio
             maxband = band
@@ -234,8 +690,7 @@ def guess_t0_and_amplitude(data, model, minsnr):
 
     # time guess is time of max in the band with the biggest ratio
     data_tmax = data_time[maxband][np.argmax(data_flux[maxband])]
-    model_tmax = timegrid[np.argmax(model_lc[maxband])]
-    t0 = model.get('t0') + data_tmax - model_tmax
+    t0 = data_tmax - model_peak[maxband][1]
 
     return t0, amplitude
 
@@ -276,7 +731,8 @@ def _phase_and_wave_mask(data, t0, z, phase_range, wave_range):
 def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
            guess_amplitude=True, guess_t0=True, guess_z=True,
            minsnr=5.0, modelcov=False, verbose=False, maxcall=10000,
-           phase_range=None, wave_range=None, warn=True):
+           phase_range=None, wave_range=None, warn=True,
+           profile_amplitude=False):
     """Fit model parameters to data by minimizing chi^2.
 
     Ths function defines a chi^2 to minimize, makes initial guesses for
@@ -340,6 +796,12 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
 
         *New in version 1.5.0*
 
+    profile_amplitude : bool, optional
+        If True, the chi^2 is minimized over the amplitude parameter
+        analytically (see Notes), so that the minimizer varies one fewer
+        parameter. Only has an effect when fitting amplitude. Default is
+        False.
+
     Returns
     -------
     res : Result
@@ -397,6 +859,15 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
     the function will set the initial value of ``z`` to the average of the
     bounds on ``z``.
 
+    **amplitude profiling:** The model flux is proportional to the
+    amplitude, so for given values of the other parameters the best-fit
+    amplitude has a closed-form (weighted least squares) solution. With
+    ``profile_amplitude=True``, the minimizer varies the other parameters
+    only, and the amplitude is set to its best-fit value at each step
+    (ignoring ``bounds`` on the amplitude). The covariance of the
+    amplitude with the other parameters is propagated from that of the
+    other parameters.
+
     Examples
     --------
 
@@ -472,9 +943,15 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
     # Turn off guessing if we're not fitting the parameter.
     if model.param_names[2] not in vparam_names:
         guess_amplitude = False
+        profile_amplitude = False
     if 't0' not in vparam_names:
         guess_t0 = False
 
+    # Parameters varied by the minimizer.
+    mparam_names = [name for name in vparam_names
+                    if not (profile_amplitude and
+                            name == model.param_names[2])]
+
     # Make guesses for t0 and amplitude.
     # (For now, we assume it is the 3rd parameter of the model.)
     if (guess_amplitude or guess_t0):
@@ -499,8 +976,8 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
         for name in model.param_names:
             kwargs[name] = model.get(name)  # Starting point.
 
-            # Fix parameters not being varied in the fit.
-            if name not in vparam_names:
+            # Fix parameters not being varied by the minimizer.
+            if name not in mparam_names:
                 kwargs['fix_' + name] = True
                 kwargs['error_' + name] = 0.
                 continue
@@ -521,6 +998,15 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
                 step = 1.
             kwargs['error_' + name] = step
 
+        # Given an analytic gradient, Minuit takes its first step based on
+        # the initial step sizes: limit them to the parameter uncertainties
+        # expected from the Fisher information at the starting point.
+        like = LightCurveLikelihood(fitdata, model)
+        for name, error in zip(mparam_names,
+                               _fisher_errors(like, mparam_names)):
+            if np.isfinite(error) and error > 0.:
+                kwargs['error_' + name] = min(kwargs['error_' + name], error)
+
         if verbose:
             print("Initial parameters:")
             _print_iminuit_params(vparam_names, kwargs)
@@ -528,11 +1014,13 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
 
         # run once with no model covariance, regardless of whether
         # modelcov=True
-        fitchisq = generate_chisq(fitdata, model, signature='iminuit',
-                                  modelcov=False)
+        fitchisq = _iminuit_chisq(like, modelcov=False,
+                                  profile=profile_amplitude)
+        fitgrad = _generate_chisq_grad(like, mparam_names, modelcov=False,
+                                       profile=profile_amplitude)
         ndof = len(fitdata) - len(vparam_names)
 
-        m = iminuit.Minuit(fitchisq, errordef=1.,
+        m = iminuit.Minuit(fitchisq, grad=fitgrad, errordef=1.,
                            forced_parameters=model.param_names,
                            print_level=(1 if verbose >= 2 else 0),
                            throw_nan=True, **kwargs)
@@ -542,6 +1030,9 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
 
         # numpy array of best-fit values (including fixed parameters).
         parameters = np.array([m.values[name] for name in model.param_names])
+        if profile_amplitude:
+            fitchisq(*parameters)  # sets best-fit amplitude
+            parameters = model.parameters.copy()
         model.parameters = parameters  # set model parameters to best fit.
 
         # Iterative Fitting
@@ -571,14 +1062,18 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
             # re-crop data based on ranges, if necessary
             if (phase_range or wave_range):
                 fitdata = data[data_mask]
+                like = LightCurveLikelihood(fitdata, model)
 
             ndof = len(fitdata) - len(vparam_names)
 
             # generate chisq function based on new starting point
-            fitchisq = generate_chisq(fitdata, model, signature='iminuit',
-                                      modelcov=modelcov)
+            fitchisq = _iminuit_chisq(like, modelcov=modelcov,
+                                      profile=profile_amplitude)
+            fitgrad = _generate_chisq_grad(like, mparam_names,
+                                           modelcov=modelcov,
+                                           profile=profile_amplitude)
 
-            m = iminuit.Minuit(fitchisq, errordef=1.,
+            m = iminuit.Minuit(fitchisq, grad=fitgrad, errordef=1.,
                                forced_parameters=model.param_names,
                                print_level=(1 if verbose >= 2 else 0),
                                throw_nan=True, **kwargs)
@@ -589,6 +1084,9 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
 
             parameters = np.array([m.values[name]
                                    for name in model.param_names])
+            if profile_amplitude:
+                fitchisq(*parameters)
+                parameters = model.parameters.copy()
             model.parameters = parameters
             nfit += 1
 
@@ -610,7 +1108,7 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
                 # refit if *any* parameter changed by more than 10% of
                 # statistical error bar
                 if modelcov:
-                    for name in vparam_names:
+                    for name in mparam_names:
                         frac_change = (abs(m.values[name] - kwargs[name]) /
                                        m.errors[name])
                         refit = refit or frac_change > 0.1
@@ -640,15 +1138,24 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
             covariance = None
         else:
             covariance = np.array([
-                [m.covariance[(n1, n2)] for n1 in vparam_names]
-                for n2 in vparam_names])
+                [m.covariance[(n1, n2)] for n1 in mparam_names]
+                for n2 in mparam_names])
+            if profile_amplitude:
+                covariance = _profile_amplitude_covariance(
+                    like, modelcov, vparam_names, covariance)
 
         # OrderedDict of errors
         if m.errors is None:
             errors = None
         else:
-            errors = OrderedDict((name, m.errors[name])
-                                 for name in vparam_names)
+            errors = OrderedDict()
+            for i, name in enumerate(vparam_names):
+                if name in mparam_names:
+                    errors[name] = m.errors[name]
+                elif covariance is not None:  # profiled amplitude
+                    errors[name] = math.sqrt(covariance[i, i])
+                else:
+                    errors[name] = float('nan')
 
         # If we need to, unsort the mask so mask applies to input data
         if sortidx is not None:
@@ -685,10 +1192,469 @@ def fit_lc(data, model, vparam_names, bounds=None, method='minuit',
     return res, model
 
 
+# Model, varied parameters and fit_lc options of the fit_lc_many() call a
+# worker process serves, set once per process by _init_fit_worker.
+_FIT_WORKER_STATE = None
+
+
+def _init_fit_worker(model, vparam_names, kwargs):
+    global _FIT_WORKER_STATE
+    _FIT_WORKER_STATE = (model, vparam_names, kwargs)
+
+
+def _fit_task(state, task):
+    """Fit a single light curve for fit_lc_many.
+
+    Returns the flattened result (with the exit message) and an error
+    message, one of which is None.
+    """
+    model, vparam_names, kwargs = state
+    data, params = task
+    kwargs = dict(kwargs)
+    if kwargs.get('bounds') is not None:
+        kwargs['bounds'] = dict(kwargs['bounds'])  # fit_lc adds t0 bounds
+    try:
+        if params:
+            model = copy.copy(model)
+            model.update(params)
+        res, _ = fit_lc(data, model, vparam_names, **kwargs)
+        flat = flatten_result(res)
+        flat['message'] = res.message
+        return flat, None
+    except Exception as e:
+        return None, '{0}: {1}'.format(type(e).__name__, e)
+
+
+def _fit_worker_task(task):
+    return _fit_task(_FIT_WORKER_STATE, task)
+
+
+def fit_lc_many(datasets, model, vparam_names, params=None, n_workers=1,
+                chunksize=1, **kwargs):
+    """Fit a model to many light curves with `~sncosmo.fit_lc`, optionally
+    in parallel.
+
+    Parameters
+    ----------
+    datasets : iterable
+        Photometric data for each light curve, in any form accepted by
+        `~sncosmo.fit_lc`.
+    model : `~sncosmo.Model`
+        The model to fit. Each fit starts from the parameters of this
+        model, which is not modified.
+    vparam_names : list
+        Model parameters to vary in the fits.
+    params : iterable of dict, optional
+        Model parameter values to set before each fit (for example, a known
+        redshift), one dictionary per item in ``datasets``.
+    n_workers : int or None, optional
+        Number of worker processes. If 1 (default), fits are performed in
+        this process; if None, the number of CPUs is used.
+    chunksize : int, optional
+        Number of fits sent to a worker process at a time. Default is 1.
+    **kwargs
+        Further keyword arguments are passed to `~sncosmo.fit_lc`.
+
+    Returns
+    -------
+    results : `~astropy.table.Table`
+        One row per item in ``datasets``, in the same order, with the
+        columns of `~sncosmo.flatten_result`, a ``message`` column with
+        the exit message of the fit and an ``error`` column. If a fit
+        raises an exception, ``error`` holds the exception type and
+        message (otherwise it is an empty string), ``success`` is 0 and
+        the other values are 0 or NaN.
+
+    Notes
+    -----
+    The model and keyword arguments are sent to each worker process once,
+    when it starts; only the data and ``params`` are sent per fit. Results
+    are collected in input order as the fits complete.
+    """
+
+    if params is None:
+        params = itertools.repeat(None)
+    tasks = six.moves.zip(datasets, params)
+    state = (model, vparam_names, kwargs)
+
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    if n_workers == 1:
+        return _fit_table(model.param_names,
+                          (_fit_task(state, task) for task in tasks))
+
+    pool = multiprocessing.Pool(n_workers, initializer=_init_fit_worker,
+                                initargs=state)
+    try:
+        return _fit_table(model.param_names,
+                          pool.imap(_fit_worker_task, tasks,
+                                    chunksize=chunksize))
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _fit_table(param_names, results):
+    """Table of (flattened result, error message) pairs from _fit_task."""
+
+    # Row for a failed fit; keys are the columns of flatten_result.
+    nan = float('nan')
+    failed = OrderedDict([('success', 0), ('ncall', 0), ('chisq', nan),
+                          ('ndof', 0)])
+    for n in param_names:
+        failed[n] = nan
+        failed[n + '_err'] = nan
+    for n1 in param_names:
+        for n2 in param_names:
+            failed[n1 + '_' + n2 + '_cov'] = nan
+    failed['message'] = ''
+
+    rows = []
+    for flat, error in results:
+        row = failed if flat is None else flat
+        rows.append([row[key] for key in failed] +
+                    ['' if error is None else error])
+
+    colnames = list(failed) + ['error']
+    if len(rows) == 0:
+        dtype = [type(v) for v in failed.values()] + [str]
+        return Table(names=colnames, dtype=dtype)
+    return Table(rows=rows, names=colnames)
+
+
+_SCAN_Z_WORKER_STATE = None
+
+
+def _init_scan_z_worker(*state):
+    global _SCAN_Z_WORKER_STATE
+    _SCAN_Z_WORKER_STATE = state
+
+
+def _scan_z_task(state, zs):
+    """Fit at each redshift in ``zs`` in turn for scan_z.
+
+    With warm starts, each fit starts from the best fit at the previous
+    redshift (if it succeeded) rather than from guesses, and is repeated
+    from guesses if it fails.
+    """
+    data, model, vparam_names, warm_start, kwargs = state
+    bounds = kwargs.get('bounds') or {}
+    warm_kwargs = dict(kwargs, guess_amplitude=False, guess_t0=False)
+
+    results = []
+    start = None
+    for z in zs:
+        flat = None
+        if start is not None:
+            params = dict(start, z=z)
+            flat, error = _fit_task((model, vparam_names, warm_kwargs),
+                                    (data, params))
+        if flat is None or not flat['success']:
+            flat, error = _fit_task((model, vparam_names, kwargs),
+                                    (data, {'z': z}))
+        results.append((flat, error))
+
+        start = None
+        if warm_start and flat is not None and flat['success']:
+            start = {}
+            for name in vparam_names:
+                value = flat[name]
+                if name in bounds and None not in bounds[name]:
+                    value = min(max(value, bounds[name][0]), bounds[name][1])
+                start[name] = value
+    return results
+
+
+def _scan_z_worker_task(zs):
+    return _scan_z_task(_SCAN_Z_WORKER_STATE, zs)
+
+
+def scan_z(data, model, z_grid, vparam_names, warm_start=True, n_workers=1,
+           **kwargs):
+    """Profile the chi^2 of a light curve fit over a grid of redshifts.
+
+    At each redshift in ``z_grid``, the model parameters ``vparam_names``
+    are fit to the data with `~sncosmo.fit_lc` with the redshift fixed.
+
+    Parameters
+    ----------
+    data : `~astropy.table.Table` or `~numpy.ndarray` or `dict`
+        Table of photometric data, as accepted by `~sncosmo.fit_lc`.
+    model : `~sncosmo.Model`
+        The model to fit. Fits start from the parameters of this model,
+        which is not modified.
+    z_grid : array_like
+        Redshifts at which to fit.
+    vparam_names : list
+        Model parameters to vary at each redshift. Must not include ``z``.
+    warm_start : bool, optional
+        If True (default), start each fit from the best fit at the
+        neighbouring redshift, without guessing ``t0`` and amplitude (see
+        Notes).
+    n_workers : int or None, optional
+        Number of worker processes. If 1 (default), fits are performed in
+        this process; if None, the number of CPUs is used.
+    **kwargs
+        Further keyword arguments are passed to `~sncosmo.fit_lc`. Unless
+        given, ``warn`` is False: bands outside the model wavelength range
+        at a given redshift are dropped silently, and are reflected in
+        ``ndof``.
+
+    Returns
+    -------
+    results : `~astropy.table.Table`
+        One row per redshift, in the order of ``z_grid``, with the columns
+        of `~sncosmo.fit_lc_many`. The profile chi^2 is the ``chisq``
+        column; note that ``ndof`` can vary along the grid. The ``z``
+        column holds the grid redshifts, including for failed fits.
+
+    Notes
+    -----
+    Redshifts are fit in increasing order, so that the per-redshift
+    caches of the model (for example, rest-frame interpolation plans) are
+    reused by all evaluations of a fit. With ``warm_start``, the first fit
+    (and any fit following a failed one) makes the usual initial guesses;
+    others start from the previous best fit, clipped to ``bounds``, and
+    are repeated with the usual guesses if unsuccessful.
+
+    With ``n_workers > 1``, the sorted grid is split into ``n_workers``
+    contiguous segments, each fitted in turn by one worker process; the
+    first fit of each segment makes the usual initial guesses.
+
+    Examples
+    --------
+
+    Find the best-fit redshift on a grid:
+
+    >>> z_grid = np.linspace(0.05, 1.0, 96)
+    >>> results = sncosmo.scan_z(data, model, z_grid,
+    ...                          ['t0', 'x0', 'x1', 'c'])
+    >>> zbest = results['z'][np.nanargmin(results['chisq'])]
+    """
+
+    if 'z' in vparam_names:
+        raise ValueError("z cannot be varied in scan_z")
+    kwargs.setdefault('warn', False)
+
+    # Standardize and sort data once for all fits
+    data = photometric_data(data)
+    if not np.all(np.ediff1d(data.time) >= 0.0):
+        data = data[np.argsort(data.time)]
+
+    z_grid = np.atleast_1d(np.asarray(z_grid, dtype=np.float64))
+    order = np.argsort(z_grid, kind='mergesort')
+    state = (data, model, vparam_names, warm_start, kwargs)
+
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    if n_workers == 1:
+        results = _scan_z_task(state, z_grid[order])
+    else:
+        segments = [seg for seg in np.array_split(z_grid[order], n_workers)
+                    if len(seg) > 0]
+        pool = multiprocessing.Pool(n_workers,
+                                    initializer=_init_scan_z_worker,
+                                    initargs=state)
+        try:
+            results = list(itertools.chain.from_iterable(
+                pool.map(_scan_z_worker_task, segments, chunksize=1)))
+        finally:
+            pool.terminate()
+            pool.join()
+
+    # restore the order of z_grid
+    unsorted = [None] * len(results)
+    for i, result in zip(order, results):
+        unsorted[i] = result
+    table = _fit_table(model.param_names, unsorted)
+    table['z'] = z_grid  # also for failed fits
+    return table
+
+
+# LightCurveLikelihood evaluated by a worker process of nest_lc, set once
+# per process by _init_like_worker.
+_LIKE_WORKER = None
+
+
+def _init_like_worker(like):
+    global _LIKE_WORKER
+    _LIKE_WORKER = like
+
+
+def _like_worker_batch(parameters):
+    return _LIKE_WORKER.loglike_batch(parameters)
+
+
+def _nest_sample_batch(loglike_batch, prior_transform, ndim, npdim, npoints,
+                       method, batch_size, maxiter, maxcall, rstate, callback,
+                       dlogz=0.5, enlarge=1.2, update_interval=None):
+    """Nested sampling with batched likelihood evaluation.
+
+    Follows the algorithm of ``nestle.sample`` (with the 'single' or
+    'multi' method), except that new points are proposed ``batch_size`` at
+    a time from the current bounding ellipsoid(s), and their likelihoods
+    evaluated together by ``loglike_batch`` (which maps an array of shape
+    ``(n, ndim)`` to ``n`` log-likelihoods). Each iteration takes the next
+    proposal satisfying the likelihood constraint; remaining proposals are
+    discarded when the bound is updated. Results are reproducible for a
+    given ``rstate`` and ``batch_size``.
+
+    Returns a `~sncosmo.utils.Result` with the fields of a nestle result.
+    """
+
+    import nestle
+
+    if method not in ('single', 'multi'):
+        raise ValueError("batched nested sampling requires method 'single' "
+                         "or 'multi'")
+    if rstate is None:
+        rstate = np.random
+    if maxiter is None:
+        maxiter = sys.maxsize
+    if maxcall is None:
+        maxcall = sys.maxsize
+    if update_interval is None:
+        update_interval = max(1, round(0.6 * npoints))
+
+    # Initialize active points and calculate likelihoods.
+    active_u = rstate.rand(npoints, npdim)
+    active_v = np.array([prior_transform(u) for u in active_u])
+    active_logl = np.asarray(loglike_batch(active_v), dtype=np.float64)
+    if np.any(np.isnan(active_logl)):
+        raise ValueError("NaN log-likelihood in initial active points")
+    ncall = npoints
+
+    ells = None  # sample the unit cube until the first bound update
+    proposals = deque()
+
+    def propose():
+        """Draw a batch of points from the bound and evaluate them."""
+        us = []
+        while len(us) < batch_size:
+            if ells is None:
+                u = rstate.rand(npdim)
+            else:
+                vols = np.array([ell.vol for ell in ells])
+                i = rstate.choice(len(ells), p=vols / np.sum(vols))
+                u = ells[i].sample(rstate=rstate)
+
+                # With overlapping ellipsoids, accept points with
+                # probability 1/q, where q is the number containing them.
+                if len(ells) > 1:
+                    q = sum(ell.contains(u) for ell in ells)
+                    if q > 1 and rstate.rand() > 1. / q:
+                        continue
+            if np.any(u < 0.) or np.any(u > 1.):
+                continue
+            us.append(u)
+        vs = np.array([prior_transform(u) for u in us])
+        proposals.extend(zip(us, vs, loglike_batch(vs)))
+        return len(us)
+
+    saved_v = []
+    saved_logl = []
+    saved_logvol = []
+    saved_logwt = []
+    h = 0.
+    logz = -1.e300
+    logvol = math.log(1. - math.exp(-1. / npoints))
+    it = 0
+    since_update = 0
+
+    while it < maxiter:
+        if callback is not None and it > 0:
+            callback({'it': it, 'logz': logz, 'active_u': active_u})
+
+        # worst object in collection and its weight (= volume * likelihood)
+        worst = np.argmin(active_logl)
+        logwt = logvol + active_logl[worst]
+
+        # update evidence Z and information h.
+        logz_new = np.logaddexp(logz, logwt)
+        h = (math.exp(logwt - logz_new) * active_logl[worst] +
+             math.exp(logz - logz_new) * (h + logz) - logz_new)
+        logz = logz_new
+
+        saved_v.append(np.array(active_v[worst]))
+        saved_logwt.append(logwt)
+        saved_logvol.append(logvol)
+        saved_logl.append(active_logl[worst])
+
+        # The new likelihood constraint is that of the worst object.
+        loglstar = active_logl[worst]
+
+        # Update the bound based on the current active points.
+        if since_update >= update_interval:
+            pointvol = math.exp(-it / npoints) / npoints
+            if method == 'single':
+                ells = [nestle.bounding_ellipsoid(active_u,
+                                                  pointvol=pointvol)]
+            else:
+                ells = nestle.bounding_ellipsoids(active_u, pointvol=pointvol)
+            for ell in ells:
+                ell.scale_to_vol(ell.vol * enlarge)
+            proposals.clear()
+            since_update = 0
+
+        # Take the next proposal within the likelihood constraint.
+        while True:
+            if not proposals:
+                n = propose()
+                ncall += n
+                since_update += n
+            u, v, logl = proposals.popleft()
+            if logl > loglstar:
+                break
+
+        active_u[worst] = u
+        active_v[worst] = v
+        active_logl[worst] = logl
+
+        # Shrink interval
+        logvol -= 1. / npoints
+
+        # Stop when the estimated remaining evidence is small.
+        logz_remain = np.max(active_logl) - it / npoints
+        if np.logaddexp(logz, logz_remain) - logz < dlogz:
+            break
+        if ncall > maxcall:
+            break
+        it += 1
+
+    # Add remaining active points.
+    niter = len(saved_v)  # number of iterations done
+    logvol = -niter / npoints - math.log(npoints)
+    for i in range(npoints):
+        logwt = logvol + active_logl[i]
+        logz_new = np.logaddexp(logz, logwt)
+        h = (math.exp(logwt - logz_new) * active_logl[i] +
+             math.exp(logz - logz_new) * (h + logz) - logz_new)
+        logz = logz_new
+        saved_v.append(np.array(active_v[i]))
+        saved_logwt.append(logwt)
+        saved_logl.append(active_logl[i])
+        saved_logvol.append(logvol)
+
+    # Correct small negative h due to numerical error (e.g. for flat
+    # likelihoods).
+    h = max(h, 0.)
+
+    return Result(niter=niter,
+                  ncall=ncall,
+                  logz=logz,
+                  logzerr=math.sqrt(h / npoints),
+                  h=h,
+                  samples=np.array(saved_v),
+                  weights=np.exp(np.array(saved_logwt) - logz),
+                  logvol=np.array(saved_logvol),
+                  logl=np.array(saved_logl))
+
+
 def nest_lc(data, model, vparam_names, bounds, guess_amplitude_bound=False,
             minsnr=5., priors=None, ppfs=None, npoints=100, method='single',
             maxiter=None, maxcall=None, modelcov=False, rstate=None,
-            verbose=False, warn=True, **kwargs):
+            verbose=False, warn=True, batch_size=None, n_workers=1,
+            marginalize_amplitude=False, **kwargs):
     """Run nested sampling algorithm to estimate model parameters and evidence.
 
     Parameters
@@ -753,6 +1719,20 @@ def nest_lc(data, model, vparam_names, bounds, guess_amplitude_bound=False,
 
         *New in version 1.5.0*
 
+    batch_size : int, optional
+        If given, propose new points ``batch_size`` at a time from each
+        bound and evaluate their likelihoods together (see Notes). Only
+        the 'single' and 'multi' methods are supported.
+    n_workers : int, optional
+        Number of worker processes over which each batch of likelihood
+        evaluations is split. If greater than 1, ``batch_size`` defaults
+        to ``n_workers``. Default is 1.
+    marginalize_amplitude : bool, optional
+        If True, integrate the likelihood over the amplitude parameter
+        analytically rather than sampling it (see Notes). The amplitude
+        must be varied, with a flat prior within its bounds, and
+        ``modelcov`` must be False. Default is False.
+
     Returns
     -------
     res : Result
@@ -794,6 +1774,23 @@ def nest_lc(data, model, vparam_names, bounds, guess_amplitude_bound=False,
     estimated_model : `~sncosmo.Model`
         A copy of the model with parameters set to the values in
         ``res.parameters``.
+
+    Notes
+    -----
+    With ``batch_size`` (or ``n_workers > 1``), sampling is done by a
+    nested sampling loop in sncosmo that follows the algorithm of
+    ``nestle.sample``, but evaluates likelihoods in batches with
+    `~sncosmo.LightCurveLikelihood.loglike_batch`, so that they can be
+    vectorized and split over processes. Results are reproducible for a
+    given ``rstate`` and ``batch_size`` (regardless of ``n_workers``), but
+    differ from those of ``nestle.sample``.
+
+    With ``marginalize_amplitude=True``, the model flux being proportional
+    to the amplitude, the likelihood is integrated over the amplitude
+    analytically (see `~sncosmo.LightCurveLikelihood`), so that nested
+    sampling explores one fewer dimension; the evidence is unchanged.
+    Amplitudes in ``samples`` are then drawn from their conditional
+    posterior given the other parameters of each sample.
     """
 
     try:
@@ -856,6 +1853,25 @@ def nest_lc(data, model, vparam_names, bounds, guess_amplitude_bound=False,
     if tied is None:
         tied = {}
 
+    # Parameters sampled (all varied parameters, unless the amplitude is
+    # marginalized).
+    amplitude_name = model.param_names[2]
+    if marginalize_amplitude:
+        if amplitude_name not in vparam_names:
+            raise ValueError("amplitude parameter {0!r} must be varied to "
+                             "be marginalized".format(amplitude_name))
+        if (amplitude_name in ppfs or amplitude_name in tied or
+                (priors is not None and amplitude_name in priors)):
+            raise ValueError("marginalizing amplitude parameter {0!r} "
+                             "requires a flat prior".format(amplitude_name))
+        if amplitude_name not in bounds:
+            raise ValueError("Must supply bounds for parameter {0!r}"
+                             .format(amplitude_name))
+        sparam_names = [name for name in vparam_names
+                        if name != amplitude_name]
+    else:
+        sparam_names = vparam_names
+
     # Convert bounds/priors combinations into ppfs
     if bounds is not None:
         for key, val in six.iteritems(bounds):
@@ -877,13 +1893,13 @@ def nest_lc(data, model, vparam_names, bounds, guess_amplitude_bound=False,
     # with same random seed.  This is because iparam_names[i] is
     # matched to u[i] below and u will be in a reproducible order,
     # so iparam_names must also be.
-    iparam_names = [key for key in vparam_names if key in ppfs]
+    iparam_names = [key for key in sparam_names if key in ppfs]
     ppflist = [ppfs[key] for key in iparam_names]
     npdim = len(iparam_names)  # length of u
-    ndim = len(vparam_names)  # length of v
+    ndim = len(sparam_names)  # length of v
 
     # Check that all param_names either have a direct prior or are tied.
-    for name in vparam_names:
+    for name in sparam_names:
         if name in iparam_names:
             continue
         if name in tied:
@@ -897,29 +1913,60 @@ def nest_lc(data, model, vparam_names, bounds, guess_amplitude_bound=False,
             d[iparam_names[i]] = ppflist[i](u[i])
         v = np.empty(ndim, dtype=np.float)
         for i in range(ndim):
-            key = vparam_names[i]
+            key = sparam_names[i]
             if key in d:
                 v[i] = d[key]
             else:
                 v[i] = tied[key](d)
         return v
 
-    # Indicies of the model parameters in vparam_names
-    idx = np.array([model.param_names.index(name) for name in vparam_names])
-
-    def loglike(parameters):
-        model.parameters[idx] = parameters
-        return -0.5 * chisq(fitdata, model, modelcov=modelcov)
+    if marginalize_amplitude:
+        like = LightCurveLikelihood(fitdata, model, sparam_names,
+                                    modelcov=modelcov, amplitude='marginalize',
+                                    amplitude_bounds=bounds[amplitude_name])
+    else:
+        like = LightCurveLikelihood(fitdata, model, vparam_names,
+                                    modelcov=modelcov)
+    callback = nestle.print_progress if verbose else None
+    if batch_size is None and n_workers > 1:
+        batch_size = n_workers
+    if batch_size is not None and batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
 
     t0 = time.time()
-    res = nestle.sample(loglike, prior_transform, ndim, npdim=npdim,
-                        npoints=npoints, method=method, maxiter=maxiter,
-                        maxcall=maxcall, rstate=rstate,
-                        callback=(nestle.print_progress if verbose else None))
+    if batch_size is None:
+        res = nestle.sample(like.loglike, prior_transform, ndim, npdim=npdim,
+                            npoints=npoints, method=method, maxiter=maxiter,
+                            maxcall=maxcall, rstate=rstate, callback=callback)
+    elif n_workers > 1:
+        pool = multiprocessing.Pool(n_workers, initializer=_init_like_worker,
+                                    initargs=(like,))
+        try:
+            def loglike_batch(parameters):
+                chunks = np.array_split(parameters,
+                                        min(n_workers, len(parameters)))
+                return np.concatenate(pool.map(_like_worker_batch, chunks))
+
+            res = _nest_sample_batch(loglike_batch, prior_transform, ndim,
+                                     npdim, npoints, method, batch_size,
+                                     maxiter, maxcall, rstate, callback)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        res = _nest_sample_batch(like.loglike_batch, prior_transform, ndim,
+                                 npdim, npoints, method, batch_size, maxiter,
+                                 maxcall, rstate, callback)
     elapsed = time.time() - t0
 
+    samples = res.samples
+    if marginalize_amplitude:
+        amplitudes = like.sample_amplitude(samples, rstate=rstate)
+        samples = np.insert(samples, vparam_names.index(amplitude_name),
+                            amplitudes, axis=1)
+
     # estimate parameters and covariance from samples
-    vparameters, cov = nestle.mean_and_cov(res.samples, res.weights)
+    vparameters, cov = nestle.mean_and_cov(samples, res.weights)
 
     # update model parameters to estimated ones.
     model.set(**dict(zip(vparam_names, vparameters)))
@@ -936,7 +1983,7 @@ def nest_lc(data, model, vparam_names, bounds, guess_amplitude_bound=False,
                  logz=res.logz,
                  logzerr=res.logzerr,
                  h=res.h,
-                 samples=res.samples,
+                 samples=samples,
                  weights=res.weights,
                  logvol=res.logvol,
                  logl=res.logl,
@@ -966,11 +2013,60 @@ def nest_lc(data, model, vparam_names, bounds, guess_amplitude_bound=False,
     return res, model
 
 
+class _MCMCPosterior(object):
+    """Log-likelihood, log-prior and log-posterior for mcmc_lc.
+
+    The prior is flat within ``bounds`` (a list of (varied parameter
+    index, low, high)), times ``priors`` (a list of (varied parameter
+    index, function)). Defined as a class (rather than closures) so that
+    it can be pickled for evaluation in a pool, provided the prior
+    functions can be.
+    """
+
+    def __init__(self, like, bounds, priors):
+        self.like = like
+        self.bounds = bounds
+        self.priors = priors
+
+    def lnlike(self, parameters):
+        for i, low, high in self.bounds:
+            if not low < parameters[i] < high:
+                return -np.inf
+        return self.like.loglike(parameters)
+
+    def lnprior(self, parameters):
+        logp = 0
+        for i, func in self.priors:
+            logp += math.log(func(parameters[i]))
+        return logp
+
+    def __call__(self, parameters):
+        return self.lnprior(parameters) + self.lnlike(parameters)
+
+    def batch(self, parameters):
+        """Log-posterior for many parameter sets (rows of ``parameters``),
+        with the likelihood evaluated for all of them at once. The prior
+        functions must accept arrays."""
+
+        inside = np.ones(len(parameters), dtype=np.bool_)
+        for i, low, high in self.bounds:
+            inside &= (low < parameters[:, i]) & (parameters[:, i] < high)
+
+        logp = np.full(len(parameters), -np.inf)
+        p = parameters[inside]
+        if len(p) > 0:
+            logp[inside] = self.like.loglike_batch(p)
+            for i, func in self.priors:
+                logp[inside] += np.log(func(p[:, i]))
+        return logp
+
+
 def mcmc_lc(data, model, vparam_names, bounds=None, priors=None,
             guess_amplitude=True, guess_t0=True, guess_z=True,
             minsnr=5., modelcov=False, nwalkers=10, nburn=200,
             nsamples=1000, sampler='ensemble', ntemps=4, thin=1,
-            a=2.0, warn=True):
+            a=2.0, warn=True, vectorize=False, pool=None,
+            marginalize_amplitude=False):
     """Run an MCMC chain to get model parameter samples.
 
     This is a convenience function around `emcee.EnsembleSampler` andx
@@ -1046,6 +2142,24 @@ def mcmc_lc(data, model, vparam_names, bounds=None, priors=None,
 
         *New in version 1.5.0*
 
+    vectorize : bool, optional
+        If True, evaluate the posterior for all walkers of a step at once,
+        with a single batched model evaluation (using emcee's
+        ``vectorize`` option, which requires emcee 3 and
+        ``sampler='ensemble'``). Prior functions must then accept arrays.
+        Default is False.
+    pool : object, optional
+        Pool with a ``map`` method (such as `multiprocessing.Pool`) passed
+        to the sampler to evaluate walkers in parallel. The prior functions
+        must then be picklable.
+    marginalize_amplitude : bool, optional
+        If True, integrate the likelihood over the amplitude parameter
+        analytically, so that walkers explore one fewer dimension. The
+        amplitude must be varied, with a flat prior (within its bounds, if
+        given), and ``modelcov`` must be False. Amplitudes in ``samples``
+        are drawn from their conditional posterior given the other
+        parameters of each sample. Default is False.
+
     Returns
     -------
     res : Result
@@ -1111,7 +2225,6 @@ def mcmc_lc(data, model, vparam_names, bounds=None, priors=None,
 
     # Order vparam_names the same way it is ordered in the model:
     vparam_names = [s for s in model.param_names if s in vparam_names]
-    ndim = len(vparam_names)
 
     # Check that 'z' is bounded (if it is going to be fit).
     if 'z' in vparam_names:
@@ -1149,33 +2262,38 @@ def mcmc_lc(data, model, vparam_names, bounds=None, priors=None,
         if guess_t0:
             model.set(t0=t0)
 
-    # Indicies used in probability function.
-    # modelidx: Indicies of model parameters corresponding to vparam_names.
-    # idxbounds: tuples of (varied parameter index, low bound, high bound).
-    # idxpriors: tuples of (varied parameter index, function).
-    modelidx = np.array([model.param_names.index(k) for k in vparam_names])
-    idxbounds = [(vparam_names.index(k), bounds[k][0], bounds[k][1])
-                 for k in bounds]
-    idxpriors = [(vparam_names.index(k), priors[k]) for k in priors]
-
-    # Posterior function.
-    def lnlike(parameters):
-        for i, low, high in idxbounds:
-            if not low < parameters[i] < high:
-                return -np.inf
-
-        model.parameters[modelidx] = parameters
-        logp = -0.5 * chisq(fitdata, model, modelcov=modelcov)
-        return logp
-
-    def lnprior(parameters):
-        logp = 0
-        for i, func in idxpriors:
-            logp += math.log(func(parameters[i]))
-        return logp
+    # Parameters sampled (all varied parameters, unless the amplitude is
+    # marginalized).
+    amplitude_name = model.param_names[2]
+    if marginalize_amplitude:
+        if amplitude_name not in vparam_names:
+            raise ValueError("amplitude parameter {0!r} must be varied to "
+                             "be marginalized".format(amplitude_name))
+        if amplitude_name in priors:
+            raise ValueError("marginalizing amplitude parameter {0!r} "
+                             "requires a flat prior".format(amplitude_name))
+        sparam_names = [name for name in vparam_names
+                        if name != amplitude_name]
+        like = LightCurveLikelihood(
+            fitdata, model, sparam_names, modelcov=modelcov,
+            amplitude='marginalize',
+            amplitude_bounds=bounds.get(amplitude_name))
+    else:
+        sparam_names = vparam_names
+        like = LightCurveLikelihood(fitdata, model, vparam_names,
+                                    modelcov=modelcov)
+    ndim = len(sparam_names)
 
-    def lnprob(parameters):
-        return lnprior(parameters) + lnlike(parameters)
+    # Indicies used in probability function.
+    # modelidx: Indicies of model parameters corresponding to sparam_names.
+    # idxbounds: tuples of (sampled parameter index, low bound, high bound).
+    # idxpriors: tuples of (sampled parameter index, function).
+    modelidx = np.array([model.param_names.index(k) for k in sparam_names])
+    idxbounds = [(sparam_names.index(k), bounds[k][0], bounds[k][1])
+                 for k in bounds
+                 if not (marginalize_amplitude and k == amplitude_name)]
+    idxpriors = [(sparam_names.index(k), priors[k]) for k in priors]
+    posterior = _MCMCPosterior(like, idxbounds, idxpriors)
 
     # Heuristic determination of walker initial positions: distribute
     # walkers uniformly over parameter space. If no bounds are
@@ -1184,7 +2302,7 @@ def mcmc_lc(data, model, vparam_names, bounds=None, priors=None,
 
     if sampler == 'pt':
         pos = np.empty((ndim, nwalkers, ntemps))
-        for i, name in enumerate(vparam_names):
+        for i, name in enumerate(sparam_names):
             if name in bounds:
                 pos[i] = np.random.uniform(low=bounds[name][0],
                                            high=bounds[name][1],
@@ -1195,7 +2313,10 @@ def mcmc_lc(data, model, vparam_names, bounds=None, priors=None,
                 pos[i] = np.random.uniform(low=ctr-scale, high=ctr+scale,
                                            size=(nwalkers, ntemps))
         pos = np.swapaxes(pos, 0, 2)
-        sampler = emcee.PTSampler(ntemps, nwalkers, ndim, lnlike, lnprob, a=a)
+        if vectorize:
+            raise ValueError("vectorize=True requires sampler='ensemble'")
+        sampler = emcee.PTSampler(ntemps, nwalkers, ndim, posterior.lnlike,
+                                  posterior, a=a, pool=pool)
 
     # Heuristic determination of walker initial positions: distribute
     # walkers in a symmetric gaussian ball, with heuristically
@@ -1204,7 +2325,7 @@ def mcmc_lc(data, model, vparam_names, bounds=None, priors=None,
     elif sampler == 'ensemble':
         ctr = model.parameters[modelidx]
         scale = np.ones(ndim)
-        for i, name in enumerate(vparam_names):
+        for i, name in enumerate(sparam_names):
             if name in bounds:
                 scale[i] = 0.0001 * (bounds[name][1] - bounds[name][0])
             elif model.get(name) != 0.:
@@ -1212,7 +2333,16 @@ def mcmc_lc(data, model, vparam_names, bounds=None, priors=None,
             else:
                 scale[i] = 0.1
         pos = ctr + scale * np.random.normal(size=(nwalkers, ndim))
-        sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, a=a)
+        if vectorize:
+            try:
+                sampler = emcee.EnsembleSampler(nwalkers, ndim,
+                                                posterior.batch, a=a,
+                                                pool=pool, vectorize=True)
+            except TypeError:
+                raise ValueError("vectorize=True requires emcee>=3")
+        else:
+            sampler = emcee.EnsembleSampler(nwalkers, ndim, posterior, a=a,
+                                            pool=pool)
 
     else:
         raise ValueError('Invalid sampler type. Currently "pt" '
@@ -1223,6 +2353,9 @@ def mcmc_lc(data, model, vparam_names, bounds=None, priors=None,
     sampler.reset()
     sampler.run_mcmc(pos, nsamples, thin=thin)  # production run
     samples = sampler.flatchain.reshape(-1, ndim)
+    if marginalize_amplitude:
+        samples = np.insert(samples, vparam_names.index(amplitude_name),
+                            like.sample_amplitude(samples), axis=1)
 
     # Summary statistics.
     vparameters = np.mean(samples, axis=0)
@@ -1,12 +1,16 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 
 import abc
+import hashlib
 import math
+import os
+from collections import OrderedDict
 
 import numpy as np
 import astropy.units as u
 import astropy.constants as const
 
+from . import conf
 from ._registry import Registry
 from .bandpasses import get_bandpass
 from .utils import integration_grid, warn_once
@@ -26,12 +30,19 @@ def get_magsystem(name):
 
 
 class MagSystem(object):
-    """An abstract base class for magnitude systems."""
+    """An abstract base class for magnitude systems.
+
+    Zeropoint fluxes are cached by bandpass transmission, keeping the
+    ``conf.zpbandflux_cache_size`` most recently used bandpasses.
+    Subclasses that identify their standard (see ``_standard_hash``) also
+    store them in ``conf.zpbandflux_cache_dir``, if set, for use by other
+    processes.
+    """
 
     __metaclass__ = abc.ABCMeta
 
     def __init__(self, name=None):
-        self._zpbandflux = {}
+        self._zpbandflux = OrderedDict()
         self._name = name
 
     @abc.abstractmethod
@@ -48,6 +59,15 @@ class MagSystem(object):
     def name(self, value):
         self._name = value
 
+    def _zpcache_key(self, band):
+        """Key of ``band`` in the zeropoint flux cache."""
+        return band._content_hash()
+
+    def _standard_hash(self):
+        """String identifying the standard, used to store zeropoint fluxes
+        on disk. None (the default) disables storing."""
+        return None
+
     def zpbandflux(self, band):
         """Flux of an object with magnitude zero in the given bandpass.
 
@@ -62,11 +82,55 @@ class MagSystem(object):
         """
 
         band = get_bandpass(band)
+        key = self._zpcache_key(band)
+        cache = self._zpbandflux
         try:
-            return self._zpbandflux[band]
+            bandflux = cache.pop(key)
         except KeyError:
-            bandflux = self._refspectrum_bandflux(band)
-            self._zpbandflux[band] = bandflux
+            bandflux = self._stored_zpbandflux(band)
+            while len(cache) >= max(conf.zpbandflux_cache_size, 1):
+                cache.popitem(last=False)
+        cache[key] = bandflux
+
+        return bandflux
+
+    def _stored_zpbandflux(self, band):
+        """Zeropoint flux from the on-disk cache, if enabled, or else
+        computed (and stored)."""
+
+        cachedir = conf.zpbandflux_cache_dir
+        standard = None if cachedir is None else self._standard_hash()
+        if standard is None:
+            return self._refspectrum_bandflux(band)
+
+        # The sncosmo version is part of the key, so that values are not
+        # reused across versions, in which the integration may differ.
+        from . import __version__
+        h = hashlib.sha1()
+        for item in (standard, __version__, band._content_hash()):
+            h.update(item.encode())
+        fname = os.path.join(cachedir, 'zp_' + h.hexdigest())
+
+        try:
+            with open(fname, 'r') as f:
+                return float(f.read())
+        except (IOError, OSError, ValueError):
+            pass
+
+        bandflux = self._refspectrum_bandflux(band)
+
+        # Write to a temporary file and rename, so that other processes
+        # never read a partial file.
+        tmpname = '{0}.{1:d}.tmp'.format(fname, os.getpid())
+        try:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+            with open(tmpname, 'w') as f:
+                f.write(repr(float(bandflux)))
+            os.rename(tmpname, fname)
+        except (IOError, OSError):
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
 
         return bandflux
 
@@ -159,6 +223,14 @@ class CompositeMagSystem(MagSystem):
     def bands(self):
         return self._bands
 
+    def _zpcache_key(self, band):
+        # The zeropoint depends on the bandpass identity or family, not
+        # only on its transmission.
+        key = band._content_hash()
+        if band in self._bands:
+            return key, id(band)
+        return key, getattr(band, 'family', None)
+
     def _refspectrum_bandflux(self, band):
         val = self._bands.get(band)
 
@@ -202,6 +274,12 @@ class SpectralMagSystem(MagSystem):
         super(SpectralMagSystem, self).__init__(name)
         self._refspectrum = refspectrum
 
+    def _standard_hash(self):
+        h = hashlib.sha1(b'SpectralMagSystem')
+        h.update(self._refspectrum.wave.tobytes())
+        h.update(self._refspectrum.flux.tobytes())
+        return h.hexdigest()
+
     def _refspectrum_bandflux(self, band):
         return self._refspectrum.bandflux(band)
 
@@ -210,6 +288,9 @@ class ABMagSystem(MagSystem):
     """Magnitude system where a source with F_nu = 3631 Jansky at all
     frequencies has magnitude 0 in all bands."""
 
+    def _standard_hash(self):
+        return 'ABMagSystem'
+
     def _refspectrum_bandflux(self, band):
         wave, dwave = integration_grid(band.minwave(), band.maxwave(),
                                        SPECTRUM_BANDFLUX_SPACING)
@@ -4,13 +4,16 @@
 
 import abc
 import os
+import hashlib
 from collections import OrderedDict as odict
 from copy import copy as cp
 from textwrap import dedent
-from math import ceil
+from math import ceil, exp, log, sqrt
 import itertools
+from weakref import WeakKeyDictionary
 
 import numpy as np
+from scipy import optimize
 from scipy.interpolate import (InterpolatedUnivariateSpline as Spline1d,
                                RectBivariateSpline as Spline2d,
                                splmake, spleval)
@@ -19,16 +22,18 @@ from astropy import (cosmology, units as u, constants as const)
 from astropy.extern import six
 import extinction
 
+from . import conf
 from .io import read_griddata_ascii, read_griddata_fits
 from ._registry import Registry
 from .bandpasses import get_bandpass, Bandpass
 from .magsystems import get_magsystem
-from .salt2utils import BicubicInterpolator, SALT2ColorLaw
-from .utils import integration_grid
+from .salt2utils import (BicubicInterpolator, SALT2ColorLaw, salt2_bandflux,
+                         bilinear_interp)
+from .utils import integration_grid, StructuredCovariance
 from .constants import HC_ERG_AA, MODEL_BANDFLUX_SPACING
 
 __all__ = ['get_source', 'Source', 'TimeSeriesSource', 'StretchSource',
-           'SALT2Source', 'MLCS2k2Source', 'Model',
+           'SALT2Source', 'SALT2Emulator', 'MLCS2k2Source', 'Model',
            'PropagationEffect', 'CCM89Dust', 'OD94Dust', 'F99Dust']
 
 _SOURCES = Registry()
@@ -89,39 +94,129 @@ def get_source(name, version=None, copy=False):
         return cp(_SOURCES.retrieve(name, version=version))
 
 
-def _bandflux_single(model, band, time_or_phase):
-    """Synthetic photometry of model through a single bandpass.
+def _finite_difference_jacobian(obj, func, indicies):
+    """Derivatives of ``func()`` with respect to the parameters of ``obj``
+    at the given indicies, by central finite differences.
+
+    Returns
+    -------
+    jac : list of `~numpy.ndarray`
+        One derivative array for each index.
+    """
+
+    saved = obj._parameters.copy()
+    jac = []
+    try:
+        for i in indicies:
+            value = saved[i]
+            h = 1.e-6 * abs(value) if value != 0. else 1.e-6
+            obj._parameters[i] = value + h
+            fplus = func()
+            obj._parameters[i] = value - h
+            fminus = func()
+            obj._parameters[i] = value
+            jac.append((fplus - fminus) / (2. * h))
+    finally:
+        obj._parameters[:] = saved
+    return jac
+
+
+class _IntegrationPlan(object):
+    """Wavelength grid and weights for synthetic photometry in a bandpass.
+
+    The grid spacing evenly divides the bandpass, closest to ``spacing``
+    without going over. ``weights`` is ``wave * trans * dwave / HC_ERG_AA``,
+    so that the flux in photons / s / cm^2 of a spectral flux density ``f``
+    sampled on ``wave`` is ``np.dot(f, weights)``.
 
     Parameters
     ----------
-    model : Source or Model
     band : Bandpass
-    time_or_phase : `~numpy.ndarray` (1-d)
+    spacing : float
+        Target wavelength spacing in Angstroms.
     """
 
-    # Check that bandpass wavelength range is fully contained in model
-    # wavelength range.
+    def __init__(self, band, spacing):
+        self.wave, self.dwave = integration_grid(band.minwave(),
+                                                 band.maxwave(), spacing)
+        self.trans = band(self.wave)
+        self.weights = self.wave * self.trans * self.dwave / HC_ERG_AA
+
+
+# Cache of integration plans: {band: {spacing: plan}}. Weak references to
+# the bands are used so that plans are discarded along with their band.
+_INTEGRATION_PLANS = WeakKeyDictionary()
+
+
+def _integration_plan(band, spacing=MODEL_BANDFLUX_SPACING):
+    """Return the (cached) `_IntegrationPlan` for the given bandpass.
+
+    Parameters
+    ----------
+    band : Bandpass
+    spacing : float, optional
+        Target wavelength spacing in Angstroms. Default is
+        ``MODEL_BANDFLUX_SPACING``.
+    """
+
+    try:
+        plans = _INTEGRATION_PLANS[band]
+    except KeyError:
+        plans = _INTEGRATION_PLANS[band] = {}
+
+    try:
+        return plans[spacing]
+    except KeyError:
+        plan = plans[spacing] = _IntegrationPlan(band, spacing)
+        return plan
+
+
+def _check_band_overlap(model, band):
+    """Raise ValueError if the bandpass wavelength range is not fully
+    contained in the model wavelength range."""
+
     if (band.minwave() < model.minwave() or band.maxwave() > model.maxwave()):
         raise ValueError('bandpass {0!r:s} [{1:.6g}, .., {2:.6g}] '
                          'outside spectral range [{3:.6g}, .., {4:.6g}]'
                          .format(band.name, band.minwave(), band.maxwave(),
                                  model.minwave(), model.maxwave()))
 
-    # Set up wavelength grid. Spacing (dwave) evenly divides the bandpass,
-    # closest to 5 angstroms without going over.
-    wave, dwave = integration_grid(band.minwave(), band.maxwave(),
-                                   MODEL_BANDFLUX_SPACING)
-    trans = band(wave)
-    f = model._flux(time_or_phase, wave)
 
-    return np.sum(wave * trans * f, axis=1) * dwave / HC_ERG_AA
+def _bandflux_single(model, band, time_or_phase):
+    """Synthetic photometry of model through a single bandpass.
 
+    Parameters
+    ----------
+    model : Source or Model
+    band : Bandpass
+    time_or_phase : `~numpy.ndarray` (1-d)
+    """
 
-def _bandflux(model, band, time_or_phase, zp, zpsys):
-    """Support function for bandflux in Source and Model.
-    This is necessary to have outside because ``phase`` is used in Source
-    and ``time`` is used in Model, and we want the method signatures to
-    have the right variable name.
+    _check_band_overlap(model, band)
+
+    emulator = getattr(model, '_emulator', None)
+    if (emulator is not None and
+            emulator._covers(band, model._parameters[0],
+                             model._parameters[4])):
+        return emulator._bandflux(model, band, time_or_phase)
+
+    # The wavelength grid, transmission and integration weights only depend
+    # on the bandpass, so they are computed once and cached.
+    plan = _integration_plan(band)
+
+    return model._integrated_flux(time_or_phase, plan.wave, plan.weights)
+
+
+def _broadcast_bandflux_args(band, time_or_phase, zp, zpsys):
+    """Broadcast bandflux arguments against each other and convert them to
+    1-d arrays.
+
+    Returns
+    -------
+    band, time_or_phase, zp, zpsys : `~numpy.ndarray` (1-d) or None
+        ``zp`` and ``zpsys`` are None if ``zp`` is None.
+    ndim : int
+        Dimension of the broadcast input, for use in the return value.
     """
 
     if zp is not None and zpsys is None:
@@ -142,26 +237,81 @@ def _bandflux(model, band, time_or_phase, zp, zpsys):
         zp = np.atleast_1d(zp)
         zpsys = np.atleast_1d(zpsys)
 
-    # initialize output arrays
-    bandflux = np.zeros(time_or_phase.shape, dtype=np.float)
+    return band, time_or_phase, zp, zpsys, ndim
 
-    # Loop over unique bands.
-    for b in set(band):
-        mask = band == b
-        b = get_bandpass(b)
 
-        fsum = _bandflux_single(model, b, time_or_phase[mask])
+def _zpnorm(band, zp, zpsys):
+    """Factor scaling flux in photons / s / cm^2 in the given Bandpass to
+    the requested zeropoints (1-d arrays)."""
+
+    zpnorm = 10.**(0.4 * zp)
+    for ms in set(zpsys):
+        mask = zpsys == ms
+        ms = get_magsystem(ms)
+        zpnorm[mask] = zpnorm[mask] / ms.zpbandflux(band)
+    return zpnorm
 
-        if zp is not None:
-            zpnorm = 10.**(0.4 * zp[mask])
-            bandzpsys = zpsys[mask]
-            for ms in set(bandzpsys):
-                mask2 = bandzpsys == ms
-                ms = get_magsystem(ms)
-                zpnorm[mask2] = zpnorm[mask2] / ms.zpbandflux(b)
-            fsum *= zpnorm
 
-        bandflux[mask] = fsum
+def _bandflux_fused(model, bands, time_or_phase):
+    """Synthetic photometry of model through several bandpasses, evaluating
+    the model flux once on the union of all times and wavelengths.
+
+    Parameters
+    ----------
+    model : Source or Model
+    bands : list of (Bandpass, `~numpy.ndarray`) pairs
+        Each bandpass and the boolean mask of ``time_or_phase`` values
+        observed in it.
+    time_or_phase : `~numpy.ndarray` (1-d)
+
+    Returns
+    -------
+    bandflux : `~numpy.ndarray` (1-d)
+        Same shape as ``time_or_phase``.
+    """
+
+    plans = []
+    for b, _ in bands:
+        _check_band_overlap(model, b)
+        plans.append(_integration_plan(b))
+
+    # Union of all times and integration wavelengths. (Both are sorted, as
+    # required by some sources.)
+    utime, tidx = np.unique(time_or_phase, return_inverse=True)
+    uwave = np.unique(np.concatenate([plan.wave for plan in plans]))
+    f = model._flux(utime, uwave)
+
+    bandflux = np.zeros(time_or_phase.shape, dtype=np.float64)
+    for (b, mask), plan in zip(bands, plans):
+        widx = np.searchsorted(uwave, plan.wave)
+        bandflux[mask] = np.dot(f[:, widx], plan.weights)[tidx[mask]]
+
+    return bandflux
+
+
+def _bandflux(model, band, time_or_phase, zp, zpsys, fused=False):
+    """Support function for bandflux in Source and Model.
+    This is necessary to have outside because ``phase`` is used in Source
+    and ``time`` is used in Model, and we want the method signatures to
+    have the right variable name.
+    """
+
+    band, time_or_phase, zp, zpsys, ndim = \
+        _broadcast_bandflux_args(band, time_or_phase, zp, zpsys)
+
+    bands = [(get_bandpass(b), band == b) for b in set(band)]
+
+    if fused:
+        bandflux = _bandflux_fused(model, bands, time_or_phase)
+    else:
+        # Loop over unique bands.
+        bandflux = np.zeros(time_or_phase.shape, dtype=np.float)
+        for b, mask in bands:
+            bandflux[mask] = _bandflux_single(model, b, time_or_phase[mask])
+
+    if zp is not None:
+        for b, mask in bands:
+            bandflux[mask] *= _zpnorm(b, zp[mask], zpsys[mask])
 
     if ndim == 0:
         return bandflux[0]
@@ -180,17 +330,85 @@ def _bandmag(model, band, magsys, time_or_phase):
     magsys = magsys.ravel()
     bandflux = bandflux.ravel()
 
-    result = np.empty(bandflux.shape, dtype=np.float)
-    for i, (b, ms, f) in enumerate(zip(band, magsys, bandflux)):
-        ms = get_magsystem(ms)
-        zpf = ms.zpbandflux(b)
-        result[i] = -2.5 * np.log10(f / zpf)
+    # Look up the zeropoint flux once for each unique (band, magsys) pair.
+    zpf = np.empty(bandflux.shape, dtype=np.float64)
+    for b in set(band):
+        bmask = band == b
+        for ms in set(magsys[bmask]):
+            mask = bmask & (magsys == ms)
+            zpf[mask] = get_magsystem(ms).zpbandflux(b)
+    result = -2.5 * np.log10(bandflux / zpf)
 
     if return_scalar:
         return result[0]
     return result
 
 
+_INVPHI = (sqrt(5.) - 1.) / 2.
+
+
+def _find_peaks(lc, minphase, maxphase, sampling, xtol):
+    """Location and value of the maximum of several light curves.
+
+    Each light curve is sampled on a grid spanning its phase range, with a
+    spacing of at most ``sampling``, and the maximum is then refined
+    between the neighbors of the highest sample by golden-section search,
+    in lockstep for all light curves.
+
+    Parameters
+    ----------
+    lc : callable
+        ``lc(phase)`` returns the fluxes at ``phase``, an array of shape
+        ``(N, nphase)`` with one row per light curve.
+    minphase, maxphase : `~numpy.ndarray` (1-d)
+        Phase range of each light curve.
+    sampling : float
+    xtol : float
+        Tolerance of the returned phases.
+
+    Returns
+    -------
+    phase, flux : `~numpy.ndarray` (1-d)
+    """
+
+    nsamples = max(int(ceil(np.max(maxphase - minphase) / sampling)) + 1, 2)
+    phases = (minphase[:, None] +
+              (maxphase - minphase)[:, None] * np.linspace(0., 1., nsamples))
+    fluxes = lc(phases)
+    rows = np.arange(len(phases))
+    i = np.argmax(fluxes, axis=1)
+    best_phase = phases[rows, i]
+    best_flux = fluxes[rows, i]
+
+    def f(x):
+        return lc(x[:, None])[:, 0]
+
+    a = phases[rows, np.maximum(i - 1, 0)]
+    b = phases[rows, np.minimum(i + 1, nsamples - 1)]
+    c = b - _INVPHI * (b - a)
+    d = a + _INVPHI * (b - a)
+    fc = f(c)
+    fd = f(d)
+
+    # The bracket shrinks by a factor of _INVPHI per step.
+    width = np.max(b - a)
+    niter = int(ceil(log(xtol / width) / log(_INVPHI))) if width > xtol else 0
+    for _ in range(niter):
+        left = fc >= fd  # maximum is in [a, d]
+        a = np.where(left, a, c)
+        b = np.where(left, d, b)
+        x = np.where(left, b - _INVPHI * (b - a), a + _INVPHI * (b - a))
+        fx = f(x)
+        c, d = np.where(left, x, d), np.where(left, c, x)
+        fc, fd = np.where(left, fx, fd), np.where(left, fc, fx)
+
+    phase = np.where(fc >= fd, c, d)
+    flux = np.maximum(fc, fd)
+    better = best_flux > flux
+    return (np.where(better, best_phase, phase),
+            np.where(better, best_flux, flux))
+
+
 class _ModelBase(object):
     """Base class for anything with parameters.
 
@@ -198,6 +416,14 @@ class _ModelBase(object):
     and ``_parameters`` (1-d numpy.ndarray).
     """
 
+    def __new__(cls, *args, **kwargs):
+        # Token identifying the definition of the object (as opposed to its
+        # parameter values) in caches. Shallow copies share it (see
+        # __copy__).
+        self = super(_ModelBase, cls).__new__(cls)
+        self._cache_token = object()
+        return self
+
     @property
     def param_names(self):
         """List of parameter names."""
@@ -315,6 +541,90 @@ class Source(_ModelBase):
     def _flux(self, phase, wave):
         pass
 
+    def _integrated_flux(self, phase, wave, weights):
+        """Weighted sum of the spectral flux density over wavelength.
+
+        Subclasses may override this to avoid creating the 2-d flux
+        array. The default implementation is ``np.dot(self._flux(phase,
+        wave), weights)``.
+
+        Parameters
+        ----------
+        phase : `~numpy.ndarray` (1-d)
+        wave : `~numpy.ndarray` (1-d)
+        weights : `~numpy.ndarray` (1-d)
+            Same length as ``wave``.
+
+        Returns
+        -------
+        result : `~numpy.ndarray` (1-d)
+            Same length as ``phase``.
+        """
+        return np.dot(self._flux(phase, wave), weights)
+
+    def _flux_jacobian(self, phase, wave):
+        """Spectral flux density and its derivatives with respect to the
+        parameters.
+
+        Subclasses may override this with analytic derivatives. The
+        default implementation uses finite differences.
+
+        Returns
+        -------
+        f : `~numpy.ndarray` (2-d)
+            Same as ``_flux(phase, wave)``.
+        jac : `~numpy.ndarray` (3-d)
+            Shape ``(len(param_names), len(phase), len(wave))``.
+        """
+        jac = np.empty((len(self._parameters), len(phase), len(wave)))
+        jac[:] = _finite_difference_jacobian(
+            self, lambda: self._flux(phase, wave),
+            range(len(self._parameters)))
+        return self._flux(phase, wave), jac
+
+    def _flux_dphase(self, phase, wave):
+        """Derivative of the spectral flux density with respect to phase.
+
+        Subclasses may override this with an analytic derivative. The
+        default implementation uses finite differences.
+        """
+        h = 1.e-3
+        return (self._flux(phase + h, wave) -
+                self._flux(phase - h, wave)) / (2. * h)
+
+    def _bandflux_batch(self, parameters, phase, wave, weights):
+        """Integrated flux for many parameter sets at once.
+
+        Subclasses may override this to vectorize evaluation across
+        parameter sets. The default implementation evaluates each parameter
+        set in turn.
+
+        Parameters
+        ----------
+        parameters : `~numpy.ndarray` (2-d)
+            Source parameters, shape ``(N, len(param_names))``.
+        phase : `~numpy.ndarray` (2-d)
+            Phases for each parameter set, shape ``(N, nphase)``.
+        wave : `~numpy.ndarray` (1-d)
+            Wavelengths, common to all parameter sets.
+        weights : `~numpy.ndarray` (1-d)
+            Integration weights corresponding to ``wave``.
+
+        Returns
+        -------
+        bandflux : `~numpy.ndarray` (2-d)
+            ``sum(flux * weights)`` over wavelength, shape ``(N, nphase)``.
+        """
+        saved = self._parameters.copy()
+        result = np.empty(phase.shape, dtype=np.float64)
+        try:
+            for i in range(len(parameters)):
+                self._parameters[:] = parameters[i]
+                result[i] = np.dot(self._flux(phase[i], wave), weights)
+        finally:
+            self._parameters[:] = saved
+        return result
+
     def flux(self, phase, wave):
         """The spectral flux density at the given phase and wavelength values.
 
@@ -350,7 +660,7 @@ class Source(_ModelBase):
             return f[0, :]
         return f
 
-    def bandflux(self, band, phase, zp=None, zpsys=None):
+    def bandflux(self, band, phase, zp=None, zpsys=None, fused=False):
         """Flux through the given bandpass(es) at the given phase(s).
 
         Default return value is flux in photons / s / cm^2. If zp and zpsys
@@ -369,6 +679,15 @@ class Source(_ModelBase):
         zpsys : str or list_like, optional
             Name of a magnitude system in the registry, specifying the system
             that ``zp`` is in.
+        fused : bool, optional
+            If True, evaluate the model spectral flux only once, on the
+            union of all requested phases and all bandpass integration
+            wavelengths, then integrate each bandpass from that single
+            evaluation. This reduces the number of (per-call) model
+            evaluations from one per bandpass to one in total, at the cost
+            of evaluating the model at more (phase, wavelength) points. It is
+            typically faster when there are few points per bandpass or
+            several bandpasses share phases. Default is False.
 
         Returns
         -------
@@ -379,7 +698,7 @@ class Source(_ModelBase):
             input parameters are scalars, `~numpy.ndarray` otherwise.
         """
         try:
-            return _bandflux(self, band, phase, zp, zpsys)
+            return _bandflux(self, band, phase, zp, zpsys, fused=fused)
         except ValueError as e:
             _check_for_fitpack_error(e, phase, 'phase')
             raise e
@@ -406,25 +725,48 @@ class Source(_ModelBase):
         """
         return _bandmag(self, band, magsys, phase)
 
-    def peakphase(self, band_or_wave, sampling=1.):
+    def peakphase(self, band_or_wave, sampling=1., method='parabola',
+                  xtol=1.e-4):
         """Determine phase of maximum flux for the given band/wavelength.
 
-        This method generates the light curve in the given band/wavelength and
-        finds the highest-flux point. It then finds the parabola that
-        passes through this point and the two neighboring points, and
-        returns the position of the peak of the parabola.
+        This method generates the light curve in the given band/wavelength,
+        sampled every ``sampling`` days, and finds the highest-flux point.
+        With ``method='parabola'`` (default), it then finds the parabola
+        that passes through this point and the two neighboring points, and
+        returns the position of the peak of the parabola. With
+        ``method='brent'``, it instead maximizes the light curve between
+        the two neighboring points with Brent's method, to a tolerance of
+        ``xtol`` days; the light curve then only needs to be sampled
+        coarsely enough to bracket the peak (e.g., ``sampling=5.``).
         """
 
+        if method not in ('parabola', 'brent'):
+            raise ValueError("method must be 'parabola' or 'brent'")
+
         # Array of phases to sample at.
         nsamples = int(ceil((self.maxphase()-self.minphase()) / sampling)) + 1
         phases = np.linspace(self.minphase(), self.maxphase(), nsamples)
 
         if isinstance(band_or_wave, (six.string_types, Bandpass)):
-            fluxes = self.bandflux(band_or_wave, phases)
+            band = get_bandpass(band_or_wave)
+            fluxes = self.bandflux(band, phases)
+            plan = _integration_plan(band)
+
+            def lc(phase):
+                return self._integrated_flux(np.array([phase]), plan.wave,
+                                             plan.weights)[0]
         else:
             fluxes = self.flux(phases, band_or_wave)[:, 0]
 
+            def lc(phase):
+                return self.flux(np.array([phase]), band_or_wave)[0, 0]
+
         i = np.argmax(fluxes)
+        if method == 'brent':
+            lo = phases[max(i - 1, 0)]
+            hi = phases[min(i + 1, nsamples - 1)]
+            return optimize.fminbound(lambda p: -lc(p), lo, hi, xtol=xtol)
+
         if (i == 0) or (i == len(phases) - 1):
             return phases[i]
 
@@ -434,19 +776,115 @@ class Source(_ModelBase):
         a, b, c = np.linalg.solve(A, y)
         return -b / (2 * a)
 
-    def peakmag(self, band, magsys, sampling=1.0):
+    def peakmag(self, band, magsys, sampling=1.0, method='parabola'):
         """Peak apparent magnitude in rest-frame bandpass."""
 
-        peakphase = self.peakphase(band, sampling=sampling)
+        peakphase = self.peakphase(band, sampling=sampling, method=method)
         return self.bandmag(band, magsys, peakphase)
 
-    def set_peakmag(self, m, band, magsys, sampling=1.0):
+    def set_peakmag(self, m, band, magsys, sampling=1.0, method='parabola'):
         """Set peak apparent magnitude in rest-frame bandpass."""
 
-        m_current = self.peakmag(band, magsys, sampling=sampling)
+        m_current = self.peakmag(band, magsys, sampling=sampling,
+                                 method=method)
         factor = 10.**(0.4 * (m_current - m))
         self._parameters[0] = factor * self._parameters[0]
 
+    # Number of parameter sets processed together in the batch peak methods.
+    _PEAK_BATCH_SIZE = 4096
+
+    def _phase_range_batch(self, parameters):
+        """``minphase()`` and ``maxphase()`` for each parameter set (row of
+        ``parameters``).
+
+        Subclasses whose phase range depends on the parameters in a simple
+        way may override this. The default implementation evaluates each
+        parameter set in turn.
+        """
+        saved = self._parameters.copy()
+        minphase = np.empty(len(parameters))
+        maxphase = np.empty(len(parameters))
+        try:
+            for i in range(len(parameters)):
+                self._parameters[:] = parameters[i]
+                minphase[i] = self.minphase()
+                maxphase[i] = self.maxphase()
+        finally:
+            self._parameters[:] = saved
+        return minphase, maxphase
+
+    def _peak_batch(self, parameters, band, sampling, xtol):
+        """Phase of maximum and maximum flux in a bandpass for each row of
+        ``parameters``."""
+
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=np.float64))
+        if parameters.shape[1] != len(self._parameters):
+            raise ValueError('parameters must have shape (N, {0:d})'
+                             .format(len(self._parameters)))
+        band = get_bandpass(band)
+        _check_band_overlap(self, band)
+        plan = _integration_plan(band)
+
+        phase = np.empty(len(parameters))
+        flux = np.empty(len(parameters))
+        for start in range(0, len(parameters), self._PEAK_BATCH_SIZE):
+            s = slice(start, start + self._PEAK_BATCH_SIZE)
+            p = parameters[s]
+
+            def lc(phases):
+                return self._bandflux_batch(p, phases, plan.wave,
+                                            plan.weights)
+
+            minphase, maxphase = self._phase_range_batch(p)
+            phase[s], flux[s] = _find_peaks(lc, minphase, maxphase,
+                                            sampling, xtol)
+        return phase, flux
+
+    def peakphase_batch(self, parameters, band, sampling=1., xtol=1.e-4):
+        """Phase of maximum flux in a bandpass for many parameter sets.
+
+        Equivalent to ``peakphase(band, method='brent')`` for each parameter
+        set, but the light curves of all parameter sets are sampled together
+        and then refined together with a golden-section search, so that
+        each step is a single vectorized evaluation. The source parameters
+        are not changed.
+
+        Parameters
+        ----------
+        parameters : `~numpy.ndarray` (2-d)
+            Source parameters, shape ``(N, len(param_names))``.
+        band : str or `~sncosmo.Bandpass`
+            Bandpass or name of bandpass in registry.
+        sampling : float, optional
+            Spacing in days of the initial light curve samples, which must
+            be close enough to bracket the peak. Default is 1.
+        xtol : float, optional
+            Tolerance in days of the peak phase. Default is 1.e-4.
+
+        Returns
+        -------
+        phase : `~numpy.ndarray` (1-d)
+            Phase of maximum flux for each parameter set.
+        """
+        return self._peak_batch(parameters, band, sampling, xtol)[0]
+
+    def peakmag_batch(self, parameters, band, magsys, sampling=1.,
+                      xtol=1.e-4):
+        """Peak apparent magnitude in a rest-frame bandpass for many
+        parameter sets.
+
+        See `~sncosmo.Source.peakphase_batch` for the parameters.
+
+        Returns
+        -------
+        mag : `~numpy.ndarray` (1-d)
+            Peak magnitude for each parameter set.
+        """
+        band = get_bandpass(band)
+        flux = self._peak_batch(parameters, band, sampling, xtol)[1]
+        zpf = get_magsystem(magsys).zpbandflux(band)
+        return -2.5 * np.log10(flux / zpf)
+
     def __repr__(self):
         name = ''
         version = ''
@@ -471,6 +909,177 @@ class Source(_ModelBase):
         return dedent(summary)
 
 
+def _bspline_basis(t, k, x, nu=0):
+    """Nonzero B-spline basis functions of degree ``k`` (or their ``nu``-th
+    derivatives) at ``x``.
+
+    ``x`` is clipped to the base interval ``[t[k], t[-k-1]]``, as in fitpack
+    evaluation, so that the spline is constant outside it.
+
+    Parameters
+    ----------
+    t : `~numpy.ndarray` (1-d)
+        Knots.
+    k : int
+        Degree.
+    x : `~numpy.ndarray` (1-d)
+    nu : int, optional
+        Order of derivative. Default is 0.
+
+    Returns
+    -------
+    index : `~numpy.ndarray` (1-d, int)
+        Index of the first of the ``k + 1`` nonzero basis functions at each
+        ``x``.
+    values : `~numpy.ndarray` (2-d)
+        Values of these basis functions, shape ``(len(x), k + 1)``.
+    """
+
+    n = len(t) - k - 1
+    x = np.clip(x, t[k], t[n])
+    j = np.clip(np.searchsorted(t, x, side='right') - 1, k, n - 1)
+
+    # Cox-de Boor recursion: at degree d, b[:, r] holds B_{j-d+r, d}. The
+    # last nu steps use the derivative recursion instead.
+    b = np.ones((len(x), 1))
+    for d in range(1, k + 1):
+        deriv = d > k - nu
+        new = np.zeros((len(x), d + 1))
+        for r in range(d + 1):
+            i = j - d + r
+            if r > 0:
+                left = b[:, r - 1] / (t[i + d] - t[i])
+                new[:, r] += d * left if deriv else (x - t[i]) * left
+            if r < d:
+                right = b[:, r] / (t[i + d + 1] - t[i + 1])
+                new[:, r] -= d * right if deriv else (x - t[i + d + 1]) * right
+        b = new
+
+    return j - k, b
+
+
+class _SplineSurface(object):
+    """Bicubic spline through gridded values, for `TimeSeriesSource` and
+    `StretchSource`.
+
+    The spline is fit with ``RectBivariateSpline`` but evaluated directly
+    from its B-spline representation: the coefficients are contracted with
+    the y (wavelength) basis once per y grid and cached, so that repeated
+    evaluations on the same grid (as in synthetic photometry for a given
+    bandpass and redshift) only compute the four nonzero x basis functions
+    per point. Results agree with ``RectBivariateSpline`` to rounding
+    error, and x need not be sorted.
+    """
+
+    # maximum number of y grids cached
+    _MAX_Y_GRIDS = 100
+
+    def __init__(self, x, y, z):
+        spline = Spline2d(x, y, z, kx=3, ky=3)
+        self._tx, self._ty = spline.get_knots()
+        self._coeffs = spline.get_coeffs().reshape(len(self._tx) - 4,
+                                                   len(self._ty) - 4)
+        self._reduced = {}
+
+    def _reduce(self, y):
+        """Coefficients contracted with the y basis, shape
+        ``(len(tx) - 4, len(y))``."""
+        key = y.tobytes()
+        try:
+            return self._reduced[key]
+        except KeyError:
+            pass
+
+        if len(self._reduced) >= self._MAX_Y_GRIDS:
+            self._reduced.clear()
+        iy, by = _bspline_basis(self._ty, 3, y)
+        c = self._coeffs[:, iy[:, None] + np.arange(4)]
+        g = np.einsum('iyb,yb->iy', c, by)
+        g.flags.writeable = False
+        self._reduced[key] = g
+        return g
+
+    def __call__(self, x, y, dx=0):
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        g = self._reduce(y)
+        ix, bx = _bspline_basis(self._tx, 3, x, nu=dx)
+        f = bx[:, 0, None] * g[ix]
+        for a in range(1, 4):
+            f += bx[:, a, None] * g[ix + a]
+        return f
+
+    def integrate(self, x, y, weights):
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        g = self._reduce(y)
+
+        # For many x values, it is cheaper to integrate the coefficients
+        # over y once than to integrate each evaluated row.
+        if 4 * len(x) < len(g):
+            return np.dot(self(x, y), weights)
+        gw = np.dot(g, weights)
+        ix, bx = _bspline_basis(self._tx, 3, x)
+        f = bx[:, 0] * gw[ix]
+        for a in range(1, 4):
+            f += bx[:, a] * gw[ix + a]
+        return f
+
+
+class _BicubicSurface(object):
+    """`BicubicInterpolator` with the interface of `_SplineSurface`.
+
+    Outside the x range, the values at the nearest x node are used (rather
+    than zero), as for the spline. Wavelength plans are cached by y grid.
+    """
+
+    _MAX_Y_GRIDS = 100
+
+    def __init__(self, x, y, z):
+        self._interp = BicubicInterpolator(x, y, z)
+        self._xmin = x[0]
+        self._xmax = x[-1]
+        self._plans = {}
+
+    def _plan(self, y):
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        key = y.tobytes()
+        try:
+            return self._plans[key]
+        except KeyError:
+            pass
+
+        if len(self._plans) >= self._MAX_Y_GRIDS:
+            self._plans.clear()
+        plan = self._plans[key] = self._interp.plan_y(y)
+        return plan
+
+    def _clip(self, x):
+        return np.clip(np.atleast_1d(np.asarray(x, dtype=np.float64)),
+                       self._xmin, self._xmax)
+
+    def __call__(self, x, y, dx=0):
+        return self._interp(self._clip(x), self._plan(y), dx=dx)
+
+    def integrate(self, x, y, weights):
+        return self._interp.integrate(self._clip(x), self._plan(y), weights)
+
+
+_SURFACES = {'spline': _SplineSurface, 'bicubic': _BicubicSurface}
+
+
+def _surface(phase, wave, flux, interpolation):
+    """Interpolator for ``TimeSeriesSource`` and ``StretchSource``."""
+    try:
+        cls = _SURFACES[interpolation]
+    except KeyError:
+        raise ValueError('interpolation must be one of: ' +
+                         ', '.join(repr(k) for k in sorted(_SURFACES)))
+    return cls(np.asarray(phase, dtype=np.float64),
+               np.asarray(wave, dtype=np.float64),
+               np.asarray(flux, dtype=np.float64))
+
+
 class TimeSeriesSource(Source):
     """A single-component spectral time series model.
 
@@ -507,6 +1116,14 @@ class TimeSeriesSource(Source):
         Name of the model. Default is `None`.
     version : str, optional
         Version of the model. Default is `None`.
+    interpolation : {'spline', 'bicubic'}, optional
+        Interpolation of the flux grid. ``'spline'`` (default) is a bicubic
+        spline (as ``scipy.interpolate.RectBivariateSpline``), evaluated
+        with cached wavelength basis functions. ``'bicubic'`` is the
+        bicubic convolution used by ``SALT2Source`` (see
+        `~sncosmo.salt2utils.BicubicInterpolator`), which is faster but
+        gives slightly different values. With either, the flux outside the
+        phase range is that at the nearest phase.
 
     """
 
@@ -514,13 +1131,13 @@ class TimeSeriesSource(Source):
     param_names_latex = ['A']
 
     def __init__(self, phase, wave, flux, zero_before=False, name=None,
-                 version=None):
+                 version=None, interpolation='spline'):
         self.name = name
         self.version = version
         self._phase = phase
         self._wave = wave
         self._parameters = np.array([1.])
-        self._model_flux = Spline2d(phase, wave, flux, kx=3, ky=3)
+        self._model_flux = _surface(phase, wave, flux, interpolation)
         self._zero_before = zero_before
 
     def _flux(self, phase, wave):
@@ -530,6 +1147,40 @@ class TimeSeriesSource(Source):
             f[mask, :] = 0.
         return f
 
+    def _integrated_flux(self, phase, wave, weights):
+        f = self._parameters[0] * self._model_flux.integrate(phase, wave,
+                                                             weights)
+        if self._zero_before:
+            f[np.atleast_1d(phase) < self.minphase()] = 0.
+        return f
+
+    def _flux_jacobian(self, phase, wave):
+        f = self._model_flux(phase, wave)
+        if self._zero_before:
+            f[np.atleast_1d(phase) < self.minphase(), :] = 0.
+        return self._parameters[0] * f, f[None, :, :]
+
+    def _flux_dphase(self, phase, wave):
+        # The flux is constant outside the phase range.
+        f = self._parameters[0] * self._model_flux(phase, wave, dx=1)
+        phase = np.atleast_1d(phase)
+        f[(phase < self.minphase()) | (phase > self.maxphase()), :] = 0.
+        return f
+
+    def _phase_range_batch(self, parameters):
+        n = len(parameters)
+        return np.full(n, self._phase[0]), np.full(n, self._phase[-1])
+
+    def _bandflux_batch(self, parameters, phase, wave, weights):
+        # Integrate once for the unique phases of all parameter sets, then
+        # scatter back.
+        uphase, idx = np.unique(phase, return_inverse=True)
+        f = self._model_flux.integrate(uphase, wave, weights)
+        f = parameters[:, 0, None] * f[idx].reshape(phase.shape)
+        if self._zero_before:
+            f[phase < self.minphase()] = 0.
+        return f
+
 
 class StretchSource(Source):
     """A single-component spectral time series model, that "stretches" in
@@ -552,18 +1203,22 @@ class StretchSource(Source):
     flux : `~numpy.ndarray`
         Model spectral flux density in erg / s / cm^2 / Angstrom.
         Must have shape `(num_phases, num_disp)`.
+    interpolation : {'spline', 'bicubic'}, optional
+        Interpolation of the flux grid; see `TimeSeriesSource`. Default is
+        ``'spline'``.
     """
 
     _param_names = ['amplitude', 's']
     param_names_latex = ['A', 's']
 
-    def __init__(self, phase, wave, flux, name=None, version=None):
+    def __init__(self, phase, wave, flux, name=None, version=None,
+                 interpolation='spline'):
         self.name = name
         self.version = version
         self._phase = phase
         self._wave = wave
         self._parameters = np.array([1., 1.])
-        self._model_flux = Spline2d(phase, wave, flux, kx=3, ky=3)
+        self._model_flux = _surface(phase, wave, flux, interpolation)
 
     def minphase(self):
         return self._parameters[1] * self._phase[0]
@@ -575,6 +1230,71 @@ class StretchSource(Source):
         return (self._parameters[0] *
                 self._model_flux(phase / self._parameters[1], wave))
 
+    def _integrated_flux(self, phase, wave, weights):
+        return (self._parameters[0] *
+                self._model_flux.integrate(phase / self._parameters[1], wave,
+                                           weights))
+
+    def _model_flux_dphase(self, phase, wave):
+        """Derivative of the model flux with respect to (scaled) phase,
+        which is constant outside its phase range."""
+        f = self._model_flux(phase, wave, dx=1)
+        f[(phase < self._phase[0]) | (phase > self._phase[-1]), :] = 0.
+        return f
+
+    def _flux_jacobian(self, phase, wave):
+        amplitude, s = self._parameters
+        jac = np.empty((2, len(phase), len(wave)))
+        jac[0] = self._model_flux(phase / s, wave)
+        jac[1] = (-amplitude * self._model_flux_dphase(phase / s, wave) *
+                  (phase / s**2)[:, None])
+        return amplitude * jac[0], jac
+
+    def _flux_dphase(self, phase, wave):
+        amplitude, s = self._parameters
+        return amplitude / s * self._model_flux_dphase(phase / s, wave)
+
+    def _phase_range_batch(self, parameters):
+        return (parameters[:, 1] * self._phase[0],
+                parameters[:, 1] * self._phase[-1])
+
+    def _bandflux_batch(self, parameters, phase, wave, weights):
+        scaled_phase = phase / parameters[:, 1, None]
+        uphase, idx = np.unique(scaled_phase, return_inverse=True)
+        f = self._model_flux.integrate(uphase, wave, weights)
+        return parameters[:, 0, None] * f[idx].reshape(phase.shape)
+
+
+def _stack_components(keys, grids, interpolators):
+    """Group model components by grid.
+
+    Returns a list of ``(group, interpolator)`` pairs, where components in
+    ``group`` (a tuple of keys) are defined on the same grid and stacked
+    into a single BicubicInterpolator. Components with a grid of their own
+    use their existing interpolator from ``interpolators``.
+    """
+
+    groups = []
+    for key in keys:
+        phase, wave, values = grids[key]
+        for group in groups:
+            if (np.array_equal(phase, group[1]) and
+                    np.array_equal(wave, group[2])):
+                group[0].append(key)
+                group[3].append(values)
+                break
+        else:
+            groups.append(([key], phase, wave, [values]))
+
+    result = []
+    for group, phase, wave, values in groups:
+        if len(group) == 1:
+            interp = interpolators[group[0]]
+        else:
+            interp = BicubicInterpolator(phase, wave, np.array(values))
+        result.append((tuple(group), interp))
+    return result
+
 
 class SALT2Source(Source):
     """The SALT2 Type Ia supernova spectral timeseries model.
@@ -639,6 +1359,9 @@ class SALT2Source(Source):
     param_names_latex = ['x_0', 'x_1', 'c']
     _SCALE_FACTOR = 1e-12
 
+    # maximum number of wavelength grids cached by `_wave_plan`
+    _MAX_WAVE_PLANS = 100
+
     def __init__(self, modeldir=None,
                  m0file='salt2_template_0.dat',
                  m1file='salt2_template_1.dat',
@@ -652,6 +1375,8 @@ class SALT2Source(Source):
         self.name = name
         self.version = version
         self._model = {}
+        self._component_grid = {}
+        self._wave_plans = {}
         self._parameters = np.array([1., 0., 0.])
 
         names_or_objs = {'M0': m0file, 'M1': m1file,
@@ -667,10 +1392,12 @@ class SALT2Source(Source):
                     names_or_objs[k] = os.path.join(modeldir, v)
 
         # model components are interpolated to 2nd order
+        grids = {}
         for key in ['M0', 'M1']:
             phase, wave, values = read_griddata_ascii(names_or_objs[key])
             values *= self._SCALE_FACTOR
             self._model[key] = BicubicInterpolator(phase, wave, values)
+            self._component_grid[key] = grids[key] = (phase, wave, values)
 
             # The "native" phases and wavelengths of the model are those
             # of the first model component.
@@ -682,6 +1409,15 @@ class SALT2Source(Source):
         for key in ['LCRV00', 'LCRV11', 'LCRV01', 'errscale']:
             phase, wave, values = read_griddata_ascii(names_or_objs[key])
             self._model[key] = BicubicInterpolator(phase, wave, values)
+            grids[key] = (phase, wave, values)
+
+        # Components that are evaluated together are also stacked by grid,
+        # so that they share index searches and kernel weights (see
+        # `_components`).
+        self._component_stacks = {}
+        for keys in (('M0', 'M1'), ('LCRV00', 'LCRV11', 'LCRV01', 'errscale')):
+            self._component_stacks[keys] = _stack_components(keys, grids,
+                                                             self._model)
 
         # Set the colorlaw based on the "color correction" file.
         self._set_colorlaw_from_file(names_or_objs['clfile'])
@@ -690,11 +1426,112 @@ class SALT2Source(Source):
         w, val = np.loadtxt(names_or_objs['cdfile'], unpack=True)
         self._colordisp = Spline1d(w, val,  k=1)  # linear interp.
 
+    def _wave_plan(self, wave):
+        """Interpolation plan for the model components and color law values
+        on the wavelength grid ``wave``.
+
+        For a given bandpass and redshift, the same (rest-frame) grid is
+        used in every evaluation, so the results are cached by grid.
+        """
+        wave = np.asarray(wave, dtype=np.float64)
+        key = wave.tobytes()
+        try:
+            return self._wave_plans[key]
+        except KeyError:
+            pass
+
+        if len(self._wave_plans) >= self._MAX_WAVE_PLANS:
+            self._wave_plans.clear()
+        cl = self._colorlaw(np.atleast_1d(wave))
+        cl.flags.writeable = False
+        plan = self._wave_plans[key] = (self._model['M0'].plan_y(wave), cl)
+        return plan
+
+    def _components(self, keys, phase, wave, weights=None, dx=0):
+        """Interpolate the model components ``keys`` (a key of
+        ``_component_stacks``), or, if ``weights`` is given, their weighted
+        sums over wavelength.
+
+        Returns a list of arrays in the order of ``keys``. Components
+        defined on a common grid are evaluated together.
+        """
+
+        values = {}
+        for group, interp in self._component_stacks[keys]:
+            if weights is None:
+                result = interp(phase, wave, dx=dx)
+            else:
+                result = interp.integrate(phase, wave, weights)
+            if len(group) == 1:
+                result = [result]
+            values.update(zip(group, result))
+        return [values[key] for key in keys]
+
     def _flux(self, phase, wave):
-        m0 = self._model['M0'](phase, wave)
-        m1 = self._model['M1'](phase, wave)
+        plan, cl = self._wave_plan(wave)
+        m0, m1 = self._components(('M0', 'M1'), phase, plan)
         return (self._parameters[0] * (m0 + self._parameters[1] * m1) *
-                10. ** (-0.4 * self._colorlaw(wave) * self._parameters[2]))
+                10. ** (-0.4 * cl * self._parameters[2]))
+
+    def _integrated_flux(self, phase, wave, weights):
+        # Fold the amplitude and color law into the weights and integrate
+        # M0 + x1 * M1 in one pass.
+        x0, x1, c = self._parameters
+        plan, cl = self._wave_plan(wave)
+        w = x0 * weights * 10. ** (-0.4 * cl * c)
+        return salt2_bandflux(self._model['M0'], self._model['M1'], x1,
+                              phase, plan, w)
+
+    def _flux_jacobian(self, phase, wave):
+        x0, x1, c = self._parameters
+        plan, cl = self._wave_plan(wave)
+        m0, m1 = self._components(('M0', 'M1'), phase, plan)
+        colorfactor = 10. ** (-0.4 * cl * c)
+        jac = np.empty((3, len(phase), len(wave)))
+        jac[0] = (m0 + x1 * m1) * colorfactor
+        jac[1] = x0 * m1 * colorfactor
+        f = x0 * jac[0]
+        jac[2] = -0.4 * log(10.) * cl * f
+        return f, jac
+
+    def _flux_dphase(self, phase, wave):
+        x0, x1, c = self._parameters
+        plan, cl = self._wave_plan(wave)
+        m0, m1 = self._components(('M0', 'M1'), phase, plan, dx=1)
+        return x0 * (m0 + x1 * m1) * 10. ** (-0.4 * cl * c)
+
+    def _phase_range_batch(self, parameters):
+        n = len(parameters)
+        return np.full(n, self._phase[0]), np.full(n, self._phase[-1])
+
+    def _bandflux_batch(self, parameters, phase, wave, weights):
+        # The color law only depends on wavelength, so it can be folded
+        # into per-parameter-set weights.
+        plan, cl = self._wave_plan(wave)
+        w = weights * 10. ** (-0.4 * cl * parameters[:, 2, None])
+        uphase, idx = np.unique(phase, return_inverse=True)
+
+        if len(uphase) <= 16 * phase.shape[1]:
+            # Phases are largely shared between parameter sets: interpolate
+            # the model components once for the unique phases, reducing the
+            # integration to two matrix products.
+            m0, m1 = self._components(('M0', 'M1'), uphase, plan)
+            f0 = np.dot(w, m0.T)  # shape (N, len(uphase))
+            f1 = np.dot(w, m1.T)
+            rows = np.arange(len(parameters))[:, None]
+            idx = idx.reshape(phase.shape)
+            f0 = f0[rows, idx]
+            f1 = f1[rows, idx]
+        else:
+            # Phases differ between parameter sets (as in a peak search):
+            # the matrix products would be mostly wasted, so integrate each
+            # parameter set against its own weights.
+            m0, m1 = self._components(('M0', 'M1'), phase.ravel(), plan)
+            shape = phase.shape + (len(wave),)
+            f0 = np.einsum('ijk,ik->ij', m0.reshape(shape), w)
+            f1 = np.einsum('ijk,ik->ij', m1.reshape(shape), w)
+
+        return parameters[:, 0, None] * (f0 + parameters[:, 1, None] * f1)
 
     def _bandflux_rvar_single(self, band, phase):
         """Model relative variance for a single bandpass."""
@@ -709,22 +1546,17 @@ class SALT2Source(Source):
         x1 = self._parameters[1]
 
         # integrate m0 and m1 components
-        wave, dwave = integration_grid(band.minwave(), band.maxwave(),
-                                       MODEL_BANDFLUX_SPACING)
-        trans = band(wave)
-        m0 = self._model['M0'](phase, wave)
-        m1 = self._model['M1'](phase, wave)
-        tmp = trans * wave
-        f0 = np.sum(m0 * tmp, axis=1) * dwave / HC_ERG_AA
-        m1int = np.sum(m1 * tmp, axis=1) * dwave / HC_ERG_AA
+        plan = _integration_plan(band)
+        f0, m1int = self._components(('M0', 'M1'), phase, plan.wave,
+                                     weights=plan.weights)
         ftot = f0 + x1 * m1int
 
         # In the following, the "[:,0]" reduces from a 2-d array of shape
         # (nphase, 1) to a 1-d array.
-        lcrv00 = self._model['LCRV00'](phase, band.wave_eff)[:, 0]
-        lcrv11 = self._model['LCRV11'](phase, band.wave_eff)[:, 0]
-        lcrv01 = self._model['LCRV01'](phase, band.wave_eff)[:, 0]
-        scale = self._model['errscale'](phase, band.wave_eff)[:, 0]
+        lcrv00, lcrv11, lcrv01, scale = [
+            v[:, 0] for v in self._components(
+                ('LCRV00', 'LCRV11', 'LCRV01', 'errscale'), phase,
+                [band.wave_eff])]
 
         v = lcrv00 + 2.0 * x1 * lcrv01 + x1 * x1 * lcrv11
 
@@ -809,21 +1641,24 @@ class SALT2Source(Source):
             Model relative covariance for given bandpasses and phases.
         """
 
-        # construct covariance array with relative variance on diagonal
+        return self._bandflux_rcov_structured(band, phase).toarray()
+
+    def _bandflux_rcov_structured(self, band, phase):
+        """Like ``bandflux_rcov``, but returns a `StructuredCovariance`:
+        the relative variance on the diagonal, and one block per bandpass
+        for the color dispersion."""
+
         diagonal = np.zeros(phase.shape, dtype=np.float64)
+        blocks = []
         for b in set(band):
-            mask = band == b
-            diagonal[mask] = self._bandflux_rvar_single(b, phase[mask])
-        result = np.diagflat(diagonal)
+            idx = np.flatnonzero(band == b)
+            diagonal[idx] = self._bandflux_rvar_single(b, phase[idx])
 
-        # add kcorr errors
-        for b in set(band):
-            mask1d = band == b
-            mask2d = mask1d * mask1d[:, None]  # mask for result array
+            # kcorr errors
             kcorrerr = self._colordisp(b.wave_eff)
-            result[mask2d] += kcorrerr**2
+            blocks.append((idx, np.full(len(idx), kcorrerr)))
 
-        return result
+        return StructuredCovariance(diagonal, blocks)
 
     def _set_colorlaw_from_file(self, name_or_obj):
         """Read color law file and set the internal colorlaw function."""
@@ -886,6 +1721,322 @@ class SALT2Source(Source):
         else:
             return self._colorlaw(wave)
 
+    def _content_hash(self):
+        """Hash (hex string) of the M0 and M1 components and the color
+        law, equal for sources with identical synthetic photometry.
+        Computed on first use."""
+        try:
+            return self.__dict__['_hash']
+        except KeyError:
+            h = hashlib.sha1(self.__class__.__name__.encode())
+            for key in ('M0', 'M1'):
+                for a in self._component_grid[key]:
+                    h.update(np.ascontiguousarray(a, dtype=np.float64)
+                             .tobytes())
+            h.update(np.ascontiguousarray(self._colorlaw(self._wave),
+                                          dtype=np.float64).tobytes())
+            self._hash = h.hexdigest()
+            return self._hash
+
+
+def _convolution_weights(nodes, x):
+    """Indicies and weights that reproduce `BicubicInterpolator` along a
+    single axis.
+
+    Parameters
+    ----------
+    nodes : `~numpy.ndarray` (1-d)
+        Strictly increasing node positions.
+    x : `~numpy.ndarray` (1-d)
+
+    Returns
+    -------
+    idx : `~numpy.ndarray` of int, shape ``(len(x), 4)``
+    weights : `~numpy.ndarray`, shape ``(len(x), 4)``
+        Weights of `BicubicInterpolator`: cubic convolution away from the
+        edges of ``nodes`` and linear interpolation next to them.
+    lweights : `~numpy.ndarray`, shape ``(len(x), 4)``
+        Weights of linear interpolation.
+    linear : `~numpy.ndarray` of bool, shape ``(len(x),)``
+        Whether ``weights`` are those of linear interpolation.
+
+    Values of ``x`` outside the range of ``nodes`` get zero weight.
+    """
+
+    n = len(nodes)
+    x = np.asarray(x, dtype=np.float64)
+    ix = np.clip(np.searchsorted(nodes, x, side='right') - 1, 0, n - 2)
+    t = (x - nodes[ix]) / (nodes[ix + 1] - nodes[ix])
+    t2 = t * t
+    t3 = t2 * t
+    outside = (x < nodes[0]) | (x > nodes[-1])
+
+    lweights = np.zeros((len(x), 4))
+    lweights[:, 1] = 1. - t
+    lweights[:, 2] = t
+    lweights[outside] = 0.
+
+    # cubic convolution kernel with a = -0.5
+    weights = 0.5 * np.column_stack((-t3 + 2. * t2 - t,
+                                     3. * t3 - 5. * t2 + 2.,
+                                     -3. * t3 + 4. * t2 + t,
+                                     t3 - t2))
+    linear = (n < 3) | (ix == 0) | (ix > n - 3)
+    weights[linear] = lweights[linear]
+    weights[outside] = 0.
+
+    idx = np.clip(ix[:, None] + np.arange(-1, 3), 0, n - 1)
+
+    return idx, weights, lweights, linear
+
+
+def _convolution_matrices(nodes, x):
+    """Matrices ``A`` such that ``np.dot(A, values)`` interpolates
+    ``values`` sampled at ``nodes`` to ``x``, for the ``weights`` and
+    ``lweights`` of `_convolution_weights`. Also returns ``linear``."""
+
+    idx, weights, lweights, linear = _convolution_weights(nodes, x)
+    rows = np.arange(len(x))[:, None]
+    a = np.zeros((len(x), len(nodes)))
+    np.add.at(a, (rows, idx), weights)
+    la = np.zeros((len(x), len(nodes)))
+    np.add.at(la, (rows, idx), lweights)
+    return a, la, linear
+
+
+class SALT2Emulator(object):
+    """Tabulated synthetic photometry for a `~sncosmo.SALT2Source`.
+
+    SALT2 flux is linear in ``x0`` and ``x0 * x1``, so in a given bandpass
+    and at a given redshift the band flux is a combination of band
+    integrals of the M0 and M1 components. This class tabulates those
+    integrals at the native phases of each component, on a grid of
+    redshifts. The color law is handled analytically: within a band,
+    ``10**(-0.4 * CL * c)`` is factored into its value at the mean color
+    law of the band and a Taylor series in the deviation from it,
+    truncated so that the relative error is below 1e-9 for ``|c| <=
+    cmax``. Band fluxes are then obtained by interpolating the tables,
+    at a cost independent of the number of wavelengths.
+
+    Attach the emulator to a model with ``model.emulator = emulator``.
+    It is then used in `~sncosmo.Model.bandflux` for the tabulated bands,
+    when ``zmin <= z <= zmax`` and ``|c| <= cmax``. Other evaluations
+    fall back to integrating the spectral surface.
+
+    Parameters
+    ----------
+    source : `~sncosmo.SALT2Source`
+    bands : list of str or `~sncosmo.Bandpass`
+        Bandpasses to tabulate.
+    zmin, zmax : float
+        Redshift range to tabulate.
+    dz : float, optional
+        Target spacing of the redshift grid. Default is 0.01.
+    cmax : float, optional
+        Largest absolute value of ``c`` for which the tables are used.
+        Default is 1.
+
+    Attributes
+    ----------
+    max_error : dict
+        Measured accuracy of the emulator for each band name (see Notes).
+
+    Notes
+    -----
+    In phase, the tables are interpolated exactly as the M0 and M1
+    surfaces are (cubic convolution, linear next to the edges of the
+    grid), so the interpolation commutes with the band integral: at the
+    redshifts of the grid, emulated band fluxes equal those of the exact
+    integration in `~sncosmo.Model.bandflux` to within rounding and the
+    color expansion. Between grid redshifts the tables are interpolated
+    in redshift with the same cubic convolution kernel. This is the only
+    approximation and its error decreases as ``dz**3``.
+
+    The error is measured when the tables are built: the emulator is
+    compared to exact synthetic photometry at all redshifts midway between
+    grid points, at all phases midway between the native phases, and for
+    ``c`` in ``(-cmax, 0, cmax)``. For each component, the largest
+    absolute difference relative to the largest absolute exact band flux
+    of that component is recorded in ``max_error``. This bounds the
+    emulator error relative to the peak of the light curve.
+    """
+
+    # 10**(-0.4 * x) == exp(-_ALPHA * x)
+    _ALPHA = 0.4 * log(10.)
+
+    def __init__(self, source, bands, zmin, zmax, dz=0.01, cmax=1.):
+        if not isinstance(source, SALT2Source):
+            raise TypeError('source must be a SALT2Source')
+        if not zmax > zmin:
+            raise ValueError('zmax must be greater than zmin')
+
+        # The grid extends one node beyond each end of the range, so that
+        # cubic (rather than linear) interpolation is used over all of it.
+        nz = int(ceil((zmax - zmin) / dz))
+        self.zmin = float(zmin)
+        self.zmax = float(zmax)
+        self.cmax = float(cmax)
+        self._z = zmin + (zmax - zmin) / nz * np.arange(-1, nz + 2)
+        self._source = source
+        self._source_hash = source._content_hash()
+        self._components = ('M0', 'M1')
+
+        # Native phases of each component. These are usually identical,
+        # in which case the phase interpolation weights are shared.
+        self._phase = [source._component_grid[key][0]
+                       for key in self._components]
+        if np.array_equal(self._phase[0], self._phase[1]):
+            self._phase[1] = self._phase[0]
+
+        self._tables = {}
+        self.max_error = {}
+        for band in bands:
+            band = get_bandpass(band)
+            self._tables[band] = self._build(band)
+            self.max_error[band.name] = self._validate(band)
+
+    @property
+    def bands(self):
+        """List of tabulated bandpasses."""
+        return list(self._tables.keys())
+
+    def _build(self, band):
+        """Tabulate band integrals for a single bandpass.
+
+        Returns the mean color law at each grid redshift and, for each
+        component, an array of shape (nz, 3, nterms, nphase). The three
+        tables hold the band integrals of the surface interpolated in
+        wavelength:
+
+        0. with cubic convolution, over wavelengths away from the edges
+           of the grid;
+        1. linearly, over wavelengths next to the edges of the grid;
+        2. linearly, over all wavelengths.
+
+        Cubic convolution in phase uses the sum of 0 and 1 and linear
+        interpolation in phase uses 2, as in `BicubicInterpolator`.
+        """
+
+        source = self._source
+        if (band.minwave() < source.minwave() * (1. + self._z[-1]) or
+                band.maxwave() > source.maxwave() * (1. + self._z[0])):
+            raise ValueError('bandpass {0!r:s} [{1:.6g}, .., {2:.6g}] '
+                             'outside spectral range of source at '
+                             'redshifts [{3:.6g}, .., {4:.6g}]'
+                             .format(band.name, band.minwave(),
+                                     band.maxwave(), self._z[0],
+                                     self._z[-1]))
+
+        plan = _integration_plan(band)
+        restwave = plan.wave / (1. + self._z[:, None])  # shape (nz, nwave)
+        cl = source._colorlaw(restwave.ravel()).reshape(restwave.shape)
+        clmean = np.dot(cl, plan.weights) / np.sum(plan.weights)
+        dcl = cl - clmean[:, None]
+
+        # Number of terms in the expansion of exp(-alpha * dcl * c) needed
+        # for a truncation error below 1e-9 at |c| = cmax.
+        x = self._ALPHA * self.cmax * np.max(np.abs(dcl))
+        nterms = 1
+        term = x
+        while term * exp(x) > 1.e-9:
+            nterms += 1
+            term *= x / nterms
+
+        # weights[k, i, n] = w_i * dcl_ki**n / n!
+        n = np.arange(nterms)
+        factorial = np.cumprod(np.maximum(n, 1.))
+        weights = plan.weights[:, None] * dcl[:, :, None] ** n / factorial
+
+        tables = []
+        for key in self._components:
+            phase, wave, values = source._component_grid[key]
+            table = np.empty((len(self._z), 3, nterms, len(phase)))
+            for k in range(len(self._z)):
+                cubic, linear, edge = _convolution_matrices(wave,
+                                                            restwave[k])
+                w = weights[k]
+                table[k, 0] = np.dot(values, np.dot(cubic[~edge].T,
+                                                    w[~edge])).T
+                table[k, 1] = np.dot(values, np.dot(linear[edge].T,
+                                                    w[edge])).T
+                table[k, 2] = np.dot(values, np.dot(linear.T, w)).T
+            tables.append(table)
+
+        return clmean, tables
+
+    def _covers(self, band, z, c):
+        return (band in self._tables and self.zmin <= z <= self.zmax and
+                abs(c) <= self.cmax)
+
+    def _integrals(self, band, z, phase, c):
+        """Band integrals of each component, including the color law but
+        not ``x0`` or the ``1/(1+z)`` factor, at rest-frame phases."""
+
+        clmean, tables = self._tables[band]
+        zidx, zweights, _, _ = _convolution_weights(self._z, [z])
+        nonzero = zweights[0] != 0.
+        zidx = zidx[0, nonzero]
+        zweights = zweights[0, nonzero]
+
+        # Powers of (-alpha * c) in the color expansion, times the color
+        # law factor at the mean and the interpolation weight for each
+        # grid redshift.
+        coeffs = ((-self._ALPHA * c) ** np.arange(tables[0].shape[2]) *
+                  (zweights * np.exp(-self._ALPHA * c * clmean[zidx]))
+                  [:, None])
+
+        result = []
+        phase_weights = None
+        for nodes, table in zip(self._phase, tables):
+            if phase_weights is None or nodes is not phase_weights[0]:
+                phase_weights = (nodes,
+                                 _convolution_weights(nodes, phase))
+            idx, w, lw, linear = phase_weights[1]
+
+            values = np.einsum('kn,ktnp->tp', coeffs, table[zidx])
+            result.append(np.where(
+                linear, np.sum(lw * values[2, idx], axis=1),
+                np.sum(w * values[0, idx] + lw * values[1, idx], axis=1)))
+
+        return result
+
+    def _validate(self, band):
+        """Maximum error of the components, relative to their peak
+        absolute band flux, at points between the table nodes."""
+
+        source = self._source
+        plan = _integration_plan(band)
+        zmid = 0.5 * (self._z[2:-1] + self._z[1:-2])
+
+        maxerr = 0.
+        for i, (key, nodes) in enumerate(zip(self._components,
+                                             self._phase)):
+            phase = 0.5 * (nodes[1:] + nodes[:-1])
+            maxdiff = 0.
+            maxflux = 0.
+            for z in zmid:
+                restwave = plan.wave / (1. + z)
+                m = source._model[key](phase, restwave)
+                cl = source._colorlaw(restwave)
+                for c in (-self.cmax, 0., self.cmax):
+                    exact = np.dot(m, plan.weights * 10. ** (-0.4 * cl * c))
+                    approx = self._integrals(band, z, phase, c)[i]
+                    maxdiff = max(maxdiff, np.max(np.abs(approx - exact)))
+                    maxflux = max(maxflux, np.max(np.abs(exact)))
+            if maxflux > 0.:
+                maxerr = max(maxerr, maxdiff / maxflux)
+
+        return maxerr
+
+    def _bandflux(self, model, band, time):
+        """Band flux of a model (without effects) for which `_covers` is
+        true."""
+
+        z, t0, x0, x1, c = model._parameters
+        a = 1. / (1. + z)
+        i0, i1 = self._integrals(band, z, (time - t0) * a, c)
+        return a * x0 * (i0 + x1 * i1)
+
 
 class MLCS2k2Source(Source):
     """A spectral time series model based on the MLCS2k2 model light curves,
@@ -901,7 +2052,8 @@ class MLCS2k2Source(Source):
     where _A_ is the amplitude and _Delta_ is the MLCS2k2 light curve shape
     parameter.
 
-    .. note:: Requires scipy version 0.14 or higher.
+    The flux is linearly interpolated in delta, phase and wavelength, and is
+    zero outside the grid.
 
     Parameters
     ----------
@@ -915,17 +2067,6 @@ class MLCS2k2Source(Source):
     param_names_latex = ['A', '\Delta']
 
     def __init__(self, fluxfile, name=None, version=None):
-
-        # RegularGridInterpolator is only available in recent scipy
-        # versions.
-        try:
-            from scipy.interpolate import RegularGridInterpolator
-        except ImportError:
-            import scipy  # to get scipy version
-            raise ImportError("scipy version 0.14 or greater required for "
-                              "MLCS2k2Source. Installed version: " +
-                              scipy.__version__)
-
         self.name = name
         self.version = version
         self._parameters = np.array([1., 0.])
@@ -935,24 +2076,110 @@ class MLCS2k2Source(Source):
         self._phase = phase
         self._wave = wave
         self._delta = delta
-        self._3d_model_flux = RegularGridInterpolator((delta, phase, wave),
-                                                      values,
-                                                      bounds_error=False,
-                                                      fill_value=0.)
+        self._3d_model_flux = np.asarray(values, dtype=np.float64)
+        self._slice_delta = None
+        self._slice = None
+
+    def _model_slice(self):
+        """Model flux grid in phase and wavelength at the current delta.
+
+        Delta is a single value per evaluation, so the interpolation in
+        delta is done once and the result is reused until delta changes.
+        """
+        delta = self._parameters[1]
+        if delta != self._slice_delta:
+            d = self._delta
+            values = self._3d_model_flux
+            if d[0] <= delta <= d[-1]:
+                i = min(np.searchsorted(d, delta, side='right') - 1,
+                        len(d) - 2)
+                t = (delta - d[i]) / (d[i+1] - d[i])
+                s = (1. - t) * values[i] + t * values[i+1]
+            else:
+                s = np.zeros(values.shape[1:])
+            self._slice = s
+            self._slice_delta = delta
+        return self._slice
 
     def _flux(self, phase, wave):
-        # "outer cartesian product" code from fast cartesian_product2 from
-        # http://stackoverflow.com/questions/11144513/numpy-cartesian-product-
-        #     of-x-and-y-array-points-into-single-array-of-2d-points
-        arrays = [[self.parameters[1]], phase, wave]
-        lp = len(phase)
-        lw = len(wave)
-        arr = np.empty((1, lp, lw, 3), dtype=np.float64)
-        for i, a in enumerate(np.ix_(*arrays)):
-            arr[..., i] = a
-        points = arr.reshape((-1, 3))
         return (self._parameters[0] *
-                self._3d_model_flux(points).reshape(lp, lw))
+                bilinear_interp(self._phase, self._wave, self._model_slice(),
+                                phase, wave))
+
+
+class _DistmodTable(object):
+    """Distance modulus of a cosmology, interpolated in log redshift.
+
+    The number of nodes is doubled until the interpolation error at the
+    midpoints between nodes is below ``tol`` (in magnitudes). The table is
+    rebuilt over a wider range when redshifts outside it are requested.
+    """
+
+    _MAX_NODES = 2**16 + 1
+
+    def __init__(self, cosmo, tol):
+        self.cosmo = cosmo
+        self.tol = tol
+        self.zmin = None
+        self.zmax = None
+        self._spline = None
+
+    def _build(self, zmin, zmax):
+        x = np.linspace(log(zmin), log(zmax), 65)
+        y = self.cosmo.distmod(np.exp(x)).value
+        while True:
+            spline = Spline1d(x, y, k=3)
+            xmid = 0.5 * (x[1:] + x[:-1])
+            ymid = self.cosmo.distmod(np.exp(xmid)).value
+            if (np.max(np.abs(spline(xmid) - ymid)) <= self.tol or
+                    len(x) >= self._MAX_NODES):
+                break
+            x = np.insert(x, np.arange(1, len(x)), xmid)
+            y = np.insert(y, np.arange(1, len(y)), ymid)
+
+        self._spline = spline
+        self.zmin = zmin
+        self.zmax = zmax
+
+    def __call__(self, z):
+        z = np.asarray(z, dtype=np.float64)
+        zmin = np.min(z)
+        zmax = np.max(z)
+        if self._spline is None:
+            self._build(min(zmin / 2., 1.e-3), max(2. * zmax, 3.))
+        elif zmin < self.zmin or zmax > self.zmax:
+            self._build(min(zmin / 2., self.zmin), max(2. * zmax, self.zmax))
+        return self._spline(np.log(z))
+
+
+# Distance modulus tables: {(id(cosmo), tol): table}. Each table holds a
+# reference to its cosmology, so that ids are not reused while cached.
+_DISTMOD_TABLES = {}
+_MAX_DISTMOD_TABLES = 16
+
+
+def _distmod(cosmo, z):
+    """Distance modulus of ``cosmo`` at redshift(s) ``z`` (> 0).
+
+    Values are interpolated from a cached table accurate to
+    ``conf.distmod_tolerance``, or, if that is 0, computed by ``cosmo``.
+    """
+
+    tol = conf.distmod_tolerance
+    if not tol > 0. or np.any(np.asarray(z) <= 0.):
+        return cosmo.distmod(z).value
+
+    key = (id(cosmo), tol)
+    try:
+        table = _DISTMOD_TABLES[key]
+    except KeyError:
+        if len(_DISTMOD_TABLES) >= _MAX_DISTMOD_TABLES:
+            _DISTMOD_TABLES.clear()
+        table = _DISTMOD_TABLES[key] = _DistmodTable(cosmo, tol)
+    result = table(z)
+    if result.ndim == 0:
+        return float(result)
+    return result
 
 
 class Model(_ModelBase):
@@ -989,6 +2216,7 @@ class Model(_ModelBase):
         self._param_names = ['z', 't0']
         self.param_names_latex = ['z', 't_0']
         self._parameters = np.zeros(2, dtype=np.float)
+        self._emulator = None
 
         # Set source and add source parameter names
         self._source = get_source(source, copy=True)
@@ -1031,6 +2259,9 @@ class Model(_ModelBase):
             Name of the effect.
         frame : {'rest', 'obs', 'free'}
         """
+        if self._emulator is not None:
+            raise ValueError('cannot add effects to a model with an '
+                             'emulator')
         self._add_effect_partial(effect, name, frame)
         self._sync_parameter_arrays()
         self._update_description()
@@ -1040,6 +2271,31 @@ class Model(_ModelBase):
         """The Source instance."""
         return self._source
 
+    @property
+    def emulator(self):
+        """`~sncosmo.SALT2Emulator` used for synthetic photometry, or
+        `None` (default).
+
+        The emulator must have been built from a source with the same
+        model components and color law as this model's source, and the
+        model may not have any effects."""
+        return self._emulator
+
+    @emulator.setter
+    def emulator(self, emulator):
+        if emulator is not None:
+            if not isinstance(emulator, SALT2Emulator):
+                raise TypeError('emulator must be a SALT2Emulator')
+            if not isinstance(self._source, SALT2Source):
+                raise TypeError('emulator requires a SALT2Source')
+            if emulator._source_hash != self._source._content_hash():
+                raise ValueError('emulator was built from a source with '
+                                 'different model components or color law')
+            if len(self._effects) > 0:
+                raise ValueError('emulator not supported for models with '
+                                 'effects')
+        self._emulator = emulator
+
     @property
     def effect_names(self):
         """Names of propagation effects (list of str)."""
@@ -1210,7 +2466,34 @@ class Model(_ModelBase):
         # bolometric luminosity.
         f = a * self._source._flux(phase, restwave)
 
-        # Pass the flux through the PropagationEffects.
+        return self._propagate(wave, restwave, f)
+
+    def _integrated_flux(self, time, wave, weights):
+        """Weighted sum of ``_flux(time, wave)`` over wavelength."""
+
+        a = 1. / (1. + self._parameters[0])
+        phase = (time - self._parameters[1]) * a
+        restwave = wave * a
+
+        # Effects known to act multiplicatively are folded into the weights
+        # along with the scale factor; otherwise the flux is integrated.
+        if not self._multiplicative_effects():
+            return np.dot(self._flux(time, wave), weights)
+        weights = a * weights
+        if len(self._effects) > 0:
+            weights = weights * self._propagate(wave, restwave,
+                                                np.ones((1, len(wave))))[0]
+
+        return self._source._integrated_flux(phase, restwave, weights)
+
+    def _multiplicative_effects(self):
+        """Whether all effects are known to act multiplicatively on the
+        flux (see `PropagationEffect`)."""
+        return all(effect._multiplicative for effect in self._effects)
+
+    def _propagate(self, wave, restwave, f):
+        """Pass the flux through the PropagationEffects."""
+
         for effect, frame, zindex in zip(self._effects, self._effect_frames,
                                          self._effect_zindicies):
             if frame == 'obs':
@@ -1225,6 +2508,84 @@ class Model(_ModelBase):
 
         return f
 
+    def _flux_jacobian(self, time, wave, indicies=None):
+        """Array flux function and its derivatives with respect to the
+        model parameters.
+
+        If ``indicies`` is given, derivatives are only computed for these
+        parameter indicies and are zero for others.
+
+        Returns
+        -------
+        f : `~numpy.ndarray` (2-d)
+            Same as ``_flux(time, wave)``.
+        jac : `~numpy.ndarray` (3-d)
+            Shape ``(len(parameters), len(time), len(wave))``.
+        """
+
+        wanted = np.zeros(len(self._parameters), dtype=np.bool_)
+        wanted[slice(None) if indicies is None else indicies] = True
+
+        # Other effects: finite differences for all parameters.
+        if not self._multiplicative_effects():
+            jac = np.zeros((len(self._parameters), len(time), len(wave)))
+            idx = np.flatnonzero(wanted)
+            if len(idx) > 0:
+                jac[idx] = _finite_difference_jacobian(
+                    self, lambda: self._flux(time, wave), idx)
+            return self._flux(time, wave), jac
+
+        a = 1. / (1. + self._parameters[0])
+        phase = (time - self._parameters[1]) * a
+        restwave = wave * a
+
+        # Transmission of each effect. Effects act multiplicatively, so
+        # they are evaluated on unit flux.
+        ones = np.ones((1, len(wave)))
+        effect_waves = []
+        trans = []
+        for effect, frame, zindex in zip(self._effects, self._effect_frames,
+                                         self._effect_zindicies):
+            if frame == 'obs':
+                effect_wave = wave
+            elif frame == 'rest':
+                effect_wave = restwave
+            else:  # frame == 'free'
+                effect_wave = wave / (1. + self._parameters[zindex])
+            effect_waves.append(effect_wave)
+            trans.append(effect.propagate(effect_wave, ones))
+
+        # Note that below we multiply by the scale factor to conserve
+        # bolometric luminosity.
+        total = a * np.prod(trans, axis=0) if trans else a
+        f, sjac = self._source._flux_jacobian(phase, restwave)
+        jac = np.zeros((len(self._parameters), len(time), len(wave)))
+
+        # Redshifts change the phase, wavelength and scale factor together:
+        # use finite differences.
+        zindicies = [i for i in [0] + self._effect_zindicies
+                     if i != -1 and wanted[i]]
+        if len(zindicies) > 0:
+            jac[zindicies] = _finite_difference_jacobian(
+                self, lambda: self._flux(time, wave), zindicies)
+
+        if wanted[1]:
+            jac[1] = -a * total * self._source._flux_dphase(phase, restwave)
+        pos = 2 + len(self._source._parameters)
+        jac[2:pos] = total * sjac
+
+        for i, effect in enumerate(self._effects):
+            if self._effect_frames[i] == 'free':
+                pos += 1
+            n = len(effect._parameters)
+            if np.any(wanted[pos:pos + n]):
+                others = a * np.prod(trans[:i] + trans[i + 1:], axis=0)
+                jac[pos:pos + n] = others * f * effect._propagate_jacobian(
+                    effect_waves[i], ones)
+            pos += n
+
+        return total * f, jac
+
     def flux(self, time, wave):
         """The spectral flux density at the given time and wavelength values.
 
@@ -1304,7 +2665,7 @@ class Model(_ModelBase):
             return overlap[:, 0]
         return overlap
 
-    def bandflux(self, band, time, zp=None, zpsys=None):
+    def bandflux(self, band, time, zp=None, zpsys=None, fused=False):
         """Flux through the given bandpass(es) at the given time(s).
 
         Default return value is flux in photons / s / cm^2. If zp and zpsys
@@ -1322,6 +2683,15 @@ class Model(_ModelBase):
         zpsys : str or list_like, optional
             Name of a magnitude system in the registry, specifying the system
             that ``zp`` is in.
+        fused : bool, optional
+            If True, evaluate the model spectral flux only once, on the
+            union of all requested times and all bandpass integration
+            wavelengths, then integrate each bandpass from that single
+            evaluation. This reduces the number of (per-call) model
+            evaluations from one per bandpass to one in total, at the cost
+            of evaluating the model at more (time, wavelength) points. It is
+            typically faster when there are few points per bandpass or
+            several bandpasses share times. Default is False.
 
         Returns
         -------
@@ -1333,12 +2703,185 @@ class Model(_ModelBase):
         """
 
         try:
-            return _bandflux(self, band, time, zp, zpsys)
+            return _bandflux(self, band, time, zp, zpsys, fused=fused)
         except ValueError as e:
             _check_for_fitpack_error(e, time, 'time')
             raise e
 
-    def _bandflux_rcov(self, band, time):
+    def bandflux_batch(self, parameters, band, time, zp=None, zpsys=None):
+        """Flux through the given bandpass(es) at the given time(s), for
+        many sets of model parameters at once.
+
+        This is equivalent to setting the model parameters to each row of
+        ``parameters`` in turn and calling `~sncosmo.Model.bandflux`, but
+        is much faster for many parameter sets: parameter sets are grouped
+        by redshift and effect parameters, and within each group the source
+        is evaluated for all parameter sets in a single call.
+
+        Parameters
+        ----------
+        parameters : `~numpy.ndarray` (2-d)
+            Model parameters, shape ``(N, len(param_names))``. Each row is
+            ordered like ``param_names``.
+        band : str or list_like
+            Name(s) of Bandpass(es) in registry.
+        time : float or list_like
+            Time(s) in days.
+        zp : float or list_like, optional
+            If given, zeropoint to scale flux to (must also supply ``zpsys``).
+            If not given, flux is not scaled.
+        zpsys : str or list_like, optional
+            Name of a magnitude system in the registry, specifying the system
+            that ``zp`` is in.
+
+        Returns
+        -------
+        bandflux : `~numpy.ndarray`
+            Shape ``(N, npoints)``, where ``npoints`` is the broadcast length
+            of ``band``, ``time``, ``zp`` and ``zpsys``, or shape ``(N,)`` if
+            these are all scalars. Units are as in
+            `~sncosmo.Model.bandflux`.
+
+        Notes
+        -----
+        Propagation effects known to act multiplicatively on the flux (as
+        all built-in effects do) are applied as a transmission. Models with
+        other effects are evaluated for one parameter set at a time.
+
+        The model's own parameters are left unchanged.
+        """
+
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=np.float64))
+        if (parameters.ndim != 2 or
+                parameters.shape[1] != len(self._parameters)):
+            raise ValueError("parameters must have shape (N, {:d})"
+                             .format(len(self._parameters)))
+
+        band, time, zp, zpsys, ndim = \
+            _broadcast_bandflux_args(band, time, zp, zpsys)
+
+        bandflux = np.zeros((len(parameters), len(time)), dtype=np.float64)
+
+        bands = [(get_bandpass(b), band == b) for b in set(band)]
+
+        saved = self._parameters.copy()
+        try:
+            if not self._multiplicative_effects():
+                for i in range(len(parameters)):
+                    self._parameters[:] = parameters[i]
+                    for b, mask in bands:
+                        bandflux[i, mask] = _bandflux_single(self, b,
+                                                             time[mask])
+            else:
+                self._bandflux_batch_grouped(parameters, bands, time,
+                                             bandflux)
+        finally:
+            self._parameters[:] = saved
+
+        if zp is not None:
+            for b, mask in bands:
+                bandflux[:, mask] *= _zpnorm(b, zp[mask], zpsys[mask])
+
+        if ndim == 0:
+            return bandflux[:, 0]
+        return bandflux
+
+    def _bandflux_batch_grouped(self, parameters, bands, time, bandflux):
+        """Fill ``bandflux`` for `bandflux_batch`, evaluating the source for
+        all parameter sets sharing redshift and effect parameters at once.
+        Assumes multiplicative effects; sets ``self._parameters``."""
+
+        nsource = len(self._source._parameters)
+        source_slice = slice(2, 2 + nsource)
+
+        # Parameter sets with the same redshift and effect parameters share
+        # the same rest-frame wavelength grid and effect transmission.
+        group_keys = np.hstack((parameters[:, 0:1],
+                                parameters[:, 2 + nsource:]))
+        _, group_idx = np.unique(group_keys, axis=0, return_inverse=True)
+
+        for g in range(group_idx.max() + 1):
+            rows = np.flatnonzero(group_idx == g)
+            self._parameters[:] = parameters[rows[0]]
+
+            a = 1. / (1. + self._parameters[0])
+            t0 = parameters[rows, 1, None]
+            source_params = parameters[rows, source_slice]
+
+            for b, mask in bands:
+                _check_band_overlap(self, b)
+                plan = _integration_plan(b)
+                restwave = plan.wave * a
+
+                # Fold the effects (transmission as a function of
+                # wavelength) and the scale factor into the weights.
+                trans = self._propagate(plan.wave, restwave,
+                                        np.ones((1, len(restwave))))[0]
+                weights = a * trans * plan.weights
+
+                phase = (time[mask] - t0) * a
+                bandflux[np.ix_(rows, mask)] = \
+                    self._source._bandflux_batch(source_params, phase,
+                                                 restwave, weights)
+
+    def bandflux_jacobian(self, band, time, zp=None, zpsys=None):
+        """Derivatives of the flux in the given bandpass(es) with respect
+        to the model parameters.
+
+        Parameters
+        ----------
+        band, time, zp, zpsys
+            As for `~sncosmo.Model.bandflux`.
+
+        Returns
+        -------
+        jac : `~numpy.ndarray`
+            Derivatives with respect to each of ``parameters``, with shape
+            ``(len(time), len(parameters))`` (the first dimension is absent
+            if all inputs are scalars).
+
+        Notes
+        -----
+        Derivatives with respect to ``t0`` use the phase derivative of the
+        source, which is analytic for the built-in sources. Derivatives
+        with respect to the parameters of the built-in sources and the
+        ``ebv`` parameter of the built-in dust effects are also analytic.
+        Other derivatives, including those with respect to redshifts, are
+        computed by finite differences, as are all derivatives of models
+        with effects not known to act multiplicatively on the flux.
+        """
+
+        _, jac = self._bandflux_jacobian(band, time, zp, zpsys)
+        return jac
+
+    def _bandflux_jacobian(self, band, time, zp, zpsys, indicies=None):
+        """Band flux and its derivatives with respect to the model
+        parameters. See `bandflux_jacobian` and `_flux_jacobian`."""
+
+        band, time, zp, zpsys, ndim = \
+            _broadcast_bandflux_args(band, time, zp, zpsys)
+
+        bandflux = np.zeros(time.shape, dtype=np.float64)
+        jac = np.zeros(time.shape + self._parameters.shape, dtype=np.float64)
+        for b in set(band):
+            mask = band == b
+            b = get_bandpass(b)
+            _check_band_overlap(self, b)
+            plan = _integration_plan(b)
+            f, fjac = self._flux_jacobian(time[mask], plan.wave, indicies)
+            bandflux[mask] = np.dot(f, plan.weights)
+            jac[mask] = np.dot(fjac, plan.weights).T
+
+            if zp is not None:
+                zpnorm = _zpnorm(b, zp[mask], zpsys[mask])
+                bandflux[mask] *= zpnorm
+                jac[mask] *= zpnorm[:, None]
+
+        if ndim == 0:
+            return bandflux[0], jac[0]
+        return bandflux, jac
+
+    def _bandflux_rcov(self, band, time, structured=False):
         """Relative covariance in given bandpass and times.
 
         Parameters
@@ -1347,6 +2890,9 @@ class Model(_ModelBase):
             Name(s) of Bandpass(es) in registry.
         time : float or list_like
             Time(s) in days. Must be in ascending order.
+        structured : bool, optional
+            If True and the source supports it, return a
+            `StructuredCovariance` (for 1-d input) instead of an array.
         """
 
         a = 1. / (1. + self._parameters[0])
@@ -1357,15 +2903,20 @@ class Model(_ModelBase):
         time = np.atleast_1d(time)
         band = np.atleast_1d(band)
 
-        # Convert `band` to an array of rest-frame bands
+        # Convert `band` to an array of rest-frame bands. (The views are
+        # cached, so that their wavelength grids and integration plans are
+        # reused across calls.)
         restband = np.empty(len(time), dtype='object')
         for b in set(band):
             mask = band == b
             b = get_bandpass(b)
-            restband[mask] = b.shifted(a)
+            restband[mask] = b._shifted_view(a)
 
         phase = (time - self._parameters[1]) * a
 
+        if structured and hasattr(self._source, '_bandflux_rcov_structured'):
+            return self._source._bandflux_rcov_structured(restband, phase)
+
         # Note that not all sources have this method. The idea
         # is that this will automatically fail if the method doesn't exist
         # for self._source.
@@ -1410,6 +2961,17 @@ class Model(_ModelBase):
 
         return f, cov
 
+    def _bandfluxcov_structured(self, band, time, zp=None, zpsys=None):
+        """Like ``bandfluxcov()`` for 1-d arrays of observations, but
+        returns the covariance as a `StructuredCovariance` if the source
+        supports it (and as a 2-d array otherwise)."""
+
+        f = self.bandflux(band, time, zp=zp, zpsys=zpsys)
+        rcov = self._bandflux_rcov(band, time, structured=True)
+        if isinstance(rcov, StructuredCovariance):
+            return f, rcov.scaled(f)
+        return f, f * rcov * f[:, np.newaxis]
+
     def bandmag(self, band, magsys, time):
         """Magnitude at the given time(s) through the given
         bandpass(es), and for the given magnitude system(s).
@@ -1465,10 +3027,21 @@ class Model(_ModelBase):
            not (isinstance(magsys, six.string_types))):
             raise TypeError("Magnitude system argument must be scalar.")
 
-        return (self.bandmag(band1, magsys, time) -
-                self.bandmag(band2, magsys, time))
-
-    def source_peakmag(self, band, magsys, sampling=1.0):
+        # Evaluate both bands in a single call.
+        t = np.atleast_1d(time).ravel()
+        n = len(t)
+        band = np.empty(2 * n, dtype=object)
+        band[:n] = band1
+        band[n:] = band2
+        mag = _bandmag(self, band, magsys, np.concatenate((t, t)))
+        color = mag[:n] - mag[n:]
+
+        if np.ndim(time) == 0:
+            return color[0]
+        return color
+
+    def source_peakmag(self, band, magsys, sampling=1.0,
+                       method='parabola'):
         """Peak apparent magnitude of source in a rest-frame bandpass.
 
         Note that this is the peak magnitude of just the *source* component
@@ -1483,6 +3056,9 @@ class Model(_ModelBase):
         sampling : float, optional
             Sampling in rest-frame days used to find the peak of the light
             curve.
+        method : {'parabola', 'brent'}, optional
+            Method used to locate the peak of the light curve; see
+            `~sncosmo.Source.peakphase`. Default is 'parabola'.
 
         Returns
         -------
@@ -1490,9 +3066,11 @@ class Model(_ModelBase):
             Peak apparent magnitude of just the source component of the model.
         """
 
-        return self._source.peakmag(band, magsys, sampling=sampling)
+        return self._source.peakmag(band, magsys, sampling=sampling,
+                                    method=method)
 
-    def set_source_peakmag(self, m, band, magsys, sampling=1.0):
+    def set_source_peakmag(self, m, band, magsys, sampling=1.0,
+                           method='parabola'):
         """Set the amplitude of the source component of the model according to
         a peak apparent magnitude.
 
@@ -1510,11 +3088,15 @@ class Model(_ModelBase):
         sampling : float, optional
             Sampling in rest-frame days used to find the peak of the light
             curve. Default is 1.0.
+        method : {'parabola', 'brent'}, optional
+            Method used to locate the peak of the light curve; see
+            `~sncosmo.Source.peakphase`. Default is 'parabola'.
         """
-        self._source.set_peakmag(m, band, magsys, sampling=sampling)
+        self._source.set_peakmag(m, band, magsys, sampling=sampling,
+                                 method=method)
 
     def source_peakabsmag(self, band, magsys, sampling=1.0,
-                          cosmo=cosmology.WMAP9):
+                          cosmo=cosmology.WMAP9, method='parabola'):
         """Peak absolute magnitude of the source in rest-frame bandpass.
 
         Note that this is the peak absolute magnitude of just the *source*
@@ -1533,17 +3115,21 @@ class Model(_ModelBase):
             Instance of a cosmology from ``astropy.cosmology``, used to
             calculate distance modulus, given the model's redshift. Default
             is WMAP9.
+        method : {'parabola', 'brent'}, optional
+            Method used to locate the peak of the light curve; see
+            `~sncosmo.Source.peakphase`. Default is 'parabola'.
 
         Returns
         -------
         float
             Peak absolute magnitude of just the source component of the model.
         """
-        return (self._source.peakmag(band, magsys, sampling=sampling) -
-                cosmo.distmod(self._parameters[0]).value)
+        return (self._source.peakmag(band, magsys, sampling=sampling,
+                                     method=method) -
+                _distmod(cosmo, self._parameters[0]))
 
     def set_source_peakabsmag(self, absmag, band, magsys, sampling=1.0,
-                              cosmo=cosmology.WMAP9):
+                              cosmo=cosmology.WMAP9, method='parabola'):
         """Set the amplitude of the source component of the model according to
         the desired absolute magnitude in the specified band.
 
@@ -1562,12 +3148,68 @@ class Model(_ModelBase):
             Instance of a cosmology from ``astropy.cosmology``, used to
             calculate distance modulus, given the model's redshift. Default
             is WMAP9.
+        method : {'parabola', 'brent'}, optional
+            Method used to locate the peak of the light curve; see
+            `~sncosmo.Source.peakphase`. Default is 'parabola'.
         """
 
         if self._parameters[0] <= 0.:
             raise ValueError('absolute magnitude undefined when z<=0.')
-        m = absmag + cosmo.distmod(self._parameters[0]).value
-        self._source.set_peakmag(m, band, magsys, sampling=sampling)
+        m = absmag + _distmod(cosmo, self._parameters[0])
+        self._source.set_peakmag(m, band, magsys, sampling=sampling,
+                                 method=method)
+
+    def set_source_peakabsmag_batch(self, parameters, absmag, band, magsys,
+                                    sampling=1.0, cosmo=cosmology.WMAP9):
+        """Scale the source amplitude of many parameter sets according to
+        the desired absolute magnitudes in the specified band.
+
+        This is equivalent to setting the model parameters to each row of
+        ``parameters`` in turn and calling
+        `~sncosmo.Model.set_source_peakabsmag`, except that the peak is
+        found with `~sncosmo.Source.peakmag_batch`. The model's own
+        parameters are left unchanged.
+
+        Parameters
+        ----------
+        parameters : `~numpy.ndarray` (2-d)
+            Model parameters, shape ``(N, len(param_names))``. Each row is
+            ordered like ``param_names``. The redshift must be positive.
+        absmag : float or `~numpy.ndarray` (1-d)
+            Desired absolute magnitude(s), one per parameter set.
+        band : str or `~sncosmo.Bandpass`
+            Bandpass or name of bandpass in registry.
+        magsys : str or `~sncosmo.MagSystem`
+            Magnitude system or name of magnitude system in registry.
+        sampling : float, optional
+            Sampling in rest-frame days used to bracket the peak of the
+            light curve. Default is 1.0.
+        cosmo : astropy Cosmology, optional
+            Instance of a cosmology from ``astropy.cosmology``, used to
+            calculate distance modulus, given the redshifts. Default is
+            WMAP9.
+
+        Returns
+        -------
+        parameters : `~numpy.ndarray` (2-d)
+            Copy of ``parameters`` with the source amplitude scaled.
+        """
+
+        parameters = np.array(parameters, dtype=np.float64, ndmin=2)
+        if (parameters.ndim != 2 or
+                parameters.shape[1] != len(self._parameters)):
+            raise ValueError("parameters must have shape (N, {:d})"
+                             .format(len(self._parameters)))
+        z = parameters[:, 0]
+        if np.any(z <= 0.):
+            raise ValueError('absolute magnitude undefined when z<=0.')
+
+        m = absmag + _distmod(cosmo, z)
+        nsource = len(self._source._parameters)
+        m_current = self._source.peakmag_batch(
+            parameters[:, 2:2 + nsource], band, magsys, sampling=sampling)
+        parameters[:, 2] *= 10.**(0.4 * (m_current - m))
+        return parameters
 
     def _headsummary(self):
         head = "<{0:s} at 0x{1:x}>".format(self.__class__.__name__, id(self))
@@ -1587,20 +3229,70 @@ class Model(_ModelBase):
                     effect_names=self._effect_names,
                     effect_frames=self._effect_frames)
         new._parameters[0:2] = self._parameters[0:2]
+        new._emulator = self._emulator
         return new
 
     def __deepcopy__(self, memo):
         return cp(self)
 
+    def __setstate__(self, state):
+        """Restore a pickled model. Pickling copies the parameter arrays of
+        the source and effects, so they are made to reference the model's
+        parameters again."""
+        self.__dict__.update(state)
+        self._sync_parameter_arrays()
+
+
+class _CurveCache(object):
+    """Bounded cache of extinction curves, keyed by wavelength grid and R_V.
+
+    ``hits`` and ``misses`` count the lookups.
+    """
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._curves = {}
+
+    def get(self, func, wave, r_v):
+        """Return ``func(wave, r_v)``, computing it only on a cache miss."""
+        wave = np.asarray(wave, dtype=np.float64)
+        key = (wave.tobytes(), r_v)
+        try:
+            curve = self._curves[key]
+        except KeyError:
+            self.misses += 1
+            if len(self._curves) >= self.maxsize:
+                self._curves.clear()
+            curve = self._curves[key] = func(wave, r_v)
+            curve.flags.writeable = False
+        else:
+            self.hits += 1
+        return curve
+
 
 class PropagationEffect(_ModelBase):
     """Abstract base class for propagation effects.
 
     Derived classes must define _minwave (float), _maxwave (float).
+
+    Subclasses whose ``propagate(wave, flux)`` acts multiplicatively on
+    the flux (i.e., applies a wavelength-dependent transmission), as all
+    built-in effects do, can set ``_multiplicative = True``. Synthetic
+    photometry then folds the transmission into the integration weights
+    rather than propagating the flux itself.
+
+    Dust effects can define ``_unit_curve(wave, r_v)``, the extinction in
+    magnitudes for E(B-V) = 1, and use ``_extinction_curve`` to get it,
+    cached by wavelength grid and R_V.
     """
 
     __metaclass__ = abc.ABCMeta
 
+    _curve_cache = None
+    _multiplicative = False
+
     def minwave(self):
         return self._minwave
 
@@ -1611,6 +3303,27 @@ class PropagationEffect(_ModelBase):
     def propagate(self, wave, flux):
         pass
 
+    def _extinction_curve(self, wave, r_v):
+        """Cached ``_unit_curve(wave, r_v)``.
+
+        The cache is created on first use and is shared with (shallow)
+        copies of the effect.
+        """
+        if self._curve_cache is None:
+            self._curve_cache = _CurveCache()
+        return self._curve_cache.get(self._unit_curve, wave, r_v)
+
+    def _propagate_jacobian(self, wave, flux):
+        """Derivatives of ``propagate(wave, flux)`` with respect to the
+        parameters, shape ``(len(param_names),) + flux.shape``.
+
+        Subclasses may override this with analytic derivatives. The
+        default implementation uses finite differences.
+        """
+        return np.array(_finite_difference_jacobian(
+            self, lambda: self.propagate(wave, flux),
+            range(len(self._parameters))))
+
     def _headsummary(self):
         summary = """\
         class           : {0}
@@ -1621,6 +3334,7 @@ class PropagationEffect(_ModelBase):
 
 class CCM89Dust(PropagationEffect):
     """Cardelli, Clayton, Mathis (1989) extinction model dust."""
+    _multiplicative = True
     _param_names = ['ebv', 'r_v']
     param_names_latex = ['E(B-V)', 'R_V']
     _minwave = 1000.
@@ -1629,14 +3343,28 @@ class CCM89Dust(PropagationEffect):
     def __init__(self):
         self._parameters = np.array([0., 3.1])
 
+    def _unit_curve(self, wave, r_v):
+        return extinction.ccm89(wave, r_v, r_v)
+
     def propagate(self, wave, flux):
         """Propagate the flux."""
         ebv, r_v = self._parameters
-        return extinction.apply(extinction.ccm89(wave, ebv * r_v, r_v), flux)
+        return flux * 10.**(-0.4 * ebv * self._extinction_curve(wave, r_v))
+
+    def _propagate_jacobian(self, wave, flux):
+        # Extinction is proportional to ebv; r_v by finite differences.
+        ebv, r_v = self._parameters
+        jac = np.empty((2,) + np.shape(flux))
+        jac[0] = (-0.4 * log(10.) * self._extinction_curve(wave, r_v) *
+                  self.propagate(wave, flux))
+        jac[1] = _finite_difference_jacobian(
+            self, lambda: self.propagate(wave, flux), [1])[0]
+        return jac
 
 
 class OD94Dust(PropagationEffect):
     """O'Donnell (1994) extinction model dust."""
+    _multiplicative = True
     _param_names = ['ebv', 'r_v']
     param_names_latex = ['E(B-V)', 'R_V']
     _minwave = 909.09
@@ -1645,15 +3373,28 @@ class OD94Dust(PropagationEffect):
     def __init__(self):
         self._parameters = np.array([0., 3.1])
 
+    def _unit_curve(self, wave, r_v):
+        return extinction.odonnell94(wave, r_v, r_v)
+
     def propagate(self, wave, flux):
         """Propagate the flux."""
         ebv, r_v = self._parameters
-        return extinction.apply(extinction.odonnell94(wave, ebv * r_v, r_v),
-                                flux)
+        return flux * 10.**(-0.4 * ebv * self._extinction_curve(wave, r_v))
+
+    def _propagate_jacobian(self, wave, flux):
+        # Extinction is proportional to ebv; r_v by finite differences.
+        ebv, r_v = self._parameters
+        jac = np.empty((2,) + np.shape(flux))
+        jac[0] = (-0.4 * log(10.) * self._extinction_curve(wave, r_v) *
+                  self.propagate(wave, flux))
+        jac[1] = _finite_difference_jacobian(
+            self, lambda: self.propagate(wave, flux), [1])[0]
+        return jac
 
 
 class F99Dust(PropagationEffect):
     """Fitzpatrick (1999) extinction model dust with fixed R_V."""
+    _multiplicative = True
     _minwave = 909.09
     _maxwave = 60000.
 
@@ -1664,7 +3405,16 @@ class F99Dust(PropagationEffect):
         self._r_v = r_v
         self._f = extinction.Fitzpatrick99(r_v=r_v)
 
+    def _unit_curve(self, wave, r_v):
+        return self._f(wave, r_v)
+
     def propagate(self, wave, flux):
         """Propagate the flux."""
         ebv = self._parameters[0]
-        return extinction.apply(self._f(wave, ebv * self._r_v), flux)
+        return flux * 10.**(-0.4 * ebv *
+                            self._extinction_curve(wave, self._r_v))
+
+    def _propagate_jacobian(self, wave, flux):
+        # Extinction is proportional to ebv.
+        return (-0.4 * log(10.) * self._extinction_curve(wave, self._r_v) *
+                self.propagate(wave, flux))[None]
@@ -7,13 +7,15 @@ use spline interpolation; it does bicubic convolution.
 
 
 import numpy as np
+cimport cython
 cimport numpy as np
+from cython.parallel cimport prange
 from cpython.mem cimport PyMem_Malloc, PyMem_Free
 from libc.math cimport fabs
 from libc.string cimport memcpy
 
 
-cdef int find_index_binary(double *values, int n, double x):
+cdef int find_index_binary(double *values, int n, double x) nogil:
     """Find index i in array such that values[i] <= x < values[i+1].
     using binary search.
 
@@ -42,7 +44,8 @@ cdef int find_index_binary(double *values, int n, double x):
 
 
 
-cdef int find_index_unsafe(double *values, int n, double x, int start):
+cdef int find_index_unsafe(double *values, int n, double x,
+                           int start) nogil:
     """Return i such that values[i] <= x < values[i+1] via linear search,
     starting from guess `start`.
 
@@ -83,7 +86,7 @@ DEF B = A + 2.0
 DEF C = A + 3.0
 
 
-cdef double kernval(double xval):
+cdef double kernval(double xval) nogil:
      cdef double x = fabs(xval)
      if x > 2.0:
          return 0.0
@@ -92,6 +95,111 @@ cdef double kernval(double xval):
      return A * (-4.0 + x * (8.0 + x * (-5.0 + x)))
 
 
+cdef double kernderiv(double xval) nogil:
+     """Derivative of kernval."""
+     cdef double x = fabs(xval)
+     cdef double d
+     if x > 2.0:
+         return 0.0
+     if x < 1.0:
+         d = x * (3.0 * B * x - 2.0 * C)
+     else:
+         d = A * (8.0 + x * (-10.0 + 3.0 * x))
+     return d if xval >= 0.0 else -d
+
+
+# Number of threads used to evaluate large interpolations, and the minimum
+# number of evaluated values (surfaces * x * y) for which threads are used.
+cdef int _num_threads = 1
+DEF PARALLEL_MIN_SIZE = 20000
+
+
+def set_num_threads(int n):
+    """Set the number of threads used by `BicubicInterpolator` for large
+    evaluations (default 1).
+
+    Threads split the evaluation over x values; they are only used if the
+    extension was compiled with OpenMP support. The interpolator loops
+    release the GIL in any case, so that evaluations in separate Python
+    threads can run concurrently.
+
+    Parameters
+    ----------
+    n : int
+        Number of threads; must be at least 1.
+    """
+    global _num_threads
+    if n < 1:
+        raise ValueError("number of threads must be at least 1")
+    _num_threads = n
+
+
+def get_num_threads():
+    """Return the number of threads used by `BicubicInterpolator` for
+    large evaluations (see `set_num_threads`)."""
+    return _num_threads
+
+
+cdef inline bint use_threads(Py_ssize_t size) nogil:
+    return _num_threads > 1 and size >= PARALLEL_MIN_SIZE
+
+
+# y values, indicies, kernel weights and flags of a BicubicYPlan.
+# flags: -1 == "skip, return 0", 0 == "linear", 1 == "cubic"
+cdef struct YPlanData:
+    Py_ssize_t n
+    double *y
+    int *iy
+    double *wy
+    int *flag
+
+
+@cython.final
+cdef class BicubicYPlan(object):
+    """Precomputed y indicies and kernel weights of a
+    `BicubicInterpolator` for a fixed array of y values.
+
+    Created by ``BicubicInterpolator.plan_y(y)``. A plan can be passed in
+    place of ``y`` when calling (or integrating) an interpolator, so that
+    only the x axis is computed. It is valid for any interpolator defined
+    on the same y grid; for other interpolators it is recomputed.
+    """
+
+    cdef object interp  # interpolator the plan was created by
+    cdef readonly object y
+    cdef double[::1] yc
+    cdef YPlanData data
+
+    def __cinit__(self, interp, y):
+        cdef Py_ssize_t n
+
+        self.interp = interp
+        self.y = np.ascontiguousarray(np.atleast_1d(y), dtype=np.float64)
+        self.yc = self.y
+        self.data.n = self.yc.shape[0]
+        self.data.y = &self.yc[0] if self.data.n > 0 else NULL
+        n = max(self.data.n, 1)
+        self.data.wy = <double *>PyMem_Malloc(n * 4 * sizeof(double))
+        self.data.iy = <int *>PyMem_Malloc(n * sizeof(int))
+        self.data.flag = <int *>PyMem_Malloc(n * sizeof(int))
+        if not (self.data.wy and self.data.iy and self.data.flag):
+            raise MemoryError()
+
+    def __dealloc__(self):
+        PyMem_Free(self.data.wy)
+        PyMem_Free(self.data.iy)
+        PyMem_Free(self.data.flag)
+
+    def __reduce__(self):
+        return (_plan_y, (self.interp, self.y))
+
+
+def _plan_y(interp, y):
+    """Unpickle a BicubicYPlan"""
+    return interp.plan_y(y)
+
+
+@cython.final
 cdef class BicubicInterpolator(object):
     """Equivalent of Grid2DFunction in snfit software.
 
@@ -103,12 +211,26 @@ cdef class BicubicInterpolator(object):
     W(x) = (a+2)*x**3-(a+3)*x**2+1 for x<=1
     W(x) = a( x**3-5*x**2+8*x-4) for 1<x<2
     W(x) = 0 for x>2
+
+    Calling an instance with ``dx=1`` returns the derivative of the
+    interpolated function with respect to x. In place of the y values, a
+    `BicubicYPlan` (see ``plan_y``) can be given.
+
+    Several surfaces defined on the same grid can be stacked by passing
+    ``z`` with shape ``(nsurfaces, len(x), len(y))``. They are then
+    evaluated together, sharing the index searches and kernel weights,
+    and results have an additional leading axis of length ``nsurfaces``.
+
+    Evaluation releases the GIL, and large evaluations are split over
+    threads (see `set_num_threads`).
     """
 
     cdef double* xval
     cdef double* yval
     cdef double* fval_storage
-    cdef double** fval
+    cdef double** fval  # pointers to rows of all surfaces (nsurf * nx)
+    cdef int nsurf
+    cdef bint stacked
     cdef double xmin
     cdef double xmax
     cdef double ymin
@@ -120,9 +242,10 @@ cdef class BicubicInterpolator(object):
         cdef:
             double[:] xc = np.asarray(x, dtype=np.float64)
             double[:] yc = np.asarray(y, dtype=np.float64)
-            double[:,:] zc = np.asarray(z, dtype=np.float64)
+            double[:, :, :] zc
             int i
             int j
+            int k
 
         if not (is_strictly_ordered(xc) and is_strictly_ordered(yc)):
             raise ValueError("x and y values must be strictly increasing")
@@ -130,6 +253,16 @@ cdef class BicubicInterpolator(object):
         self.nx = xc.shape[0]
         self.ny = yc.shape[0]
 
+        z = np.asarray(z, dtype=np.float64)
+        self.stacked = (z.ndim == 3)
+        if not self.stacked:
+            z = z[None, :, :]
+        if z.ndim != 3 or z.shape[1:] != (self.nx, self.ny):
+            raise ValueError("z must have shape (len(x), len(y)) or "
+                             "(nsurfaces, len(x), len(y))")
+        zc = z
+        self.nsurf = zc.shape[0]
+
         # allocate xval
         self.xval = <double *>PyMem_Malloc(self.nx * sizeof(double))
         if not self.xval:
@@ -151,19 +284,22 @@ cdef class BicubicInterpolator(object):
         self.ymax = self.yval[self.ny - 1]
 
         # copy values array
-        self.fval_storage = <double *>PyMem_Malloc(self.nx * self.ny *
-                                                   sizeof(double))
+        self.fval_storage = <double *>PyMem_Malloc(
+            self.nsurf * self.nx * self.ny * sizeof(double))
         if not self.fval_storage:
             raise MemoryError()
-        for i in range(self.nx):
-            for j in range(self.ny):
-                self.fval_storage[i * self.ny + j] = zc[i, j]
+        for k in range(self.nsurf):
+            for i in range(self.nx):
+                for j in range(self.ny):
+                    self.fval_storage[(k * self.nx + i) * self.ny + j] = (
+                        zc[k, i, j])
 
         # allocate fval: pointers to rows of main array
-        self.fval = <double **>PyMem_Malloc(self.nx * sizeof(double*))
+        self.fval = <double **>PyMem_Malloc(self.nsurf * self.nx *
+                                            sizeof(double*))
         if not self.fval:
             raise MemoryError()
-        for i in range(self.nx):
+        for i in range(self.nsurf * self.nx):
             self.fval[i] = self.fval_storage + i * self.ny
         
     def __dealloc__(self):
@@ -172,46 +308,41 @@ cdef class BicubicInterpolator(object):
         PyMem_Free(self.fval)
         PyMem_Free(self.fval_storage)
 
-    def __call__(self, x, y):
-        cdef:
-            int i,j
-            double[:, :] result_view
-            double[:] xc = np.atleast_1d(np.asarray(x, dtype=np.float64))
-            double[:] yc = np.atleast_1d(np.asarray(y, dtype=np.float64))
-            double x_i, y_j
-            int ix = 0
-            int iy = 0
-            double ax, ay, ay2, dx, dy
-            int nxc = xc.shape[0]
-            int nyc = yc.shape[0]
-            double *wyvec
-            int *iyvec
-            int *yflagvec
-            int xflag
-            double wx[4]
+    cpdef BicubicYPlan plan_y(self, y):
+        """Precompute the y indicies and kernel weights for the given y
+        values.
 
-        # allocate result
-        result = np.empty((nxc, nyc), dtype=np.float64)
-        result_view = result
+        Parameters
+        ----------
+        y : `~numpy.ndarray` (1-d)
+
+        Returns
+        -------
+        plan : BicubicYPlan
+        """
+        cdef:
+            BicubicYPlan plan = BicubicYPlan(self, y)
 
-        # allocate arrays of y indicies and weights
-        # (could use static storage here for small vectors)
-        wyvec = <double *>PyMem_Malloc(nyc * 4 * sizeof(double))
-        iyvec = <int *>PyMem_Malloc(nyc * sizeof(int))
+        with nogil:
+            self._fill_plan(&plan.data)
+        return plan
 
-        # flags: -1 == "skip, return 0", 0 == "linear", 1 == "cubic"
-        yflagvec = <int *>PyMem_Malloc(nyc * sizeof(int))
+    cdef void _fill_plan(self, YPlanData *py) nogil:
+        cdef:
+            Py_ssize_t j
+            int iy = 0
+            int *iyvec = py.iy
+            double *wyvec = py.wy
+            int *yflagvec = py.flag
+            double y_j, dy
 
-        # find initial indicies by binary search, because they could be
+        # find initial index by binary search, because it could be
         # anywhere.
-        if nxc > 0:
-            ix = find_index_binary(self.xval, self.nx, xc[0])
-        if nyc > 0:
-            iy = find_index_binary(self.yval, self.ny, yc[0])
+        if py.n > 0:
+            iy = find_index_binary(self.yval, self.ny, py.y[0])
 
-        # fill above three arrays with y value info
-        for j in range(nyc):
-            y_j = yc[j]
+        for j in range(py.n):
+            y_j = py.y[j]
 
             # if y is out of range, we won't be using the value at all
             if (y_j < self.ymin or y_j > self.ymax):
@@ -237,109 +368,442 @@ cdef class BicubicInterpolator(object):
                     wyvec[4*j+2] = kernval(dy+1.0)
                     wyvec[4*j+3] = kernval(dy+2.0)
 
-        # main loop
-        for i in range(nxc):
-            x_i = xc[i]
+    cdef BicubicYPlan _as_plan(self, y):
+        """Return ``y`` if it is a plan valid for this interpolator, else a
+        new plan for the y values ``y`` (or those of the plan ``y``, if it
+        was made for a different y grid)."""
+        cdef:
+            int i
+            BicubicYPlan plan
+            BicubicInterpolator other
+
+        if not isinstance(y, BicubicYPlan):
+            return self.plan_y(y)
+
+        plan = y
+        if plan.interp is not self:
+            other = plan.interp
+            if other.ny != self.ny:
+                return self.plan_y(plan.y)
+            for i in range(self.ny):
+                if other.yval[i] != self.yval[i]:
+                    return self.plan_y(plan.y)
+        return plan
+
+    cdef inline int _xweights(self, double x_i, int ix, int dx, double *wx,
+                              int *xflag) nogil:
+        """Find the x index (starting the search at ``ix``) and kernel
+        weights (or their derivatives, if ``dx`` is 1) for ``x_i``, and
+        set the flag as for y. Returns the index."""
+        cdef double h, u
+
+        if (x_i < self.xmin or x_i > self.xmax):
+            xflag[0] = -1
+            return ix
+
+        ix = find_index_unsafe(self.xval, self.nx, x_i, ix)
+        if (self.nx < 3 or ix == 0 or ix > (self.nx - 3)):
+            xflag[0] = 0
+        else:
+            # OK to use full cubic interpolation
+            xflag[0] = 1
+
+            # compute weights
+            h = self.xval[ix+1] - self.xval[ix]
+            u = (self.xval[ix] - x_i) / h
+            if dx == 0:
+                wx[0] = kernval(u-1.0)
+                wx[1] = kernval(u)
+                wx[2] = kernval(u+1.0)
+                wx[3] = kernval(u+2.0)
+            else:
+                # d(u)/d(x_i) = -1/h
+                wx[0] = -kernderiv(u-1.0) / h
+                wx[1] = -kernderiv(u) / h
+                wx[2] = -kernderiv(u+1.0) / h
+                wx[3] = -kernderiv(u+2.0) / h
+        return ix
+
+    cdef inline double _row(self, double x_i, int ix, int xflag, double *wx,
+                            int dx, YPlanData *py, int isurf,
+                            double **gval, double scale, double *weights,
+                            double *out) nogil:
+        """Evaluate surface ``isurf`` at x_i and all y values of the plan (given
+        the results of ``_xweights``).
+
+        If ``gval`` is not NULL, the values of the surface ``fval + scale *
+        gval`` are evaluated instead, where ``gval`` is defined on the same
+        grid. If ``out`` is not NULL, the values are stored in it. If
+        ``weights`` is not NULL, the weighted sum of the values is returned.
+        """
+        cdef:
+            Py_ssize_t j
+            int iy, yflag, k
+            double y_j, ax, ay, ay2, h, lx0, lx1, value
+            double total = 0.0
+            double **f = self.fval + isurf * self.nx
+            double wy[4]
+            int *iyvec = py.iy
+            double *wyvec = py.wy
+            int *yflagvec = py.flag
+
+        for j in range(py.n):
+            yflag = yflagvec[j]
+
+            # out-of-bounds: return 0.
+            if xflag == -1 or yflag == -1:
+                value = 0.0
 
-            # precompute some stuff for x
-            if (x_i < self.xmin or x_i > self.xmax):
-                xflag = -1
             else:
-                ix = find_index_unsafe(self.xval, self.nx, x_i, ix)
-                if (self.nx < 3 or ix == 0 or ix > (self.nx - 3)):
-                    xflag = 0
+                iy = iyvec[j]
+                y_j = py.y[j]
+
+                # linear interpolation in *both* dimensions if *either* is
+                # too close to the border. This is how the original code
+                # works, so we mimic it here, even though its dumb.
+                if xflag == 0 or yflag == 0:
+
+                    # If either dimension is 1, just return a close-ish
+                    # value
+                    if self.nx == 1 or self.ny == 1:
+                        if dx == 0:
+                            value = f[ix][iy]
+                            if gval != NULL:
+                                value += scale * gval[ix][iy]
+                        else:
+                            value = 0.0
+                    else:
+                        h = self.xval[ix+1] - self.xval[ix]
+                        if dx == 0:
+                            ax = (x_i - self.xval[ix]) / h
+                            lx0 = 1.0 - ax
+                            lx1 = ax
+                        else:
+                            lx0 = -1.0 / h
+                            lx1 = 1.0 / h
+                        ay = ((y_j - self.yval[iy]) /
+                              (self.yval[iy+1] - self.yval[iy]))
+                        ay2 = 1.0 - ay
+
+                        value = (lx0 * (ay2 * f[ix  ][iy  ] +
+                                        ay  * f[ix  ][iy+1]) +
+                                 lx1 * (ay2 * f[ix+1][iy  ] +
+                                        ay  * f[ix+1][iy+1]))
+                        if gval != NULL:
+                            value += scale * (
+                                lx0 * (ay2 * gval[ix  ][iy  ] +
+                                       ay  * gval[ix  ][iy+1]) +
+                                lx1 * (ay2 * gval[ix+1][iy  ] +
+                                       ay  * gval[ix+1][iy+1]))
+
+                # Full cubic convolution
                 else:
-                    # OK to use full cubic interpolation
-                    xflag = 1
+                    wy[0] = wyvec[4*j+0]
+                    wy[1] = wyvec[4*j+1]
+                    wy[2] = wyvec[4*j+2]
+                    wy[3] = wyvec[4*j+3]
+                    value = 0.0
+                    for k in range(4):
+                        value += wx[k] * (wy[0] * f[ix-1+k][iy-1] +
+                                          wy[1] * f[ix-1+k][iy  ] +
+                                          wy[2] * f[ix-1+k][iy+1] +
+                                          wy[3] * f[ix-1+k][iy+2])
+                    if gval != NULL:
+                        for k in range(4):
+                            value += scale * wx[k] * (
+                                wy[0] * gval[ix-1+k][iy-1] +
+                                wy[1] * gval[ix-1+k][iy  ] +
+                                wy[2] * gval[ix-1+k][iy+1] +
+                                wy[3] * gval[ix-1+k][iy+2])
+
+            if out != NULL:
+                out[j] = value
+            if weights != NULL:
+                total += weights[j] * value
+
+        return total
+
+    cdef inline int _eval_x(self, double x_i, int ix, int dx,
+                            YPlanData *py, double **gval, double scale,
+                            double *weights, double *out,
+                            Py_ssize_t stride) nogil:
+        """Evaluate all surfaces at x_i and the y values of the plan,
+        starting the x index search at ``ix``, and return the index.
+
+        The values of surface k are stored at ``out + k * stride`` (or,
+        if ``weights`` is not NULL, only their weighted sum). See ``_row``
+        for ``gval`` and ``scale``.
+        """
+        cdef:
+            int k, xflag
+            double wx[4]
 
-                    # compute weights
-                    dx = ((self.xval[ix] - x_i) /
-                          (self.xval[ix+1] - self.xval[ix]))
-                    wx[0] = kernval(dx-1.0)
-                    wx[1] = kernval(dx)
-                    wx[2] = kernval(dx+1.0)
-                    wx[3] = kernval(dx+2.0)
+        ix = self._xweights(x_i, ix, dx, wx, &xflag)
+        for k in range(self.nsurf):
+            if weights == NULL:
+                self._row(x_i, ix, xflag, wx, dx, py, k, gval, scale, NULL,
+                          out + k * stride)
+            else:
+                out[k * stride] = self._row(x_i, ix, xflag, wx, dx, py, k,
+                                            gval, scale, weights, NULL)
+        return ix
+
+    cdef void _eval(self, double[:] xc, int dx, YPlanData *py,
+                    double **gval, double scale, double *weights,
+                    double *out, Py_ssize_t rowsize) nogil:
+        """Evaluate all surfaces at all x values; the result for x[i] is
+        stored by ``_eval_x`` at ``out + i * rowsize`` (with a stride of
+        ``len(x) * rowsize`` between surfaces)."""
+        cdef:
+            Py_ssize_t i
+            Py_ssize_t nxc = xc.shape[0]
+            Py_ssize_t stride = nxc * rowsize
+            int ix
+
+        if use_threads(self.nsurf * nxc * py.n):
+            # Each thread finds its x indicies by binary search.
+            for i in prange(nxc, num_threads=_num_threads,
+                            schedule='static'):
+                self._eval_x(xc[i], find_index_binary(self.xval, self.nx,
+                                                      xc[i]),
+                             dx, py, gval, scale, weights, out + i * rowsize,
+                             stride)
+        else:
+            ix = find_index_binary(self.xval, self.nx, xc[0])
+            for i in range(nxc):
+                ix = self._eval_x(xc[i], ix, dx, py, gval, scale, weights,
+                                  out + i * rowsize, stride)
 
-            # innermost loop
-            for j in range(nyc):
-                yflag = yflagvec[j]
+    def __call__(self, x, y, int dx=0):
+        cdef:
+            double[:] xc = np.atleast_1d(np.asarray(x, dtype=np.float64))
+            BicubicYPlan plan = self._as_plan(y)
+            Py_ssize_t nxc = xc.shape[0]
+            Py_ssize_t nyc = plan.data.n
+            double[:, :, ::1] result_view
+            double *out
 
-                # out-of-bounds: return 0.
-                if xflag == -1 or yflag == -1:
-                    result_view[i, j] = 0.0
+        if dx != 0 and dx != 1:
+            raise ValueError("dx must be 0 or 1")
 
-                else:
-                    iy = iyvec[j]
-                    y_j = yc[j]
-                    
-                    # linear interpolation in *both* dimensions if *either* is
-                    # too close to the border. This is how the original code
-                    # works, so we mimic it here, even though its dumb.
-                    if xflag == 0 or yflag == 0:
-
-                        # If either dimension is 1, just return a close-ish
-                        # value
-                        if self.nx == 1 or self.ny == 1:
-                            result_view[i, j] = self.fval[ix][iy]
-                        else:
-                            ax = ((x_i - self.xval[ix]) /
-                                  (self.xval[ix+1] - self.xval[ix]))
-                            ay = ((y_j - self.yval[iy]) /
-                                  (self.yval[iy+1] - self.yval[iy]))
-                            ay2 = 1.0 - ay
-                            
-                            result_view[i, j] = (
-                                (1.0 - ax) * (ay2 * self.fval[ix  ][iy  ] +
-                                              ay  * self.fval[ix  ][iy+1]) +
-                                ax         * (ay2 * self.fval[ix+1][iy  ] +
-                                              ay  * self.fval[ix+1][iy+1]))
-
-                    # Full cubic convolution
-                    else:
-                        result_view[i, j] = (
-                            wx[0] * (wyvec[4*j+0] * self.fval[ix-1][iy-1] +
-                                     wyvec[4*j+1] * self.fval[ix-1][iy  ] +
-                                     wyvec[4*j+2] * self.fval[ix-1][iy+1] +
-                                     wyvec[4*j+3] * self.fval[ix-1][iy+2]) +
-                            wx[1] * (wyvec[4*j+0] * self.fval[ix  ][iy-1] +
-                                     wyvec[4*j+1] * self.fval[ix  ][iy  ] +
-                                     wyvec[4*j+2] * self.fval[ix  ][iy+1] +
-                                     wyvec[4*j+3] * self.fval[ix  ][iy+2]) +
-                            wx[2] * (wyvec[4*j+0] * self.fval[ix+1][iy-1] +
-                                     wyvec[4*j+1] * self.fval[ix+1][iy  ] +
-                                     wyvec[4*j+2] * self.fval[ix+1][iy+1] +
-                                     wyvec[4*j+3] * self.fval[ix+1][iy+2]) +
-                            wx[3] * (wyvec[4*j+0] * self.fval[ix+2][iy-1] +
-                                     wyvec[4*j+1] * self.fval[ix+2][iy  ] +
-                                     wyvec[4*j+2] * self.fval[ix+2][iy+1] +
-                                     wyvec[4*j+3] * self.fval[ix+2][iy+2]))
-
-        PyMem_Free(iyvec)
-        PyMem_Free(wyvec)
-        PyMem_Free(yflagvec)
+        # allocate result
+        result = np.empty((self.nsurf, nxc, nyc), dtype=np.float64)
 
+        if nxc > 0 and nyc > 0:
+            result_view = result
+            out = &result_view[0, 0, 0]
+            with nogil:
+                self._eval(xc, dx, &plan.data, NULL, 0.0, NULL, out, nyc)
+
+        if not self.stacked:
+            return result[0]
         return result
 
+    cdef bint _same_grid(self, BicubicInterpolator other):
+        cdef int i
+        if self.nx != other.nx or self.ny != other.ny:
+            return False
+        for i in range(self.nx):
+            if self.xval[i] != other.xval[i]:
+                return False
+        for i in range(self.ny):
+            if self.yval[i] != other.yval[i]:
+                return False
+        return True
+
+    cdef np.ndarray _integrate(self, x, y, weights,
+                               BicubicInterpolator other, double scale):
+        """Weighted sums over y of the values of the surface (plus
+        ``scale`` times the surface ``other``, which must be on the
+        same grid) at each x."""
+        cdef:
+            double[:] xc = np.atleast_1d(np.asarray(x, dtype=np.float64))
+            BicubicYPlan plan = self._as_plan(y)
+            double[::1] wc = np.ascontiguousarray(np.atleast_1d(weights),
+                                                  dtype=np.float64)
+            double[:, ::1] result_view
+            Py_ssize_t nxc = xc.shape[0]
+            Py_ssize_t nyc = plan.data.n
+            double **gval = NULL
+            double *out
+
+        if wc.shape[0] != nyc:
+            raise ValueError("weights must have the same length as y")
+        if other is not None:
+            gval = other.fval
+
+        result = np.zeros((self.nsurf, nxc), dtype=np.float64)
+
+        if nxc > 0 and nyc > 0:
+            result_view = result
+            out = &result_view[0, 0]
+            with nogil:
+                self._eval(xc, 0, &plan.data, gval, scale, &wc[0], out, 1)
+
+        if not self.stacked:
+            return result[0]
+        return result
+
+    def integrate(self, x, y, weights):
+        """Weighted sum over y of the interpolated values at each x.
+
+        Equivalent to ``np.dot(self(x, y), weights)``, without creating
+        the intermediate 2-d array.
+
+        Parameters
+        ----------
+        x : float or `~numpy.ndarray` (1-d)
+        y : `~numpy.ndarray` (1-d) or BicubicYPlan
+        weights : `~numpy.ndarray` (1-d)
+            Same length as ``y``.
+
+        Returns
+        -------
+        result : `~numpy.ndarray`
+            Same length as ``x`` (with a leading axis for stacked
+            surfaces).
+        """
+        return self._integrate(x, y, weights, None, 0.0)
+
     def __getnewargs__(self):
         """Return arguments to pass to constructor (to support pickling)"""
 
         cdef:
             np.ndarray[np.double_t, ndim=1] x
             np.ndarray[np.double_t, ndim=1] y
-            np.ndarray[np.double_t, ndim=2] z
+            np.ndarray[np.double_t, ndim=3] z
 
         x = np.empty(self.nx, dtype=np.float64)
         y = np.empty(self.ny, dtype=np.float64)
-        z = np.empty((self.nx, self.ny), dtype=np.float64)
+        z = np.empty((self.nsurf, self.nx, self.ny), dtype=np.float64)
 
         memcpy(&x[0], self.xval, self.nx * sizeof(double))
         memcpy(&y[0], self.yval, self.ny * sizeof(double))
-        memcpy(&z[0,0], self.fval_storage, self.nx * self.ny * sizeof(double))
+        memcpy(&z[0,0,0], self.fval_storage,
+               self.nsurf * self.nx * self.ny * sizeof(double))
 
+        if not self.stacked:
+            return x, y, z[0]
         return x, y, z
 
 
-cdef double polyval(double *coeffs, int n, double x):
+def salt2_bandflux(BicubicInterpolator m0, BicubicInterpolator m1,
+                   double x1, phase, wave, weights):
+    """Weighted sum over wavelength of ``M0 + x1 * M1`` at each phase.
+
+    Equivalent to ``np.dot(m0(phase, wave) + x1 * m1(phase, wave),
+    weights)``, but evaluated in a single pass without creating 2-d
+    intermediate arrays. (The color law, amplitude and any propagation
+    effects can be folded into ``weights``.) If ``m0`` and ``m1`` are
+    defined on different grids, they are integrated separately.
+
+    Parameters
+    ----------
+    m0, m1 : BicubicInterpolator
+    x1 : float
+    phase : float or `~numpy.ndarray` (1-d)
+    wave : `~numpy.ndarray` (1-d) or BicubicYPlan
+    weights : `~numpy.ndarray` (1-d)
+        Same length as ``wave``.
+
+    Returns
+    -------
+    result : `~numpy.ndarray` (1-d)
+        Same length as ``phase``.
+    """
+
+    if m0.stacked or m1.stacked:
+        raise ValueError("m0 and m1 must be single surfaces")
+    if m0._same_grid(m1):
+        return m0._integrate(phase, wave, weights, m1, x1)
+    return (m0._integrate(phase, wave, weights, None, 0.0) +
+            x1 * m1._integrate(phase, wave, weights, None, 0.0))
+
+
+def bilinear_interp(x, y, z, xq, yq):
+    """Bilinear interpolation of gridded values, zero outside the grid.
+
+    Equivalent to ``RegularGridInterpolator((x, y), z, bounds_error=False,
+    fill_value=0.)`` from scipy, evaluated on the outer product of ``xq``
+    and ``yq``, but without creating the array of points.
+
+    Parameters
+    ----------
+    x, y : `~numpy.ndarray` (1-d)
+        Grid coordinates; strictly increasing, at least two values each.
+    z : `~numpy.ndarray` (2-d)
+        Values, shape ``(len(x), len(y))``.
+    xq, yq : float or `~numpy.ndarray` (1-d)
+        Evaluation coordinates, in any order.
+
+    Returns
+    -------
+    result : `~numpy.ndarray` (2-d)
+        Shape ``(len(xq), len(yq))``.
+    """
+    cdef:
+        double[::1] xc = np.ascontiguousarray(x, dtype=np.float64)
+        double[::1] yc = np.ascontiguousarray(y, dtype=np.float64)
+        double[:, ::1] zc = np.ascontiguousarray(z, dtype=np.float64)
+        double[::1] xqc = np.ascontiguousarray(np.atleast_1d(xq),
+                                               dtype=np.float64)
+        double[::1] yqc = np.ascontiguousarray(np.atleast_1d(yq),
+                                               dtype=np.float64)
+        int nx = xc.shape[0]
+        int ny = yc.shape[0]
+        Py_ssize_t nxq = xqc.shape[0]
+        Py_ssize_t nyq = yqc.shape[0]
+        int[::1] iy
+        double[::1] uy
+        double[:, ::1] out
+        Py_ssize_t i, j
+        int ix, jy
+        double u, v
+
+    if nx < 2 or ny < 2:
+        raise ValueError("x and y must have at least two values")
+    if zc.shape[0] != nx or zc.shape[1] != ny:
+        raise ValueError("z must have shape (len(x), len(y))")
+
+    result = np.zeros((nxq, nyq), dtype=np.float64)
+    if nxq == 0 or nyq == 0:
+        return result
+    out = result
+    iy = np.empty(nyq, dtype=np.intc)
+    uy = np.empty(nyq, dtype=np.float64)
+
+    with nogil:
+        # y indicies and weights, shared by all x. -1 flags values outside
+        # the grid (the comparisons also exclude NaN).
+        jy = 0
+        for j in range(nyq):
+            if yc[0] <= yqc[j] <= yc[ny-1]:
+                jy = find_index_unsafe(&yc[0], ny, yqc[j], jy)
+                iy[j] = jy
+                uy[j] = (yqc[j] - yc[jy]) / (yc[jy+1] - yc[jy])
+            else:
+                iy[j] = -1
+
+        ix = 0
+        for i in range(nxq):
+            if not (xc[0] <= xqc[i] <= xc[nx-1]):
+                continue
+            ix = find_index_unsafe(&xc[0], nx, xqc[i], ix)
+            u = (xqc[i] - xc[ix]) / (xc[ix+1] - xc[ix])
+            for j in range(nyq):
+                jy = iy[j]
+                if jy < 0:
+                    continue
+                v = uy[j]
+                out[i, j] = ((1.0 - u) * ((1.0 - v) * zc[ix, jy] +
+                                          v * zc[ix, jy+1]) +
+                             u * ((1.0 - v) * zc[ix+1, jy] +
+                                  v * zc[ix+1, jy+1]))
+
+    return result
+
+
+cdef double polyval(double *coeffs, int n, double x) nogil:
     "coeffs[0]*x + coeffs[1]*x^2 + ... + coeffs[n-1]*x^ncoeffs"""
 
     cdef double out = 0.0
@@ -438,30 +902,32 @@ cdef class SALT2ColorLaw(object):
     def __call__(self, double[:] wave):
         cdef:
             double l
-            int i, n
-            np.ndarray[np.float64_t, ndim=1] out
+            Py_ssize_t i, n
+            double[::1] out
 
         n = wave.shape[0]
-        out = np.empty(n, dtype=np.float64)
+        result = np.empty(n, dtype=np.float64)
+        out = result
 
-        for i in range(n):
-            l = (wave[i] - SALT2CL_B) / SALT2CL_V_MINUS_B
+        with nogil:
+            for i in range(n):
+                l = (wave[i] - SALT2CL_B) / SALT2CL_V_MINUS_B
 
-            # Blue side
-            if l < self.l_lo:
-                out[i] = self.p_lo + self.pprime_lo * (l - self.l_lo)
+                # Blue side
+                if l < self.l_lo:
+                    out[i] = self.p_lo + self.pprime_lo * (l - self.l_lo)
 
-            # in between
-            elif l <= self.l_hi:
-                out[i] = polyval(self.coeffs, self.ncoeffs, l)
+                # in between
+                elif l <= self.l_hi:
+                    out[i] = polyval(self.coeffs, self.ncoeffs, l)
 
-            # red side
-            else:
-                out[i] = self.p_hi + self.pprime_hi * (l - self.l_hi)
+                # red side
+                else:
+                    out[i] = self.p_hi + self.pprime_hi * (l - self.l_hi)
 
-            out[i] = -out[i]
+                out[i] = -out[i]
 
-        return out
+        return result
 
     def __getnewargs__(self):
         """Return arguments to pass to constructor (to support pickling)."""
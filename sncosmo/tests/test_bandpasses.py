@@ -112,3 +112,23 @@ def test_megacampsf_bandpass():
             for i in range(len(trans)):
                 print(trans_ref[i], trans[i])
             assert_allclose(trans, trans_ref, rtol=1e-5)
+
+
+def test_shifted_view():
+    band = Bandpass([4000., 4200., 4400., 4600.], [0.5, 1.0, 0.8, 0.1])
+    view = band._shifted_view(0.8)
+    assert band._shifted_view(0.8) is view
+    assert view.trans is band.trans
+
+    ref = band.shifted(0.8)
+    assert_allclose(view.wave, ref.wave)
+    assert view.minwave() == ref.minwave()
+    assert view.maxwave() == ref.maxwave()
+    wave = np.linspace(3000., 4000., 21)
+    assert_allclose(view(wave), ref(wave), rtol=1e-14)
+    assert_allclose(view.wave_eff, ref.wave_eff, rtol=1e-14)
+
+    # the cache is bounded
+    for i in range(100):
+        band._shifted_view(1. / (1. + 0.01 * i))
+    assert len(band._shifted_views) == sncosmo.bandpasses._MAX_SHIFTED_VIEWS
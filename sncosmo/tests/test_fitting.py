@@ -2,6 +2,8 @@
 from __future__ import print_function
 
 from os.path import dirname, join
+import copy
+import pickle
 
 import pytest
 import numpy as np
@@ -12,6 +14,8 @@ from astropy.tests.helper import remote_data
 
 import sncosmo
 
+from .test_models import salt2source
+
 try:
     import iminuit
     HAS_IMINUIT = True
@@ -83,6 +87,84 @@ class TestFitting:
         with pytest.raises(ValueError):
             res, fitmodel = sncosmo.fit_lc(self.data, self.model, [])
 
+    @pytest.mark.skipif('not HAS_IMINUIT')
+    def test_fit_lc_many(self):
+        """Batch fits match individual fits, in order, in serial and in
+        parallel, with failed fits recorded."""
+
+        vparam_names = ['amplitude', 'z', 't0']
+        res, _ = sncosmo.fit_lc(self.data, self.model, vparam_names,
+                                bounds={'z': (0., 1.0)})
+        datasets = [self.data, {'time': self.data['time']}, self.data]
+
+        for n_workers in (1, 2):
+            results = sncosmo.fit_lc_many(datasets, self.model, vparam_names,
+                                          bounds={'z': (0., 1.0)},
+                                          n_workers=n_workers)
+            assert len(results) == 3
+            assert list(results['error'][[0, 2]]) == ['', '']
+            assert results['error'][1].startswith('ValueError')
+            assert results['success'][1] == 0
+            for i in (0, 2):
+                assert_allclose([results[n][i] for n in res.param_names],
+                                res.parameters)
+                assert results['chisq'][i] == res.chisq
+
+    @pytest.mark.skipif('not HAS_IMINUIT')
+    def test_fit_lc_profile_amplitude(self):
+        """Profiling the amplitude analytically gives the same fit and
+        uncertainties."""
+
+        vparam_names = ['amplitude', 'z', 't0']
+        res, _ = sncosmo.fit_lc(self.data, self.model, vparam_names,
+                                bounds={'z': (0., 1.0)})
+        res2, _ = sncosmo.fit_lc(self.data, self.model, vparam_names,
+                                 bounds={'z': (0., 1.0)},
+                                 profile_amplitude=True)
+
+        assert res2.vparam_names == res.vparam_names
+        assert_allclose(res2.parameters, res.parameters, rtol=1.e-4)
+        assert_allclose(res2.chisq, res.chisq, atol=1.e-3)
+        assert list(res2.errors) == res2.vparam_names
+        assert_allclose(list(res2.errors.values()),
+                        list(res.errors.values()), rtol=0.02)
+
+    @pytest.mark.skipif('not HAS_IMINUIT')
+    def test_scan_z(self):
+        """Profile chi^2 is minimal at the true redshift and matches fits
+        at fixed redshift, in serial and in parallel."""
+
+        vparam_names = ['t0', 'amplitude']
+        z_grid = [0.3, 0.1, 0.2, 0.15, 0.25]
+        expected = []
+        for z in z_grid:
+            model = copy.copy(self.model)
+            model.set(z=z)
+            res, _ = sncosmo.fit_lc(self.data, model, vparam_names,
+                                    warn=False)
+            expected.append(res.chisq)
+
+        for n_workers in (1, 2):
+            results = sncosmo.scan_z(self.data, self.model, z_grid,
+                                     vparam_names, n_workers=n_workers)
+            assert_allclose(results['z'], z_grid)
+            assert np.all(results['success'] == 1)
+            assert_allclose(results['chisq'], expected, rtol=1.e-3,
+                            atol=1.e-3)
+            assert np.argmin(results['chisq']) == 2
+            assert_allclose(results['t0'][2], self.params['t0'], rtol=1.e-6)
+
+        # no data are covered by the model at z=10: the fit fails, but its
+        # redshift is recorded.
+        results = sncosmo.scan_z(self.data, self.model, [0.2, 10.],
+                                 vparam_names)
+        assert list(results['success']) == [1, 0]
+        assert results['error'][1] != ''
+        assert_allclose(results['z'], [0.2, 10.])
+
+        with pytest.raises(ValueError):
+            sncosmo.scan_z(self.data, self.model, z_grid, ['z', 't0'])
+
     @pytest.mark.skipif('not HAS_NESTLE')
     def test_nest_lc(self):
         """Ensure that nested sampling runs.
@@ -102,6 +184,254 @@ class TestFitting:
 
         assert_allclose(fitmodel.parameters, self.model.parameters, rtol=0.05)
 
+    @pytest.mark.skipif('not HAS_NESTLE')
+    def test_nest_lc_marginalize_amplitude(self):
+        """Nested sampling with the amplitude marginalized analytically
+        recovers all parameters."""
+
+        self.model.set(**self.params)
+
+        res, fitmodel = sncosmo.nest_lc(
+            self.data, self.model, ['amplitude', 'z', 't0'],
+            bounds={'z': (0., 1.0)}, guess_amplitude_bound=True, npoints=50,
+            rstate=RandomState(0), marginalize_amplitude=True)
+
+        assert res.samples.shape == (len(res.weights), 3)
+        assert_allclose(fitmodel.parameters, self.model.parameters, rtol=0.05)
+
+    @pytest.mark.skipif('not HAS_NESTLE')
+    def test_nest_lc_batch(self):
+        """Nested sampling with batched likelihood evaluation is
+        reproducible and agrees with nestle."""
+
+        self.model.set(**self.params)
+        kwargs = dict(bounds={'z': (0., 1.0)}, guess_amplitude_bound=True,
+                      npoints=50)
+        vparam_names = ['amplitude', 'z', 't0']
+
+        res0, _ = sncosmo.nest_lc(self.data, self.model, vparam_names,
+                                  rstate=RandomState(0), **kwargs)
+        res1, fitmodel = sncosmo.nest_lc(self.data, self.model, vparam_names,
+                                         rstate=RandomState(0), batch_size=8,
+                                         **kwargs)
+        res2, _ = sncosmo.nest_lc(self.data, self.model, vparam_names,
+                                  rstate=RandomState(0), batch_size=8,
+                                  **kwargs)
+
+        assert_allclose(res1.samples, res2.samples)
+        assert res1.logz == res2.logz
+
+        # batches smaller than the number of workers; results do not
+        # depend on the number of workers.
+        res3, _ = sncosmo.nest_lc(self.data, self.model, vparam_names,
+                                  rstate=RandomState(0), batch_size=2,
+                                  **kwargs)
+        res4, _ = sncosmo.nest_lc(self.data, self.model, vparam_names,
+                                  rstate=RandomState(0), batch_size=2,
+                                  n_workers=3, **kwargs)
+        assert_allclose(res3.samples, res4.samples)
+        with pytest.raises(ValueError):
+            sncosmo.nest_lc(self.data, self.model, vparam_names,
+                            batch_size=0, **kwargs)
+
+        res5, _ = sncosmo.nest_lc(self.data, self.model, vparam_names,
+                                  rstate=RandomState(0), batch_size=8,
+                                  maxiter=20, **kwargs)
+        assert res5.niter == 20
+        assert len(res5.samples) == 20 + kwargs['npoints']
+        assert abs(res1.logz - res0.logz) < 3. * max(res0.logzerr,
+                                                     res1.logzerr)
+        assert_allclose(fitmodel.parameters, self.model.parameters, rtol=0.05)
+
+
+def stretch_model_and_data():
+    """A StretchSource model with a Gaussian light curve and noisy,
+    unsorted data generated from it."""
+
+    phase = np.linspace(-20., 60., 41)
+    wave = np.linspace(3000., 9000., 61)
+    flux = np.exp(-0.5 * ((phase[:, None] - 2.) / 8.)**2) * np.ones_like(wave)
+    model = sncosmo.Model(source=sncosmo.StretchSource(phase, wave, flux))
+    model.set(z=0.1, t0=100., amplitude=2.)
+
+    rng = RandomState(0)
+    times = rng.uniform(80., 140., 20)
+    bands = np.array(['bessellb', 'bessellv'])[np.arange(20) % 2]
+    fluxes = model.bandflux(bands, times, zp=25., zpsys='ab')
+    fluxerr = 0.05 * np.max(fluxes) * np.ones(20)
+    data = Table({'time': times, 'band': bands,
+                  'flux': fluxes + fluxerr * rng.normal(size=20),
+                  'fluxerr': fluxerr, 'zp': 25. * np.ones(20),
+                  'zpsys': 20 * ['ab']})
+    return model, data
+
+
+def test_light_curve_likelihood():
+    """LightCurveLikelihood agrees with chisq(), with and without data
+    covariance, for unsorted data."""
+
+    model, data = stretch_model_and_data()
+    a = RandomState(1).normal(size=(20, 20))
+    cov = (np.diag(np.asarray(data['fluxerr'])**2) +
+           1.e-4 * np.max(data['flux'])**2 * np.dot(a, a.T))
+    data_cov = data.copy()
+    data_cov['fluxcov'] = cov
+
+    vparam_names = ['t0', 'amplitude', 's']
+    samples = np.array([[100., 2., 1.], [99., 1.8, 1.1], [102., 2.2, 0.9]])
+    for d in (data, data_cov):
+        like = sncosmo.LightCurveLikelihood(d, model, vparam_names)
+        expected = []
+        for p in samples:
+            loglike = like.loglike(p)
+            assert_allclose(model.parameters[1:], p)
+            expected.append(-0.5 * sncosmo.chisq(d, model))
+            assert_allclose(loglike, expected[-1])
+        assert_allclose(like.loglike_batch(samples), expected)
+
+
+def test_light_curve_likelihood_amplitude():
+    """Likelihoods with the amplitude profiled or marginalized agree with
+    the likelihood maximized or integrated over amplitude numerically."""
+
+    model, data = stretch_model_and_data()
+    full = sncosmo.LightCurveLikelihood(data, model, ['t0', 'amplitude', 's'])
+    profile = sncosmo.LightCurveLikelihood(data, model, ['t0', 's'],
+                                           amplitude='profile')
+    marginal = sncosmo.LightCurveLikelihood(data, model, ['t0', 's'],
+                                            amplitude='marginalize',
+                                            amplitude_bounds=(1., 3.))
+
+    samples = np.array([[100., 1.], [99., 1.1], [102., 0.9]])
+    amplitudes = np.linspace(1., 3., 2001)
+    for t0, s in samples:
+        loglike = np.array([full.loglike([t0, a, s]) for a in amplitudes])
+        logl = profile.loglike([t0, s])
+        assert_allclose(logl, full.loglike([t0, model['amplitude'], s]))
+        assert logl >= np.max(loglike) - 1.e-8
+        assert_allclose(logl, -0.5 * sncosmo.chisq(data, model,
+                                                   profile_amplitude=True))
+
+        expected = logl + np.log(np.trapz(np.exp(loglike - logl),
+                                          amplitudes) / 2.)
+        assert_allclose(marginal.loglike([t0, s]), expected, atol=1.e-4)
+
+    for like in (profile, marginal):
+        assert_allclose(like.loglike_batch(samples),
+                        [like.loglike(p) for p in samples])
+
+    draws = marginal.sample_amplitude(np.tile(samples[0], (100, 1)),
+                                      rstate=RandomState(0))
+    assert np.all((draws >= 1.) & (draws <= 3.))
+
+    with pytest.raises(ValueError):
+        sncosmo.LightCurveLikelihood(data, model, ['t0', 'amplitude'],
+                                     amplitude='profile')
+
+
+def test_light_curve_likelihood_pickle_modelcov():
+    """An unpickled likelihood with model covariance (as sent to worker
+    processes) gives the same values."""
+
+    model = sncosmo.Model(source=salt2source())
+    model.set(z=0.1, t0=0., x0=1.e-5, x1=0.5, c=0.1)
+    bands = 5 * ['bessellb', 'bessellv', 'bessellr']
+    times = np.linspace(-10., 40., len(bands))
+    flux = model.bandflux(bands, times, zp=25., zpsys='ab')
+    data = Table({'time': times, 'band': bands,
+                  'flux': flux * (1. + 0.1 * np.sin(times)),
+                  'fluxerr': 0.05 * flux + 0.01, 'zp': len(bands) * [25.],
+                  'zpsys': len(bands) * ['ab']})
+
+    like = sncosmo.LightCurveLikelihood(data, model, ['t0', 'x0', 'x1', 'c'],
+                                        modelcov=True)
+    samples = np.array([[0., 1.e-5, 0.5, 0.1], [1., 1.2e-5, 0., 0.]])
+    expected = like.loglike_batch(samples)
+    unpickled = pickle.loads(pickle.dumps(like))
+    assert_allclose(unpickled.loglike_batch(samples), expected)
+
+
+def test_mcmc_posterior_batch():
+    """Batched posterior of mcmc_lc matches the per-walker posterior."""
+
+    from sncosmo.fitting import _MCMCPosterior
+
+    model, data = stretch_model_and_data()
+    like = sncosmo.LightCurveLikelihood(data, model, ['t0', 'amplitude', 's'])
+    samples = np.array([[100., 2., 1.], [110., 2., 1.], [99., 1.8, 1.1]])
+
+    posterior = _MCMCPosterior(like, [(0, 95., 105.)],
+                               [(2, lambda s: np.exp(-0.5 * (s - 1.)**2))])
+    result = posterior.batch(samples)
+    assert result[1] == -np.inf
+    assert_allclose(result, [posterior(p) for p in samples])
+
+    # can be sent to worker processes
+    unpickled = pickle.loads(pickle.dumps(like))
+    assert_allclose(unpickled.loglike(samples[0]), like.loglike(samples[0]))
+
+
+def test_guess_t0_and_amplitude_cache():
+    """Template peaks are reused for models differing in t0 and amplitude
+    only."""
+
+    from sncosmo.fitting import guess_t0_and_amplitude, _TEMPLATE_PEAKS
+    from sncosmo.photdata import photometric_data
+
+    phase = np.linspace(-20., 60., 41)
+    wave = np.linspace(3000., 9000., 61)
+    flux = np.exp(-0.5 * ((phase[:, None] - 2.) / 8.)**2) * np.ones_like(wave)
+    model = sncosmo.Model(source=sncosmo.StretchSource(phase, wave, flux))
+    model.set(z=0.1, t0=100., amplitude=2.)
+
+    times = np.arange(80., 140., 1.)
+    bands = np.array(['bessellb', 'bessellv'])[np.arange(len(times)) % 2]
+    fluxes = model.bandflux(bands, times, zp=25., zpsys='ab')
+    data = photometric_data(Table({'time': times, 'band': bands,
+                                   'flux': fluxes,
+                                   'fluxerr': (0.01 * np.max(fluxes) *
+                                               np.ones(len(times))),
+                                   'zp': 25. * np.ones(len(times)),
+                                   'zpsys': len(times) * ['ab']}))
+
+    model.set(t0=0., amplitude=1.)
+    t0, amplitude = guess_t0_and_amplitude(data, model, 5.)
+    assert abs(t0 - 100.) < 1.5
+    assert_allclose(amplitude, 2., rtol=0.02)
+
+    ncached = len(_TEMPLATE_PEAKS)
+    model2 = sncosmo.Model(source=model.source)
+    model2.set(z=0.1, t0=50., amplitude=3.)
+    assert guess_t0_and_amplitude(data, model2, 5.) == (t0, amplitude)
+    assert len(_TEMPLATE_PEAKS) == ncached
+
+    # a different stretch is a different template
+    model2.set(s=1.2)
+    guess_t0_and_amplitude(data, model2, 5.)
+    assert len(_TEMPLATE_PEAKS) == ncached + 2
+
+
+@remote_data
+def test_chisq_modelcov():
+    """chisq with structured model covariance matches the dense
+    calculation."""
+
+    model = sncosmo.Model(source='salt2')
+    model.set(z=0.3, t0=55000., x0=1.e-5, x1=0.5, c=0.1)
+    bands = 5 * ['sdssg', 'sdssr', 'sdssi']
+    times = 55000. + np.linspace(-10., 40., len(bands))
+    flux = model.bandflux(bands, times, zp=25., zpsys='ab')
+    data = Table({'time': times, 'band': bands,
+                  'flux': flux * (1. + 0.1 * np.sin(times)),
+                  'fluxerr': 0.05 * flux + 0.01, 'zp': len(bands) * [25.],
+                  'zpsys': len(bands) * ['ab']})
+
+    mflux, mcov = model.bandfluxcov(bands, times, zp=25., zpsys='ab')
+    diff = data['flux'] - mflux
+    cov = np.diag(data['fluxerr']**2) + mcov
+    expected = np.dot(np.dot(diff, np.linalg.pinv(cov)), diff)
+    assert_allclose(sncosmo.chisq(data, model, modelcov=True), expected)
+
 
 @remote_data
 @pytest.mark.skipif('not HAS_IMINUIT')
@@ -75,3 +75,36 @@ def test_compositemagsystem_band_error():
     csp = sncosmo.get_magsystem('csp')
     with pytest.raises(ValueError):
         csp.zpbandflux('desi')
+
+
+def test_zpbandflux_cache(tmpdir):
+    """Zeropoints are cached by transmission, in a bounded cache, and
+    optionally on disk."""
+
+    magsys = sncosmo.ABMagSystem()
+    bands = [sncosmo.Bandpass([4000., 4200. + i, 4400.], [0.5, 1.0, 0.5])
+             for i in range(5)]
+    expected = [magsys._refspectrum_bandflux(b) for b in bands]
+
+    # A band with the same transmission shares the cache entry.
+    copy = sncosmo.Bandpass(bands[0].wave, bands[0].trans)
+    assert magsys.zpbandflux(bands[0]) == expected[0]
+    assert magsys.zpbandflux(copy) == expected[0]
+    assert len(magsys._zpbandflux) == 1
+
+    with sncosmo.conf.set_temp('zpbandflux_cache_size', 3):
+        for b in bands:
+            magsys.zpbandflux(b)
+        assert list(magsys._zpbandflux) == [b._content_hash()
+                                            for b in bands[2:]]
+
+    cachedir = str(tmpdir.join('zp'))
+    with sncosmo.conf.set_temp('zpbandflux_cache_dir', cachedir):
+        magsys = sncosmo.ABMagSystem()
+        assert magsys.zpbandflux(bands[1]) == expected[1]
+        assert len(tmpdir.join('zp').listdir()) == 1
+
+        # a new instance (e.g., in another process) reads the stored value
+        magsys = sncosmo.ABMagSystem()
+        magsys._refspectrum_bandflux = None
+        assert magsys.zpbandflux(bands[1]) == expected[1]
@@ -1,8 +1,12 @@
 # Licensed under a 3-clause BSD style license - see LICENSES
 
+from copy import copy
+import pickle
+
 import numpy as np
 from numpy.testing import assert_allclose, assert_approx_equal
 from astropy.extern import six
+import pytest
 
 import sncosmo
 from sncosmo import registry
@@ -17,6 +21,47 @@ def flatsource():
     return sncosmo.TimeSeriesSource(phase, wave, flux)
 
 
+def gaussiansource():
+    """Create and return a StretchSource with a Gaussian light curve
+    peaking at phase 2 (for unit stretch)."""
+
+    phase = np.linspace(-20., 60., 41)
+    wave = np.linspace(3000., 9000., 61)
+    flux = (np.exp(-0.5 * ((phase[:, None] - 2.) / 8.)**2) *
+            (1. + 0.1 * np.sin(wave / 1000.)))
+    return sncosmo.StretchSource(phase, wave, flux)
+
+
+def salt2source(m1scale=0.1):
+    """Create and return a SALT2Source with smoothly varying synthetic
+    model components."""
+
+    phase = np.linspace(-20., 50., 36)
+    wave = np.linspace(2000., 10000., 161)
+    m0 = 1. + np.exp(-0.5 * (phase[:, None] / 15.)**2) * np.ones_like(wave)
+    m1 = m1scale * np.sin(phase / 10.)[:, None] * np.cos(wave / 1000.)
+    values = [m0, m1] + 4 * [0.01 * np.ones((len(phase), len(wave)))]
+
+    files = []
+    for vals in values:
+        f = six.StringIO()
+        sncosmo.write_griddata_ascii(phase, wave, vals, f)
+        f.seek(0)
+        files.append(f)
+
+    clfile = six.StringIO("4 -0.504294 0.787691 -0.461715 0.0815619\n"
+                          "Salt2ExtinctionLaw.version 1\n"
+                          "Salt2ExtinctionLaw.min_lambda 2800\n"
+                          "Salt2ExtinctionLaw.max_lambda 7000\n")
+    cdfile = six.StringIO("\n".join("{0:f} 0.1".format(w) for w in wave))
+
+    source = sncosmo.SALT2Source(m0file=files[0], m1file=files[1],
+                                 lcrv00file=files[2], lcrv11file=files[3],
+                                 lcrv01file=files[4], errscalefile=files[5],
+                                 clfile=clfile, cdfile=cdfile)
+    return source
+
+
 class StepEffect(sncosmo.PropagationEffect):
     """Effect with transmission 0 below cutoff wavelength, 1 above.
     Useful for testing behavior with redshift."""
@@ -69,6 +114,22 @@ class TestTimeSeriesSource:
                              zpsys="ab")
 
 
+def test_integration_plan():
+    """Integration plans are cached per bandpass and spacing, and give the
+    same result as direct integration."""
+
+    band = sncosmo.get_bandpass('bessellb')
+    plan = sncosmo.models._integration_plan(band)
+    assert sncosmo.models._integration_plan(band) is plan
+    assert sncosmo.models._integration_plan(band, 1.0) is not plan
+
+    wave, dwave = sncosmo.utils.integration_grid(band.minwave(),
+                                                 band.maxwave(), 5.0)
+    assert_allclose(plan.wave, wave)
+    assert_allclose(plan.weights,
+                    wave * band(wave) * dwave / sncosmo.models.HC_ERG_AA)
+
+
 class TestSALT2Source:
     def setup_class(self):
         """Create a SALT2 model with a lot of components set to 1."""
@@ -188,6 +249,12 @@ class TestModel:
         self.model.set_source_peakabsmag(-19.3, 'bessellb', 'ab')
         self.model.set_source_peakabsmag(-19.3, band, 'ab')
 
+        # getter and setter use the same distance modulus
+        self.model.set(z=0.37)
+        self.model.set_source_peakabsmag(-19.3, 'bessellb', 'ab')
+        assert_allclose(self.model.source_peakabsmag('bessellb', 'ab'),
+                        -19.3, rtol=0., atol=1.e-10)
+
     def test_str(self):
         """Test if string summary works at all."""
         str(self.model)
@@ -210,6 +277,28 @@ class TestModel:
         assert self.model['amplitude'] == 4 * a
 
 
+def test_model_pickle():
+    """Parameters of an unpickled model still reach its source and
+    effects."""
+
+    model = sncosmo.Model(source=flatsource(),
+                          effects=[sncosmo.CCM89Dust()],
+                          effect_frames=['obs'],
+                          effect_names=['mw'])
+    model.set(z=0.1, amplitude=2., mwebv=0.1)
+    model2 = pickle.loads(pickle.dumps(model))
+    assert_allclose(model2.parameters, model.parameters)
+    assert_allclose(model2.bandflux('bessellb', 0.),
+                    model.bandflux('bessellb', 0.))
+
+    model.set(amplitude=3., mwebv=0.2)
+    model2.set(amplitude=3., mwebv=0.2)
+    assert model2.source['amplitude'] == 3.
+    assert model2.effects[0]['ebv'] == 0.2
+    assert_allclose(model2.bandflux('bessellb', 0.),
+                    model.bandflux('bessellb', 0.))
+
+
 def test_effect_frame_free():
     """Test Model with PropagationEffect with a 'free' frame."""
 
@@ -224,3 +313,479 @@ def test_effect_frame_free():
 
     wave = np.array([12000., 13000., 14000., 14999., 15000., 16000.])
     assert_allclose(model.flux(0., wave), [0., 0., 0., 0., 0.5, 0.5])
+
+
+class OffsetEffect(sncosmo.PropagationEffect):
+    """Effect that adds a constant to the flux (not a transmission)."""
+
+    _param_names = ['offset']
+    param_names_latex = ['f_0']
+
+    def __init__(self):
+        self._minwave = 800.
+        self._maxwave = 20000.
+        self._parameters = np.array([1.])
+
+    def propagate(self, wave, flux):
+        return flux + self._parameters[0]
+
+
+def test_effect_not_multiplicative():
+    """Band fluxes of models with effects that are not transmissions are
+    integrated from the propagated flux."""
+
+    model = sncosmo.Model(source=flatsource(), effects=[OffsetEffect()],
+                          effect_frames=['rest'], effect_names=['host'])
+    model.set(z=0.1, amplitude=5.)
+    bands = np.array(['bessellb', 'bessellv'])
+    times = np.array([0., 10.])
+
+    expected = []
+    for b, t in zip(bands, times):
+        plan = sncosmo.models._integration_plan(sncosmo.get_bandpass(b))
+        expected.append(np.dot(model.flux(t, plan.wave), plan.weights))
+    assert_allclose(model.bandflux(bands, times), expected, rtol=1.e-12)
+
+    parameters = np.tile(model.parameters, (3, 1))
+    parameters[:, 0] = [0.1, 0.2, 0.1]  # z
+    parameters[:, -1] = [1., 1., 3.]  # hostoffset
+    result = model.bandflux_batch(parameters, bands, times)
+    for i in range(len(parameters)):
+        model.parameters = parameters[i]
+        assert_allclose(result[i], model.bandflux(bands, times),
+                        rtol=1.e-12)
+
+    jac = model.bandflux_jacobian(bands, times)
+    p0 = model.parameters.copy()
+    for i in range(len(p0)):
+        h = 1.e-5 * max(abs(p0[i]), 1.e-3)
+        p = p0.copy()
+        p[i] = p0[i] + h
+        model.parameters = p
+        fplus = model.bandflux(bands, times)
+        p[i] = p0[i] - h
+        model.parameters = p
+        fminus = model.bandflux(bands, times)
+        model.parameters = p0
+        assert_allclose(jac[:, i], (fplus - fminus) / (2. * h),
+                        rtol=1.e-6, atol=1.e-8 * np.max(np.abs(jac)))
+
+
+def test_bandflux_batch():
+    """Model.bandflux_batch matches Model.bandflux evaluated for each
+    parameter set in turn."""
+
+    bands = np.array(['bessellb', 'bessellv', 'bessellr', 'bessellb'])
+    times = np.array([-5., 0., 10., 20.])
+
+    for source in (flatsource(), salt2source()):
+        model = sncosmo.Model(source=source, effects=[sncosmo.CCM89Dust()],
+                              effect_frames=['obs'], effect_names=['mw'])
+        rng = np.random.RandomState(0)
+        parameters = np.tile(model.parameters, (6, 1))
+        parameters[:, 0] = [0.05, 0.05, 0.1, 0.1, 0.2, 0.05]  # z
+        parameters[:, 1] = rng.uniform(-5., 5., 6)  # t0
+        parameters[:, 2] = rng.uniform(0.5, 2., 6)  # amplitude
+        if len(source.parameters) == 3:
+            parameters[:, 3] = rng.uniform(-1., 1., 6)  # x1
+            parameters[:, 4] = rng.uniform(-0.2, 0.2, 6)  # c
+        parameters[:, -2] = [0., 0., 0.1, 0.1, 0., 0.2]  # mwebv
+        saved = model.parameters.copy()
+
+        result = model.bandflux_batch(parameters, bands, times, zp=25.,
+                                      zpsys='ab')
+        assert result.shape == (6, 4)
+        assert_allclose(model.parameters, saved)
+
+        for i in range(len(parameters)):
+            model.parameters = parameters[i]
+            expected = model.bandflux(bands, times, zp=25., zpsys='ab')
+            assert_allclose(result[i], expected, rtol=1.e-12)
+
+        # scalar band and time
+        assert model.bandflux_batch(parameters, 'bessellb', 0.).shape == (6,)
+
+
+def test_bandflux_fused():
+    """Fused evaluation across bands gives the same result as evaluating
+    each band separately."""
+
+    bands = np.array(['bessellb', 'bessellv', 'bessellr', 'bessellb',
+                      'besselli', 'bessellv'])
+    times = np.array([-5., -5., 0., 10., 10., 20.])
+
+    for source in (flatsource(), salt2source()):
+        model = sncosmo.Model(source=source, effects=[sncosmo.CCM89Dust()],
+                              effect_frames=['obs'], effect_names=['mw'])
+        model.set(z=0.1, t0=1., mwebv=0.1)
+        expected = model.bandflux(bands, times, zp=25., zpsys='ab')
+        result = model.bandflux(bands, times, zp=25., zpsys='ab', fused=True)
+        assert_allclose(result, expected, rtol=1.e-12)
+
+        assert_allclose(model.bandflux('bessellb', 0., fused=True),
+                        model.bandflux('bessellb', 0.), rtol=1.e-12)
+
+
+def test_salt2emulator():
+    """Band fluxes from tabulated integrals match exact synthetic
+    photometry, exactly on the redshift grid and to within the measured
+    error between grid points."""
+
+    model = sncosmo.Model(source=salt2source())
+    bands = np.array(['bessellux', 'bessellb', 'bessellv', 'bessellr'])
+    emulator = sncosmo.SALT2Emulator(model.source, bands, 0.1, 0.3,
+                                     dz=0.02, cmax=0.5)
+    assert set(emulator.max_error.keys()) == set(bands)
+    assert max(emulator.max_error.values()) < 1.e-3
+
+    times = np.linspace(-30., 80., 45)
+    band = np.resize(bands, len(times))
+    for z, c in ((0.14, -0.3), (0.231, 0.5), (0.3, 0.)):
+        model.set(z=z, t0=5., x0=1.e-5, x1=1., c=c)
+        model.emulator = None
+        expected = model.bandflux(band, times, zp=25., zpsys='ab')
+        model.emulator = emulator
+        result = model.bandflux(band, times, zp=25., zpsys='ab')
+        assert_allclose(result, expected, rtol=0.,
+                        atol=2.e-3 * np.max(np.abs(expected)))
+        if z != 0.231:
+            assert_allclose(result, expected, rtol=1.e-10)
+
+    # outside of the tabulated range, the exact integral is used.
+    model.set(z=0.35, c=0.6)
+    expected = model.bandflux(band, times)
+    model.emulator = None
+    assert_allclose(model.bandflux(band, times), expected, rtol=1.e-14)
+
+    model.emulator = emulator
+    assert copy(model).emulator is emulator
+
+    # the emulator is accepted by models with an identical source only
+    sncosmo.Model(source=salt2source()).emulator = emulator
+    with pytest.raises(ValueError):
+        sncosmo.Model(source=salt2source(m1scale=0.2)).emulator = emulator
+    with pytest.raises(ValueError):
+        model.add_effect(sncosmo.CCM89Dust(), 'mw', 'obs')
+
+
+def test_bandflux_jacobian():
+    """Analytic derivatives of bandflux match finite differences."""
+
+    phase = np.linspace(-20., 50., 36)
+    wave = np.linspace(2000., 10000., 161)
+    flux = (np.exp(-0.5 * (phase[:, None] / 15.)**2) *
+            (1. + 0.1 * np.cos(wave / 1000.)))
+    sources = [salt2source(),
+               sncosmo.TimeSeriesSource(phase, wave, flux, zero_before=True),
+               sncosmo.StretchSource(phase, wave, flux)]
+    bands = np.array(['bessellb', 'bessellv', 'bessellr', 'bessellb'])
+    times = np.array([-30., -2., 12., 30.])
+
+    for source in sources:
+        model = sncosmo.Model(source=source,
+                              effects=[sncosmo.CCM89Dust(),
+                                       sncosmo.F99Dust()],
+                              effect_names=['host', 'mw'],
+                              effect_frames=['free', 'obs'])
+        model.set(z=0.2, t0=3., hostz=0.19, hostebv=0.1, mwebv=0.05)
+        if isinstance(source, sncosmo.StretchSource):
+            model.set(s=1.1)
+        if isinstance(source, sncosmo.SALT2Source):
+            model.set(x0=1.e-5, x1=0.7, c=0.1)
+
+        jac = model.bandflux_jacobian(bands, times, zp=25., zpsys='ab')
+        assert jac.shape == (len(times), len(model.parameters))
+
+        p0 = model.parameters.copy()
+        for i in range(len(p0)):
+            h = 1.e-5 * max(abs(p0[i]), 1.e-3)
+            p = p0.copy()
+            p[i] = p0[i] + h
+            model.parameters = p
+            fplus = model.bandflux(bands, times, zp=25., zpsys='ab')
+            p[i] = p0[i] - h
+            model.parameters = p
+            fminus = model.bandflux(bands, times, zp=25., zpsys='ab')
+            model.parameters = p0
+            assert_allclose(jac[:, i], (fplus - fminus) / (2. * h),
+                            rtol=1.e-6, atol=1.e-8 * np.max(np.abs(jac)))
+
+        assert model.bandflux_jacobian('bessellb', 0.).shape == (len(p0),)
+
+
+def test_salt2source_stacked_components():
+    """Components on a common grid are evaluated together, and give the
+    same results as the individual interpolators."""
+
+    source = salt2source()
+    groups = source._component_stacks[('LCRV00', 'LCRV11', 'LCRV01',
+                                       'errscale')]
+    assert [group for group, _ in groups] == [('LCRV00', 'LCRV11', 'LCRV01',
+                                               'errscale')]
+
+    # A component on a different grid is evaluated separately.
+    phase = np.linspace(-20., 50., 8)
+    wave = np.linspace(2000., 10000., 41)
+    grids = {'a': (phase, wave, np.ones((8, 41))),
+             'b': (phase, wave[1:], np.ones((8, 40))),
+             'c': (phase, wave, np.zeros((8, 41)))}
+    interpolators = {k: sncosmo.salt2utils.BicubicInterpolator(*v)
+                     for k, v in grids.items()}
+    groups = sncosmo.models._stack_components(('a', 'b', 'c'), grids,
+                                              interpolators)
+    assert [group for group, _ in groups] == [('a', 'c'), ('b',)]
+    assert groups[1][1] is interpolators['b']
+
+    phase = np.linspace(-25., 55., 17)
+    wave = np.linspace(3000., 8000., 50)
+    keys = ('M0', 'M1')
+    for result, key in zip(source._components(keys, phase, wave), keys):
+        assert np.all(result == source._model[key](phase, wave))
+
+
+def test_timeseries_interpolation():
+    """The cached-basis spline matches RectBivariateSpline, and the bicubic
+    backend matches BicubicInterpolator."""
+
+    from scipy.interpolate import RectBivariateSpline
+
+    phase = np.linspace(-20., 50., 36)
+    wave = np.linspace(2000., 10000., 161)
+    flux = (np.exp(-0.5 * (phase[:, None] / 15.)**2) *
+            (1. + 0.1 * np.cos(wave / 1000.)))
+    spline = RectBivariateSpline(phase, wave, flux, kx=3, ky=3)
+
+    p = np.array([-30., -20., -3.3, 0., 12.7, 49.9, 50., 60.])
+    w = np.linspace(3000., 8000., 50)
+    surface = sncosmo.models._SplineSurface(phase, wave, flux)
+    assert_allclose(surface(p, w), spline(p, w), rtol=1.e-12)
+    assert len(surface._reduced) == 1
+    assert_allclose(surface(p[::-1], w), spline(p, w)[::-1], rtol=1.e-12)
+    assert_allclose(surface(p[1:-2], w, dx=1), spline(p[1:-2], w, dx=1),
+                    rtol=1.e-10, atol=1.e-14)
+
+    source = sncosmo.TimeSeriesSource(phase, wave, flux, zero_before=True)
+    expected = RectBivariateSpline(phase, wave, flux, kx=3, ky=3)(p, w)
+    expected[p < phase[0]] = 0.
+    assert_allclose(source.flux(p, w), expected, rtol=1.e-12)
+
+    interp = sncosmo.salt2utils.BicubicInterpolator(phase, wave, flux)
+    for cls in (sncosmo.TimeSeriesSource, sncosmo.StretchSource):
+        source = cls(phase, wave, flux, interpolation='bicubic')
+        assert_allclose(source.flux(p, w),
+                        interp(np.clip(p, phase[0], phase[-1]), w))
+        # away from the phase edges, close to the spline
+        f = source.bandflux('bessellb', p[2:5])
+        source._model_flux = sncosmo.models._SplineSurface(phase, wave, flux)
+        assert_allclose(f, source.bandflux('bessellb', p[2:5]), rtol=1.e-3)
+
+    with pytest.raises(ValueError):
+        sncosmo.TimeSeriesSource(phase, wave, flux, interpolation='linear')
+
+
+def test_mlcs2k2source(tmpdir):
+    """The cached delta slice and bilinear evaluation match trilinear
+    interpolation of the full grid."""
+
+    from astropy.io import fits
+    from astropy import wcs
+    from scipy.interpolate import RegularGridInterpolator
+
+    delta = np.linspace(-0.4, 1.6, 5)
+    phase = np.linspace(-10., 50., 13)
+    wave = np.linspace(3000., 9000., 61)
+    values = np.random.RandomState(0).uniform(
+        size=(len(delta), len(phase), len(wave)))
+    w = wcs.WCS(naxis=3)
+    w.wcs.crpix = [1, 1, 1]
+    w.wcs.crval = [wave[0], phase[0], delta[0]]
+    w.wcs.cdelt = [wave[1] - wave[0], phase[1] - phase[0],
+                   delta[1] - delta[0]]
+    fname = str(tmpdir.join('mlcs2k2.fits'))
+    fits.PrimaryHDU(values, header=w.to_header()).writeto(fname)
+
+    source = sncosmo.MLCS2k2Source(fname)
+    interp = RegularGridInterpolator((delta, phase, wave), values,
+                                     bounds_error=False, fill_value=0.)
+    p = np.array([-12., -10., 3.3, 50.])
+    wq = np.linspace(3000., 9000., 17)
+    for d in [0.1, 0.1, 1.6, -0.5]:
+        source.set(amplitude=2., delta=d)
+        points = np.stack(np.meshgrid([d], p, wq, indexing='ij'),
+                          axis=-1)[0]
+        assert_allclose(source.flux(p, wq), 2. * interp(points),
+                        rtol=1e-12, atol=1e-14)
+    assert source._slice_delta == -0.5
+
+
+def test_dust_curve_cache():
+    """Dust effects match the extinction package and reuse the extinction
+    curve for a given wavelength grid and r_v."""
+
+    import extinction
+
+    wave = np.linspace(3000., 9000., 61)
+    flux = np.ones((2, len(wave)))
+    funcs = {sncosmo.CCM89Dust: extinction.ccm89,
+             sncosmo.OD94Dust: extinction.odonnell94,
+             sncosmo.F99Dust: extinction.Fitzpatrick99(3.1)}
+    for cls, func in funcs.items():
+        effect = cls()
+        for ebv in [0.1, 0.3]:
+            effect.set(ebv=ebv)
+            expected = extinction.apply(func(wave, 3.1 * ebv, 3.1), flux)
+            assert_allclose(effect.propagate(wave, flux), expected,
+                            rtol=1.e-12)
+        assert effect._curve_cache.misses == 1
+        assert effect._curve_cache.hits == 1
+
+        effect.propagate(wave[1:], flux[:, 1:])
+        assert effect._curve_cache.misses == 2
+        if 'r_v' in effect.param_names:
+            effect.set(r_v=2.5)
+            expected = extinction.apply(func(wave, 2.5 * 0.3, 2.5), flux)
+            assert_allclose(effect.propagate(wave, flux), expected,
+                            rtol=1.e-12)
+            assert effect._curve_cache.misses == 3
+
+
+def test_salt2source_rcov_structured():
+    """The structured relative covariance matches the dense one."""
+
+    source = salt2source()
+    band = np.array([sncosmo.get_bandpass(b) for b in
+                     ['bessellb', 'bessellv', 'bessellb', 'bessellr',
+                      'bessellv']])
+    phase = np.array([-5., 0., 3., 10., 20.])
+    rcov = source._bandflux_rcov_structured(band, phase)
+    assert isinstance(rcov, sncosmo.utils.StructuredCovariance)
+    dense = source.bandflux_rcov(band, phase)
+    assert_allclose(rcov.toarray(), dense)
+    assert dense[0, 2] > 0. and dense[0, 1] == 0.
+
+    model = sncosmo.Model(source)
+    model.set(z=0.1, t0=1., x0=1.e-5)
+    bands = ['bessellb', 'bessellv', 'bessellb', 'bessellr', 'bessellv']
+    f, cov = model._bandfluxcov_structured(bands, phase, zp=25.,
+                                           zpsys='ab')
+    f2, cov2 = model.bandfluxcov(bands, phase, zp=25., zpsys='ab')
+    assert_allclose(f, f2)
+    assert_allclose(cov.toarray(), cov2)
+
+
+def test_bandmag_and_color():
+    """Vectorized magnitudes match per-point zeropoints."""
+
+    model = sncosmo.Model(source=flatsource())
+    model.set(amplitude=2.)
+    # A magnitude system with a flat spectrum (in f_lambda), different
+    # from AB, that does not need to be downloaded.
+    wave = np.linspace(1000., 20000., 1901)
+    flat = sncosmo.SpectralMagSystem(
+        sncosmo.Spectrum(wave, 1.e-9 * np.ones_like(wave)))
+    band = np.array(['bessellb', 'bessellv', 'bessellb', 'bessellr'])
+    magsys = np.array(['ab', flat, flat, 'ab'], dtype=object)
+    time = np.array([0., 10., 20., 30.])
+    mag = model.bandmag(band, magsys, time)
+
+    flux = model.bandflux(band, time)
+    expected = [-2.5 * np.log10(f / sncosmo.get_magsystem(ms).zpbandflux(b))
+                for b, ms, f in zip(band, magsys, flux)]
+    assert_allclose(mag, expected)
+    assert np.ndim(model.bandmag('bessellb', 'ab', 0.)) == 0
+
+    color = model.color('bessellb', sncosmo.get_bandpass('bessellr'), 'ab',
+                        time)
+    assert_allclose(color, model.bandmag('bessellb', 'ab', time) -
+                    model.bandmag('bessellr', 'ab', time))
+    assert np.ndim(model.color('bessellb', 'bessellr', 'ab', 0.)) == 0
+
+
+def test_peakphase_batch():
+    """Batch peak search agrees with the scalar peak search."""
+
+    stretch = gaussiansource()
+    wave = stretch._wave
+
+    # integrating the spline coefficients first gives the same result
+    x = np.linspace(-30., 70., 101)
+    w = np.linspace(1., 2., len(wave))
+    assert_allclose(stretch._model_flux.integrate(x, wave, w),
+                    np.dot(stretch._model_flux(x, wave), w))
+
+    rng = np.random.RandomState(0)
+    salt2 = salt2source()
+    salt2_params = np.column_stack([rng.uniform(1., 2., 20),
+                                    rng.uniform(-2., 2., 20),
+                                    rng.uniform(-0.2, 0.2, 20)])
+    stretch_params = np.array([[1., 0.8], [2., 1.], [1., 1.3]])
+
+    for source, parameters in ((stretch, stretch_params),
+                               (salt2, salt2_params)):
+        saved = source.parameters.copy()
+        peakphase = source.peakphase_batch(parameters, 'bessellb')
+        peakmag = source.peakmag_batch(parameters, 'bessellb', 'ab')
+        assert_allclose(source.parameters, saved)
+
+        for i in range(len(parameters)):
+            source.parameters = parameters[i]
+            assert_allclose(peakphase[i],
+                            source.peakphase('bessellb', method='brent'),
+                            atol=1.e-3)
+            assert_allclose(peakphase[i], source.peakphase('bessellb'),
+                            atol=0.05)
+            assert_allclose(peakmag[i],
+                            source.peakmag('bessellb', 'ab', method='brent'),
+                            atol=1.e-6)
+        source.parameters = saved
+
+    assert_allclose(stretch.peakphase_batch(stretch_params, 'bessellb'),
+                    2. * stretch_params[:, 1], atol=0.05)
+
+    with pytest.raises(ValueError):
+        stretch.peakphase('bessellb', method='golden')
+
+    # the Model peak magnitude methods pass the method on to the source
+    model = sncosmo.Model(source=stretch)
+    model.set(z=0.2, amplitude=1., s=1.1)
+    assert_allclose(model.source_peakmag('bessellb', 'ab', method='brent'),
+                    model.source.peakmag('bessellb', 'ab', method='brent'))
+    model.set_source_peakabsmag(-19., 'bessellb', 'ab', method='brent')
+    assert_allclose(model.source_peakabsmag('bessellb', 'ab',
+                                            method='brent'), -19.)
+    with pytest.raises(ValueError):
+        model.set_source_peakmag(20., 'bessellb', 'ab', method='golden')
+
+
+def test_set_source_peakabsmag_batch():
+    """Tabulated distance modulus and batch absolute magnitudes."""
+
+    from astropy.cosmology import FlatLambdaCDM
+    from sncosmo.models import _distmod
+
+    cosmo = FlatLambdaCDM(H0=70., Om0=0.3)
+    z = np.array([0.001, 0.01, 0.1, 0.5, 1.5, 5.])
+    assert_allclose(_distmod(cosmo, z), cosmo.distmod(z).value, atol=1.e-4)
+    assert isinstance(_distmod(cosmo, 0.3), float)
+
+    model = sncosmo.Model(source=gaussiansource())
+    parameters = np.tile(model.parameters, (3, 1))
+    parameters[:, 0] = [0.05, 0.2, 0.5]  # z
+    parameters[:, 3] = [0.9, 1., 1.2]  # s
+    absmag = np.array([-19., -19.5, -18.])
+    saved = model.parameters.copy()
+    result = model.set_source_peakabsmag_batch(parameters, absmag,
+                                               'bessellb', 'ab', cosmo=cosmo)
+    assert_allclose(model.parameters, saved)
+    assert_allclose(result[:, [0, 1, 3]], parameters[:, [0, 1, 3]])
+
+    for i in range(len(parameters)):
+        model.parameters = result[i]
+        assert_allclose(model.source_peakabsmag('bessellb', 'ab',
+                                                cosmo=cosmo),
+                        absmag[i], atol=1.e-3)
+
+    parameters[0, 0] = 0.
+    with pytest.raises(ValueError):
+        model.set_source_peakabsmag_batch(parameters, absmag, 'bessellb',
+                                          'ab', cosmo=cosmo)
@@ -4,10 +4,13 @@ import pickle
 from astropy.extern import six
 import numpy as np
 from numpy.testing import assert_allclose
+import pytest
 from scipy.interpolate import RectBivariateSpline
 
 import sncosmo
-from sncosmo.salt2utils import BicubicInterpolator, SALT2ColorLaw
+from sncosmo import salt2utils
+from sncosmo.salt2utils import (BicubicInterpolator, SALT2ColorLaw,
+                                salt2_bandflux, bilinear_interp)
 
 
 # On Python 2 highest protocol is 2.
@@ -119,3 +122,146 @@ def test_salt2colorlaw_pickle():
         colorlaw2 = pickle.loads(pickle.dumps(colorlaw, protocol=protocol))
         wave = np.linspace(2000., 9200., 201)
         assert np.all(colorlaw(wave) == colorlaw2(wave))
+
+
+def test_bicubic_interpolator_derivative():
+    """Derivative in x matches finite differences of the interpolator."""
+
+    x = np.linspace(0., 10., 11)
+    y = np.linspace(0., 5., 6)
+    z = np.sin(x[:, None]) * np.cos(y)
+    f = BicubicInterpolator(x, y, z)
+
+    # avoid nodes: where linear interpolation is used (next to the edges),
+    # the derivative is discontinuous there.
+    xp = np.linspace(-0.55, 10.55, 38)
+    yp = np.linspace(0.1, 4.9, 7)
+    h = 1.e-6
+    expected = (f(xp + h, yp) - f(xp - h, yp)) / (2. * h)
+    assert_allclose(f(xp, yp, dx=1), expected, rtol=0., atol=1.e-7)
+
+
+def test_salt2_bandflux():
+    """Fused integration matches evaluating the surfaces and summing."""
+
+    x = np.linspace(0., 10., 11)
+    y = np.linspace(0., 5., 21)
+    m0 = BicubicInterpolator(x, y, np.sin(x[:, None]) * np.cos(y))
+    m1 = BicubicInterpolator(x, y, np.cos(x[:, None]) * y)
+    m1_other = BicubicInterpolator(x[1:], y, np.cos(x[1:, None]) * y)
+
+    xp = np.linspace(-0.5, 10.5, 23)
+    yp = np.linspace(-0.2, 5.2, 31)
+    w = np.linspace(1., 2., len(yp))
+
+    assert_allclose(m0.integrate(xp, yp, w), np.dot(m0(xp, yp), w),
+                    rtol=1.e-12, atol=1.e-12)
+    for m in (m1, m1_other):
+        expected = np.dot(m0(xp, yp) + 0.3 * m(xp, yp), w)
+        assert_allclose(salt2_bandflux(m0, m, 0.3, xp, yp, w), expected,
+                        rtol=1.e-12, atol=1.e-12)
+
+
+def test_bicubic_interpolator_plan_y():
+    """Evaluating with a precomputed y plan gives identical results."""
+
+    x = np.linspace(0., 10., 11)
+    y = np.linspace(0., 5., 21)
+    f = BicubicInterpolator(x, y, np.sin(x[:, None]) * np.cos(y))
+    g = BicubicInterpolator(x, y, np.cos(x[:, None]) * y)
+    g_other = BicubicInterpolator(x, y[1:], np.cos(x[:, None]) * y[1:])
+
+    xp = np.linspace(-0.5, 10.5, 23)
+    yp = np.linspace(-0.2, 5.2, 31)
+    w = np.linspace(1., 2., len(yp))
+    plan = f.plan_y(yp)
+
+    assert np.all(f(xp, plan) == f(xp, yp))
+    assert np.all(f(xp, plan, dx=1) == f(xp, yp, dx=1))
+    assert np.all(f.integrate(xp, plan, w) == f.integrate(xp, yp, w))
+
+    # valid for other interpolators on the same y grid and recomputed for
+    # interpolators on a different grid.
+    assert np.all(g(xp, plan) == g(xp, yp))
+    assert np.all(g_other(xp, plan) == g_other(xp, yp))
+    assert np.all(salt2_bandflux(f, g_other, 0.3, xp, plan, w) ==
+                  salt2_bandflux(f, g_other, 0.3, xp, yp, w))
+
+    for protocol in TEST_PICKLE_PROTOCOLS:
+        plan2 = pickle.loads(pickle.dumps(plan, protocol=protocol))
+        assert np.all(f(xp, plan2) == f(xp, yp))
+
+
+def test_bicubic_interpolator_stacked():
+    """Stacked surfaces give the same results as separate interpolators."""
+
+    x = np.linspace(0., 10., 11)
+    y = np.linspace(0., 5., 21)
+    z = np.array([np.sin(x[:, None]) * np.cos(y), np.cos(x[:, None]) * y])
+    f = BicubicInterpolator(x, y, z)
+    fs = [BicubicInterpolator(x, y, zi) for zi in z]
+
+    xp = np.linspace(-0.5, 10.5, 23)
+    yp = np.linspace(-0.2, 5.2, 31)
+    w = np.linspace(1., 2., len(yp))
+
+    assert f(xp, yp).shape == (2, len(xp), len(yp))
+    assert f.integrate(xp, yp, w).shape == (2, len(xp))
+    for i in range(2):
+        assert np.all(f(xp, yp)[i] == fs[i](xp, yp))
+        assert np.all(f(xp, yp, dx=1)[i] == fs[i](xp, yp, dx=1))
+        assert np.all(f.integrate(xp, yp, w)[i] == fs[i].integrate(xp, yp, w))
+
+    for protocol in TEST_PICKLE_PROTOCOLS:
+        f2 = pickle.loads(pickle.dumps(f, protocol=protocol))
+        assert np.all(f2(xp, yp) == f(xp, yp))
+
+    with pytest.raises(ValueError):
+        BicubicInterpolator(x, y, z[:, 1:, :])
+
+
+def test_bicubic_interpolator_threads():
+    """Results do not depend on the number of threads."""
+
+    x = np.linspace(0., 10., 11)
+    y = np.linspace(0., 5., 201)
+    z = np.array([np.sin(x[:, None]) * np.cos(y), np.cos(x[:, None]) * y])
+    f = BicubicInterpolator(x, y, z)
+    xp = np.linspace(-0.5, 10.5, 101)
+    yp = np.linspace(-0.2, 5.2, 301)
+    w = np.linspace(1., 2., len(yp))
+
+    expected = f(xp, yp), f(xp, yp, dx=1), f.integrate(xp, yp, w)
+    assert salt2utils.get_num_threads() == 1
+    try:
+        salt2utils.set_num_threads(3)
+        assert salt2utils.get_num_threads() == 3
+        assert np.all(f(xp, yp) == expected[0])
+        assert np.all(f(xp, yp, dx=1) == expected[1])
+        assert np.all(f.integrate(xp, yp, w) == expected[2])
+    finally:
+        salt2utils.set_num_threads(1)
+
+    with pytest.raises(ValueError):
+        salt2utils.set_num_threads(0)
+
+
+def test_bilinear_interp():
+    """Matches RegularGridInterpolator, including zero outside the grid."""
+    from scipy.interpolate import RegularGridInterpolator
+
+    x = np.array([-10., -2., 0., 3.5, 20.])
+    y = np.linspace(1000., 2000., 11)
+    z = np.random.RandomState(0).uniform(size=(len(x), len(y)))
+
+    xq = np.array([4., -11., -10., 0., 19.9, 20., 25., -5.])
+    yq = np.array([1000., 1234., 999., 2000., 1501., 2001.])
+    points = np.stack(np.meshgrid(xq, yq, indexing='ij'), axis=-1)
+    expected = RegularGridInterpolator((x, y), z, bounds_error=False,
+                                       fill_value=0.)(points)
+    assert_allclose(bilinear_interp(x, y, z, xq, yq), expected, rtol=1e-14)
+    assert bilinear_interp(x, y, z, 0., yq).shape == (1, len(yq))
+    assert bilinear_interp(x, y, z, [], yq).shape == (0, len(yq))
+
+    with pytest.raises(ValueError):
+        bilinear_interp(x, y, z[1:], xq, yq)
@@ -68,3 +68,24 @@ def test_data_mirror_rootdir():
     assert mirror.rootdir() == dirname
 
     os.rmdir(dirname)
+
+
+def test_structured_covariance():
+    rng = np.random.RandomState(0)
+    diagonal = rng.uniform(0.5, 1.5, size=7)
+    blocks = [(np.array([0, 3, 4]), rng.uniform(size=3)),
+              (np.array([6, 1]), rng.uniform(size=2))]
+    cov = utils.StructuredCovariance(diagonal, blocks)
+
+    dense = np.diag(diagonal)
+    for idx, v in blocks:
+        dense[np.ix_(idx, idx)] += np.outer(v, v)
+    assert_allclose(cov.toarray(), dense)
+
+    b = rng.normal(size=(7, 2))
+    assert_allclose(cov.solve(b), np.linalg.solve(dense, b))
+    assert_allclose(cov.solve(b[:, 0]), np.linalg.solve(dense, b[:, 0]))
+
+    f = rng.uniform(1., 2., size=7)
+    assert_allclose(cov.scaled(f).toarray(), f * dense * f[:, None])
+    assert_allclose(cov.add_diagonal(1.).toarray(), dense + np.eye(7))
@@ -210,6 +210,71 @@ class Interp1D(object):
         return (1.-w) * self._y[i] + w * self._y[i+1]
 
 
+class StructuredCovariance(object):
+    """Covariance matrix with a diagonal part plus rank-1 blocks:
+    ``D + sum_k v_k v_k^T``, where the vectors ``v_k`` have disjoint
+    support.
+
+    This is the form of the SALT2 model covariance (per-point variance,
+    plus a constant covariance between all points in a bandpass). Linear
+    systems are solved with the Woodbury identity in O(n): since the blocks
+    are disjoint, its capacitance matrix is diagonal.
+
+    Parameters
+    ----------
+    diagonal : `~numpy.ndarray` (1-d)
+        Diagonal part ``D``.
+    blocks : list of (`~numpy.ndarray`, `~numpy.ndarray`), optional
+        For each block, the (integer) indicies of its rows and the entries
+        of ``v_k`` at these rows.
+    """
+
+    def __init__(self, diagonal, blocks=()):
+        self.diagonal = np.asarray(diagonal, dtype=np.float64)
+        self.blocks = [(np.asarray(idx), np.asarray(v, dtype=np.float64))
+                       for idx, v in blocks]
+
+    def __len__(self):
+        return len(self.diagonal)
+
+    def toarray(self):
+        """Return the covariance as a dense 2-d array."""
+        result = np.diagflat(self.diagonal)
+        for idx, v in self.blocks:
+            result[np.ix_(idx, idx)] += v * v[:, None]
+        return result
+
+    def scaled(self, f):
+        """Covariance of ``f * x``, where ``x`` has this covariance."""
+        f = np.asarray(f, dtype=np.float64)
+        return StructuredCovariance(f**2 * self.diagonal,
+                                    [(idx, f[idx] * v)
+                                     for idx, v in self.blocks])
+
+    def add_diagonal(self, d):
+        """Return a copy with ``d`` added to the diagonal part."""
+        return StructuredCovariance(self.diagonal + d, self.blocks)
+
+    def solve(self, b):
+        """Return ``C^-1 b``, where ``C`` is this covariance.
+
+        The diagonal part must be positive.
+
+        Parameters
+        ----------
+        b : `~numpy.ndarray` (1-d or 2-d)
+            First dimension must match the covariance.
+        """
+        b = np.asarray(b, dtype=np.float64)
+        dinv = 1. / self.diagonal
+        x = (dinv * b.T).T
+        for idx, v in self.blocks:
+            w = dinv[idx] * v
+            k = 1. + np.dot(v, w)
+            x[idx] -= np.multiply.outer(w, np.dot(w, b[idx])) / k
+        return x
+
+
 def _download_file(remote_url, target):
     """
     Accepts a URL, downloads the file to a given open file object.